@@ -0,0 +1,109 @@
+"""Seeded EXPLAIN check for CI: python explain_check.py
+
+Imports newback with its import-time migrations switched off, creates a scratch database, runs
+newback's migrations on it once, seeds enough rows that MySQL plans the way it would with real
+data, and runs newback's explain-check on it.
+Exits 1 if any hot query plans a full table scan (access type ALL).
+"""
+import json
+import os
+import random
+import sys
+
+import mysql.connector
+
+SCRATCH_DB = os.environ.get("EXPLAIN_CHECK_DB", "chatbot_db_explain_check")
+WORKSPACES = [f"workspace{n}" for n in range(1, 13)]
+USERS = ["admin"] + [f"user{n}" for n in range(1, 20)]
+INTENTS = ["book_flight", "cancel_booking", "check_weather", "greet", "goodbye", "price", "baggage", None]
+MODEL_TYPES = ["spacy", "rasa", "bert", "tfidf"]
+FEEDBACK_TYPES = ["correct", "incorrect", "partial"]
+PROJECTS_PER_USER = 6
+ANNOTATIONS_PER_PROJECT = 60
+DATASET_ROWS_PER_DATASET = 200
+
+def seed(db):
+    """Spread rows over many projects, workspaces and users so every filter is selective"""
+    rnd = random.Random(0)
+    cursor = db.cursor()
+    try:
+        cursor.executemany("INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
+                           [(user, "x", "admin" if user == "admin" else "user") for user in USERS])
+        projects = [(user, f"{user}_project{n}", WORKSPACES[(index * PROJECTS_PER_USER + n) % len(WORKSPACES)])
+                    for index, user in enumerate(USERS) for n in range(PROJECTS_PER_USER)]
+        cursor.executemany("INSERT INTO projects (username, project_name, workspace) VALUES (%s, %s, %s)", projects)
+        cursor.execute("SELECT id, workspace FROM projects")
+        project_rows = cursor.fetchall()
+
+        annotations, models, datasets, feedback = [], [], [], []
+        for project_id, workspace in project_rows:
+            for n in range(ANNOTATIONS_PER_PROJECT):
+                confidence = round(rnd.random(), 3)
+                annotations.append((project_id, f"sample text {project_id} {n}", rnd.choice(INTENTS),
+                                    json.dumps([]), confidence, json.dumps([]), workspace))
+            for model_type in MODEL_TYPES:
+                models.append((project_id, f"{model_type}_model_{project_id}", model_type, b"", ANNOTATIONS_PER_PROJECT,
+                               json.dumps({"accuracy": 0.9}), workspace))
+            datasets.append((project_id, f"dataset_{project_id}.csv", "csv", workspace, "ready", DATASET_ROWS_PER_DATASET))
+            for n in range(10):
+                feedback.append((project_id, rnd.choice(MODEL_TYPES), f"feedback text {n}", rnd.choice(INTENTS),
+                                 rnd.choice(FEEDBACK_TYPES), rnd.choice(USERS), workspace))
+
+        cursor.executemany("""
+            INSERT INTO annotations (project_id, text, intent, entities, intent_confidence, entity_confidences, workspace)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, annotations)
+        cursor.executemany("""
+            INSERT INTO trained_models (project_id, model_name, model_type, model_data, training_data_count, metrics, workspace)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, models)
+        cursor.executemany("""
+            INSERT INTO datasets (project_id, file_name, file_type, workspace, ingest_status, row_count)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, datasets)
+        cursor.executemany("""
+            INSERT INTO feedback (project_id, model_type, input_text, predicted_intent, feedback_type, username, workspace)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, feedback)
+
+        cursor.execute("SELECT id FROM datasets")
+        for (dataset_id,) in cursor.fetchall():
+            cursor.executemany("""
+                INSERT INTO dataset_rows (dataset_id, row_index, text, label, sample_key) VALUES (%s, %s, %s, %s, %s)
+            """, [(dataset_id, n, f"row {n}", rnd.choice(INTENTS), rnd.randrange(2 ** 31))
+                  for n in range(DATASET_ROWS_PER_DATASET)])
+
+        # Fresh statistics, so the plans reflect the seeded distribution
+        cursor.execute("ANALYZE TABLE users, projects, annotations, annotation_stats, trained_models, datasets, dataset_rows, feedback")
+        cursor.fetchall()
+        db.commit()
+    finally:
+        cursor.close()
+
+def main() -> int:
+    # newback reads DB_NAME on import; nothing connects until the database exists and is migrated below
+    os.environ["DB_NAME"] = SCRATCH_DB
+    os.environ["RUN_MIGRATIONS"] = "0"
+    import newback
+    server = {key: value for key, value in newback.DB_CONFIG.items() if key != "database"}
+    admin = mysql.connector.connect(**server)
+    cursor = admin.cursor()
+    try:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{SCRATCH_DB}`")
+        cursor.execute(f"CREATE DATABASE `{SCRATCH_DB}`")
+        newback.run_migrations()
+        db = newback.get_db()
+        if not db:
+            return 1
+        try:
+            seed(db)
+        finally:
+            db.close()
+        return newback.run_explain_check()
+    finally:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{SCRATCH_DB}`")
+        cursor.close()
+        admin.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,44 @@
-from fastapi import FastAPI, Form, Query, UploadFile, File, HTTPException, Body
+from fastapi import FastAPI, Form, Query, UploadFile, File, HTTPException, Body, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import mysql.connector
 import hashlib
 import secrets
 import time
+import os
+import asyncio
+import anyio
 import pandas as pd
 import io
 import spacy
 import json
 import pickle
+import threading
+import queue
+import contextvars
+import sys
 import csv
+import random
+import codecs
 import re
+import bisect
 import numpy as np
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+from scipy import sparse
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple
 from pydantic import BaseModel
+from jose import jwt, JWTError
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support, confusion_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import Pipeline, FeatureUnion
+from sklearn.linear_model import LogisticRegression
+from sklearn.svm import LinearSVC
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.model_selection import train_test_split
+import joblib
 import matplotlib.pyplot as plt
 import seaborn as sns
 import base64
@@ -40,22 +63,652 @@ except:
     print("Warning: spaCy model not available")
 
 # Database connection
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "Root",
+    "database": os.environ.get("DB_NAME", "chatbot_db"),
+    "autocommit": True,
+    "buffered": True
+}
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", "3600"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+DB_POOL_PING_IDLE = float(os.environ.get("DB_POOL_PING_IDLE", "10"))
+
+class PooledConnection:
+    """A checked-out pool connection; attribute access goes to the mysql connection and close() returns it"""
+    def __init__(self, pool, raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._pool._release(self._raw, self._created_at)
+
+class ScopedConnection:
+    """The request's connection as handed to code inside the request; close() leaves it open for the rest of the request.
+    Only the handle that started a transaction may commit or roll it back"""
+    def __init__(self, connection: PooledConnection):
+        self._connection = connection
+        self._owns_transaction = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def start_transaction(self, *args, **kwargs):
+        self._connection.start_transaction(*args, **kwargs)
+        self._owns_transaction = True
+
+    def _end_transaction(self, action: str):
+        if self._connection.in_transaction and not self._owns_transaction:
+            raise RuntimeError(f"Cannot {action} a transaction started by another handle on this request's connection")
+        self._owns_transaction = False
+        getattr(self._connection, action)()
+
+    def commit(self):
+        self._end_transaction("commit")
+
+    def rollback(self):
+        self._end_transaction("rollback")
+
+    def close(self):
+        pass
+
+class ConnectionPool:
+    def __init__(self, config: Dict[str, Any], size: int = DB_POOL_SIZE, max_overflow: int = DB_POOL_MAX_OVERFLOW,
+                 recycle: float = DB_POOL_RECYCLE, timeout: float = DB_POOL_TIMEOUT, ping_idle: float = DB_POOL_PING_IDLE):
+        self.config = config
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.timeout = timeout
+        self.ping_idle = ping_idle
+        self._idle = []
+        self._checked_out = 0
+        self._condition = threading.Condition()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # Sockets inherited by a forked worker belong to the parent - forget them without closing
+        if self._pid != os.getpid():
+            self._idle = []
+            self._checked_out = 0
+            self._pid = os.getpid()
+
+    def connect(self) -> PooledConnection:
+        """Check out a connection, waiting up to timeout seconds when size + max_overflow are in use"""
+        deadline = time.monotonic() + self.timeout
+        raw = None
+        with self._condition:
+            self._check_fork()
+            while True:
+                if self._idle:
+                    raw, created_at, returned_at = self._idle.pop()
+                    break
+                if self._checked_out < self.size + self.max_overflow:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Connection pool exhausted ({self._checked_out} connections in use)")
+                self._condition.wait(remaining)
+            self._checked_out += 1
+
+        try:
+            now = time.monotonic()
+            if raw is not None and now - created_at > self.recycle:
+                self._discard(raw)
+                raw = None
+            elif raw is not None and now - returned_at > self.ping_idle:
+                # Health check for connections that sat idle long enough to be dropped by the server
+                try:
+                    raw.ping(reconnect=False)
+                except Exception:
+                    self._discard(raw)
+                    raw = None
+            if raw is None:
+                raw = mysql.connector.connect(**self.config)
+                created_at = now
+        except Exception:
+            with self._condition:
+                self._checked_out -= 1
+                self._condition.notify()
+            raise
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at: float):
+        reusable = True
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            reusable = False
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            self._checked_out -= 1
+            if reusable and len(self._idle) < self.size and time.monotonic() - created_at < self.recycle:
+                self._idle.append((raw, created_at, time.monotonic()))
+                raw = None
+            self._condition.notify()
+        if raw is not None:
+            self._discard(raw)
+
+    @staticmethod
+    def _discard(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def status(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "checked_out": self._checked_out,
+                "idle": len(self._idle)
+            }
+
+db_pool = ConnectionPool(DB_CONFIG)
+
+# Request-scoped connection - the first get_db() in a request checks one out, the middleware returns it
+_request_db_scope = contextvars.ContextVar("request_db_scope", default=None)
+
+class RequestConnectionScope:
+    def __init__(self):
+        self.connection = None
+
+    def get(self):
+        if self.connection is None:
+            self.connection = db_pool.connect()
+        elif self.connection.in_transaction:
+            # A handler's explicit transaction keeps the shared connection to itself; helpers it calls
+            # get a connection of their own, so their writes and commits stay out of it
+            return db_pool.connect()
+        return ScopedConnection(self.connection)
+
+    def release(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+@app.middleware("http")
+async def request_db_middleware(request: Request, call_next):
+    scope = RequestConnectionScope()
+    context_token = _request_db_scope.set(scope)
+    try:
+        return await call_next(request)
+    finally:
+        _request_db_scope.reset(context_token)
+        if scope.connection is not None:
+            # Returning a connection may roll back or ping, keep that off the event loop
+            await run_in_threadpool(scope.release)
+
+# Event loop health - sync handlers run on the threadpool, the lag monitor shows when the loop still stalls
+API_THREADPOOL_SIZE = int(os.environ.get("API_THREADPOOL_SIZE", "40"))
+EVENT_LOOP_LAG_INTERVAL = float(os.environ.get("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+EVENT_LOOP_LAG_SAMPLES = int(os.environ.get("EVENT_LOOP_LAG_SAMPLES", "1200"))
+
+class EventLoopLagMonitor:
+    """Measures how late the event loop wakes up from a fixed sleep"""
+
+    def __init__(self, interval: float = EVENT_LOOP_LAG_INTERVAL, samples: int = EVENT_LOOP_LAG_SAMPLES):
+        self.interval = interval
+        self.samples = deque(maxlen=samples)
+        self.max_lag = 0.0
+        self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def status(self) -> Dict[str, Any]:
+        lags = sorted(self.samples)
+
+        def percentile(q):
+            if not lags:
+                return 0.0
+            return round(lags[min(len(lags) - 1, int(q * len(lags)))] * 1000, 2)
+
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "interval_ms": round(self.interval * 1000, 2),
+            "samples": len(lags),
+            "last_lag_ms": round(self.samples[-1] * 1000, 2) if lags else 0.0,
+            "p50_lag_ms": percentile(0.5),
+            "p95_lag_ms": percentile(0.95),
+            "p99_lag_ms": percentile(0.99),
+            "max_lag_ms": round(self.max_lag * 1000, 2)
+        }
+
+event_loop_monitor = EventLoopLagMonitor()
+
+def threadpool_status() -> Dict[str, Any]:
+    """Usage of the worker threads that run the sync endpoints"""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {
+        "size": limiter.total_tokens,
+        "busy": limiter.borrowed_tokens,
+        "waiting": limiter.statistics().tasks_waiting
+    }
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+    event_loop_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_event_loop_monitor():
+    await event_loop_monitor.stop()
+
 def get_db():
+    """Pooled connection - the request's own connection when called while handling a request"""
     try:
-        return mysql.connector.connect(
-            host="localhost",
-            user="root", 
-            password="Root",
-            database="chatbot_db",
-            autocommit=True,
-            buffered=True
-        )
+        scope = _request_db_scope.get()
+        if scope is not None:
+            return scope.get()
+        return db_pool.connect()
     except Exception as e:
         print(f"Database connection error: {e}")
         return None
 
-# Token storage
-tokens = {}
+def db_dependency():
+    """FastAPI dependency giving the request's pooled connection (None if the database is unreachable)"""
+    db = get_db()
+    try:
+        yield db
+    finally:
+        if db:
+            db.close()
+
+# Session tokens - signed JWTs carrying username and role, so any worker can validate them without shared state
+JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
+JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "120"))
+TOKEN_REVOCATION = os.environ.get("TOKEN_REVOCATION", "0") == "1"
+TOKEN_REVOCATION_REFRESH = float(os.environ.get("TOKEN_REVOCATION_REFRESH", "30"))
+TOKEN_REVOCATION_RETRY = float(os.environ.get("TOKEN_REVOCATION_RETRY", "1"))
+
+if not JWT_SECRET_KEY:
+    JWT_SECRET_KEY = secrets.token_hex(32)
+    print("Warning: JWT_SECRET_KEY not set - tokens will not survive a restart or work across workers")
+
+class TokenRevocationList:
+    """Revoked token ids, mirrored from the revoked_tokens table and re-read every TOKEN_REVOCATION_REFRESH seconds.
+
+    Checks never wait on the database: a stale list is re-read by a single background thread while
+    callers keep using the current copy. A failed refresh is retried after TOKEN_REVOCATION_RETRY
+    seconds, doubling on each further failure up to the refresh interval.
+    """
+    def __init__(self, refresh: float = TOKEN_REVOCATION_REFRESH, retry: float = TOKEN_REVOCATION_RETRY):
+        self.refresh = refresh
+        self.retry = retry
+        self._revoked = set()
+        self._next_refresh = 0.0
+        self._failures = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def reload(self) -> bool:
+        """Re-read the table now; False (and a later next refresh) if it could not be read"""
+        db = get_db()
+        try:
+            if not db:
+                raise RuntimeError("database unavailable")
+            cursor = db.cursor()
+            try:
+                cursor.execute("DELETE FROM revoked_tokens WHERE expires_at < UTC_TIMESTAMP()")
+                cursor.execute("SELECT jti FROM revoked_tokens")
+                revoked = {row[0] for row in cursor.fetchall()}
+            finally:
+                cursor.close()
+        except Exception as e:
+            print(f"Token revocation refresh error: {e}")
+            with self._lock:
+                self._failures += 1
+                self._next_refresh = time.monotonic() + min(self.refresh, self.retry * 2 ** (self._failures - 1))
+            return False
+        finally:
+            if db:
+                db.close()
+        with self._lock:
+            self._revoked = revoked
+            self._failures = 0
+            self._next_refresh = time.monotonic() + self.refresh
+        return True
+
+    def _refresh(self):
+        try:
+            self.reload()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def is_revoked(self, jti: str) -> bool:
+        with self._lock:
+            stale = not self._refreshing and time.monotonic() >= self._next_refresh
+            if stale:
+                self._refreshing = True
+            revoked = jti in self._revoked
+        if stale:
+            threading.Thread(target=self._refresh, name="token-revocation-refresh", daemon=True).start()
+        return revoked
+
+    def revoke(self, jti: str, expires_at: datetime) -> bool:
+        db = get_db()
+        if not db:
+            return False
+        cursor = db.cursor()
+        try:
+            cursor.execute("INSERT IGNORE INTO revoked_tokens (jti, expires_at) VALUES (%s, %s)", (jti, expires_at))
+            with self._lock:
+                self._revoked.add(jti)
+            return True
+        finally:
+            cursor.close()
+            db.close()
+
+token_revocations = TokenRevocationList()
+
+@app.on_event("startup")
+def load_token_revocations():
+    # Read once before serving, so checks never run against an empty list
+    if TOKEN_REVOCATION:
+        token_revocations.reload()
+
+# Multi-pattern keyword matcher (Aho-Corasick automaton)
+class KeywordAutomaton:
+    def __init__(self, keywords=None):
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        self.keywords = []
+        self._built = False
+        for keyword in keywords or []:
+            self.add(keyword)
+
+    def add(self, keyword: str) -> int:
+        """Add a keyword and return its id"""
+        if not keyword:
+            raise ValueError("Keywords must be non-empty")
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        keyword_id = len(self.keywords)
+        self.keywords.append(keyword)
+        self._outputs[node].append(keyword_id)
+        self._built = False
+        return keyword_id
+
+    def build(self):
+        """Compute failure links so the text can be scanned in a single pass"""
+        queue = []
+        for next_node in self._goto[0].values():
+            self._fail[next_node] = 0
+            queue.append(next_node)
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, next_node in self._goto[node].items():
+                queue.append(next_node)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_node] = self._goto[fallback].get(char, 0)
+                # Inherit the outputs of the longest proper suffix
+                self._outputs[next_node] = self._outputs[next_node] + self._outputs[self._fail[next_node]]
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, keyword_id) for every keyword occurrence in text"""
+        if not self._built:
+            self.build()
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        keywords = self.keywords
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if outputs[node]:
+                end = position + 1
+                for keyword_id in outputs[node]:
+                    yield end - len(keywords[keyword_id]), end, keyword_id
+
+    def find_all(self, text: str) -> Dict[int, bool]:
+        """Map each matched keyword id to whether any occurrence is a whole-word (space bounded) match"""
+        hits = {}
+        last = len(text)
+        for start, end, keyword_id in self.iter_matches(text):
+            if hits.get(keyword_id):
+                continue
+            bounded = (start == 0 or text[start - 1] == ' ') and (end == last or text[end] == ' ')
+            hits[keyword_id] = bounded
+        return hits
+
+# Location gazetteers - optional GAZETTEER_DIR/<workspace>/locations.txt, one place name per line
+GAZETTEER_DIR = os.environ.get("GAZETTEER_DIR", "gazetteers")
+GAZETTEER_FILE = "locations.txt"
+
+class Gazetteer:
+    """Token trie over place names with single-pass longest-match scanning.
+
+    Every lookup keys on lowercased word-character runs, so "Winston-Salem" and "O'Hare" are
+    two keys each whether they come from the locations file, a phrase or running text.
+    """
+    _word_regex = re.compile(r'\w+')
+    # Stored with pickled tries; bump when the key scheme changes so cached tries are rebuilt
+    TRIE_FORMAT = 2
+
+    def __init__(self, entries=None):
+        self._root = {}
+        self.size = 0
+        for entry in entries or []:
+            self.add(entry)
+
+    @classmethod
+    def from_trie(cls, root: Dict, size: int) -> 'Gazetteer':
+        """Rebuild a gazetteer from a previously compiled trie"""
+        gazetteer = cls()
+        gazetteer._root = root
+        gazetteer.size = size
+        return gazetteer
+
+    @classmethod
+    def keys(cls, phrase: str) -> List[str]:
+        """Lowercased word-character runs of a phrase"""
+        return [word.lower() for word in cls._word_regex.findall(phrase)]
+
+    def add(self, entry: str) -> bool:
+        """Add a place name, returning False if it has no usable tokens"""
+        keys = self.keys(entry)
+        if not keys:
+            return False
+        node = self._root
+        for key in keys:
+            node = node.setdefault(key, {})
+        if None not in node:
+            node[None] = True
+            self.size += 1
+        return True
+
+    def longest_match(self, keys: List[str], index: int) -> int:
+        """Number of keys from index that form the longest known place name, 0 if none"""
+        node = self._root
+        matched = 0
+        for offset in range(index, len(keys)):
+            node = node.get(keys[offset])
+            if node is None:
+                break
+            if None in node:
+                matched = offset - index + 1
+        return matched
+
+    def contains(self, phrase: str) -> bool:
+        """Check whether the whole phrase is a known place name"""
+        keys = self.keys(phrase)
+        return bool(keys) and self.longest_match(keys, 0) == len(keys)
+
+    def scan(self, keys: List[str]) -> Dict[int, int]:
+        """Map start index to end index (exclusive) of non-overlapping longest matches, left to right"""
+        spans = {}
+        index = 0
+        while index < len(keys):
+            length = self.longest_match(keys, index)
+            if length:
+                spans[index] = index + length
+                index += length
+            else:
+                index += 1
+        return spans
+
+    def scan_tokens(self, tokens: List[tuple]) -> Dict[int, int]:
+        """scan over whitespace (token, start, end) tuples, keeping place names that cover whole tokens
+        (surrounding punctuation aside); maps the first token's index to the index after the last"""
+        keys, first_key, end_key = [], [], []
+        for token, _, _ in tokens:
+            first_key.append(len(keys))
+            keys.extend(self.keys(token))
+            end_key.append(len(keys))
+        starts = {first_key[index]: index for index in range(len(tokens)) if end_key[index] > first_key[index]}
+        ends = {end_key[index]: index for index in range(len(tokens)) if end_key[index] > first_key[index]}
+        return {starts[first]: ends[last] + 1 for first, last in self.scan(keys).items()
+                if first in starts and last in ends}
+
+    def find_spans(self, text: str) -> List[tuple]:
+        """Return (start, end) character spans of place names, matched on word-character runs so "delhi-mumbai" and "goa," match"""
+        words = [(match.start(), match.end()) for match in self._word_regex.finditer(text)]
+        keys = [text[start:end].lower() for start, end in words]
+        return [(words[first][0], words[last - 1][1]) for first, last in self.scan(keys).items()]
+
+_gazetteer_cache = {}
+
+def _gazetteer_cache_path(workspace: str, seed_digest: str) -> str:
+    return os.path.join(GAZETTEER_DIR, workspace, f"locations.{seed_digest[:16]}.trie.pkl")
+
+def load_gazetteer(workspace: Optional[str], seed=()) -> Gazetteer:
+    """Get the gazetteer for a workspace: the seed entries plus the workspace's locations file.
+
+    The compiled trie is kept in memory and pickled next to the locations file, and both
+    are rebuilt only when the file (or the seed) changes.
+    """
+    seed = sorted(set(seed))
+    seed_digest = hashlib.sha256("\n".join(seed).encode("utf-8")).hexdigest()
+
+    stat = None
+    if workspace and re.fullmatch(r'[\w\-]+', workspace):
+        try:
+            stat = os.stat(os.path.join(GAZETTEER_DIR, workspace, GAZETTEER_FILE))
+        except OSError:
+            stat = None
+    if stat is None:
+        workspace = None
+    signature = (Gazetteer.TRIE_FORMAT, seed_digest) + ((stat.st_mtime_ns, stat.st_size) if stat else (None, None))
+
+    cached = _gazetteer_cache.get((workspace, seed_digest))
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    gazetteer = None
+    if workspace:
+        cache_path = _gazetteer_cache_path(workspace, seed_digest)
+        try:
+            with open(cache_path, "rb") as f:
+                stored = pickle.load(f)
+            if stored.get("signature") == signature:
+                gazetteer = Gazetteer.from_trie(stored["trie"], stored["size"])
+        except Exception:
+            gazetteer = None
+
+        if gazetteer is None:
+            gazetteer = Gazetteer(seed)
+            with open(os.path.join(GAZETTEER_DIR, workspace, GAZETTEER_FILE), encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        gazetteer.add(line)
+            # Only plain dicts are pickled so the cache survives module renames
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            try:
+                with open(temp_path, "wb") as f:
+                    pickle.dump({"signature": signature, "trie": gazetteer._root, "size": gazetteer.size},
+                                f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, cache_path)
+            except Exception as e:
+                print(f"Gazetteer cache write error: {e}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+    else:
+        gazetteer = Gazetteer(seed)
+
+    _gazetteer_cache[(workspace, seed_digest)] = (signature, gazetteer)
+    return gazetteer
+
+# Words that are never extracted as entities
+BLOCKED_ENTITY_WORDS = frozenset({
+    # Prepositions
+    'near', 'at', 'around', 'within', 'inside', 'outside', 'for', 'to', 'of', 'with',
+    # Sports and booking context
+    'training', 'coaching', 'practice', 'session', 'lessons', 'slot', 'match', 'game', 'tournament',
+    'league', 'tour', 'race', 'ticket', 'tickets', 'booking', 'bookings', 'seat', 'seats', 'price',
+    'prices', 'cost', 'fare', 'rate', 'table', 'ranking', 'rankings', 'result', 'results',
+    'schedule', 'team', 'teams', 'details', 'information', 'timings', 'time', 'membership',
+    'equipment', 'shoes', 'availability', 'available', 'open', 'nearby', 'online', 'live',
+    # Verbs
+    'find', 'check', 'book', 'cancel', 'tell', 'guide', 'help', 'need', 'want', 'like', 'please',
+    'understand', 'identify', 'request',
+    # Greetings
+    'hi', 'hello', 'thanks', 'goodbye', 'bye', 'okay',
+    # Determiners and pronouns
+    'whether', 'this', 'that', 'these', 'those', 'some', 'a', 'an', 'the', 'any', 'all', 'every',
+    'each', 'me', 'my', 'you', 'your', 'i', 'we', 'our',
+    # Question words
+    'what', 'when', 'where', 'how', 'why', 'which',
+    # Auxiliary and modal verbs
+    'can', 'could', 'will', 'would', 'shall', 'should', 'may', 'might', 'must', 'do', 'does', 'did',
+    'have', 'has', 'had', 'is', 'are', 'was', 'were',
+    # Negation and uncertainty
+    "don't", 'cannot', 'unknown', 'seems',
+    # Conjunctions
+    'and', 'or', 'but', 'so', 'because', 'if', 'then'
+})
 
 # Enhanced Simple Pretrained Model with Confidence Scoring
 class SimplePretrainedModel:
@@ -338,30 +991,49 @@ class SimplePretrainedModel:
             'kolkata','patna','mumbai','goa','russia','gulbarga','india','australia',
             'pakistan','bangalore','chennai','hyderabad','wembley', 'camp nou', 'campnou', 'stadium'
         }
+        # Built-in cities seed the gazetteer; ModelManager swaps in a workspace gazetteer
+        self.gazetteer = Gazetteer(self.known_cities)
+
+        # Sports-related words are never extracted as entities
+        self.sports_words = frozenset({'training', 'coaching', 'practice', 'session', 'lessons', 'match', 'game', 'stadium', 'court', 'gym'})
+
+        # BLOCK list - words that should NEVER be extracted as entities
+        self.blocked_words = BLOCKED_ENTITY_WORDS
+
+        self._token_regex = re.compile(r'\S+')
+        self._digit_regex = re.compile(r'\d')
+
+        self.compile_intent_mapping()
+
+    def compile_intent_mapping(self):
+        """Compile intent_mapping into a keyword automaton - call again after editing the mapping"""
+        self._intent_keywords = list(self.intent_mapping.items())
+        self._intent_automaton = KeywordAutomaton(keyword for keyword, _ in self._intent_keywords).build()
 
     def predict_intent(self, text: str) -> Dict[str, Any]:
         """Predict intent with confidence score"""
         text_lower = text.lower().strip()
-        
+
         # If empty text, return unknown with low confidence
         if not text_lower:
             return {"intent": "unknown", "confidence": 0.0}
-        
+
         # Track all possible intents and their scores
         intent_scores = {}
-        
-        # Check for exact matches and calculate scores
-        for keyword, intent_data in self.intent_mapping.items():
-            if keyword in text_lower:
-                base_confidence = intent_data['confidence']
-                intent = intent_data['intent']
-                
-                # Calculate match quality score
-                match_quality = self._calculate_match_quality(text_lower, keyword)
-                final_confidence = base_confidence * match_quality
-                
-                if intent not in intent_scores or final_confidence > intent_scores[intent]:
-                    intent_scores[intent] = final_confidence
+
+        # Single pass over the text finds every keyword hit; score them in mapping order
+        hits = self._intent_automaton.find_all(text_lower)
+        for keyword_id in sorted(hits):
+            keyword, intent_data = self._intent_keywords[keyword_id]
+            base_confidence = intent_data['confidence']
+            intent = intent_data['intent']
+
+            # Calculate match quality score
+            match_quality = self._calculate_match_quality(keyword, hits[keyword_id])
+            final_confidence = base_confidence * match_quality
+
+            if intent not in intent_scores or final_confidence > intent_scores[intent]:
+                intent_scores[intent] = final_confidence
         
         # If we found intents, return the one with highest confidence
         if intent_scores:
@@ -374,28 +1046,33 @@ class SimplePretrainedModel:
         # Fallback to unknown with very low confidence
         return {"intent": "unknown", "confidence": 0.1}
 
-    def _calculate_match_quality(self, text: str, keyword: str) -> float:
+    def predict_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """predict_intent for many texts, in order"""
+        return [self.predict_intent(text) for text in texts]
+
+    def _calculate_match_quality(self, keyword: str, word_match: bool) -> float:
         """Calculate how well the keyword matches the text"""
         # Exact word match gets highest score
-        if f" {keyword} " in f" {text} ":
+        if word_match:
             return 1.0
-        # Phrase match gets high score
-        elif keyword in text:
-            # Longer keywords get higher scores when matched
-            keyword_length_factor = min(len(keyword) / 10, 1.0)
-            return 0.8 + (keyword_length_factor * 0.2)
-        return 0.6
+        # Phrase match gets high score - longer keywords get higher scores when matched
+        keyword_length_factor = min(len(keyword) / 10, 1.0)
+        return 0.8 + (keyword_length_factor * 0.2)
     
+    def tokenize_with_offsets(self, text: str) -> List[tuple]:
+        """Split text on whitespace into (token, start, end) tuples in one pass"""
+        return [(match.group(), match.start(), match.end()) for match in self._token_regex.finditer(text)]
+
     def extract_entities(self, text: str) -> List[Dict[str, Any]]:
         """Extract entities with confidence scores"""
         entities = []
-        text_lower = text.lower()
-        words = text.split()
+        tokens = self.tokenize_with_offsets(text)
+        # Sports-related words are never extracted as locations or any other entity
+        sports_words = self.sports_words
+        # Multi-word place names, keyed by the index of their first token
+        city_spans = self.gazetteer.scan_tokens(tokens)
         
-        # First, identify and block sports-related words from being extracted as locations
-        sports_words = {'training', 'coaching', 'practice', 'session', 'lessons', 'match', 'game', 'stadium', 'court', 'gym'}
-        
-        for i, word in enumerate(words):
+        for i, (word, start_idx, end_idx) in enumerate(tokens):
             word_lower = word.lower()
             
             # SKIP sports words entirely - don't extract them as any entity
@@ -409,17 +1086,19 @@ class SimplePretrainedModel:
                 base_confidence = entity_config['confidence']
                 
                 # Look for entity value in next words
-                if i + 1 < len(words):
-                    next_word = words[i + 1]
-                    next_word_lower = next_word.lower()
+                if i + 1 < len(tokens):
+                    next_word, next_start, next_end = tokens[i + 1]
                     
                     # Skip if next word is a sports word
-                    if next_word_lower in sports_words:
+                    if next_word.lower() in sports_words:
                         continue
+
+                    # Take the whole place name when it spans several words
+                    if entity_type == 'location' and i + 1 in city_spans:
+                        next_end = tokens[city_spans[i + 1] - 1][2]
+                        next_word = text[next_start:next_end]
                         
                     if self._is_valid_entity_value(next_word, entity_type):
-                        start_idx = text_lower.find(next_word_lower)
-                        
                         # Calculate entity confidence
                         entity_confidence = self._calculate_entity_confidence(
                             next_word, entity_type, base_confidence
@@ -428,24 +1107,28 @@ class SimplePretrainedModel:
                         entities.append({
                             'text': next_word,
                             'label': entity_type,
-                            'start': start_idx,
-                            'end': start_idx + len(next_word),
+                            'start': next_start,
+                            'end': next_end,
                             'confidence': entity_confidence
                         })
             
-            # Direct city detection with high confidence (skip sports words)
-            if self._is_city(word) and word_lower not in sports_words:
-                start_idx = text_lower.find(word_lower)
+            # Direct city detection with high confidence (sports words were skipped above)
+            if i in city_spans:
+                end_idx = tokens[city_spans[i] - 1][2]
                 entities.append({
-                    'text': word,
+                    'text': text[start_idx:end_idx],
                     'label': 'location',
                     'start': start_idx,
-                    'end': start_idx + len(word),
+                    'end': end_idx,
                     'confidence': 0.95
                 })
         
         return entities    
 
+    def extract_entities_batch(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        """extract_entities for many texts, in order"""
+        return [self.extract_entities(text) for text in texts]
+
     def _calculate_entity_confidence(self, word: str, entity_type: str, base_confidence: float) -> float:
         """Calculate confidence score for an entity"""
         confidence = base_confidence
@@ -472,86 +1155,15 @@ class SimplePretrainedModel:
         """Check if a word is valid for the given entity type"""
         word_lower = word.lower()
         
-        # BLOCK list - words that should NEVER be extracted as entities
-        blocked_words = {
-            'training', 'coaching', 'practice', 'session', 'lessons',
-            'match', 'game', 'tournament', 'league', 'tour',
-            'near', 'at', 'around', 'within', 'inside', 'outside','table','tickets','price','team','for','race','booking',
-             'near', 'at', 'around', 'within', 'inside', 'outside', 'for', 'to', 'of',
-        'training', 'coaching', 'practice', 'session', 'lessons', 'slot',
-        'match', 'game', 'tournament', 'league', 'tour', 'race',
-        'ticket', 'tickets', 'booking', 'bookings', 'seat', 'seats',
-        'price', 'prices', 'cost', 'fare', 'rate',
-        'table', 'ranking', 'rankings', 'result', 'results', 'schedule',
-        'team', 'teams', 'details', 'information', 'timings', 'time',
-        'find', 'check', 'book', 'cancel', 'tell', 'guide', 'help',
-        'membership', 'equipment', 'shoes', 'availability', 'details',
-        'hi', 'hello', 'thanks', 'goodbye', 'bye', 'okay',
-        'whether', 'this', 'that', 'these', 'those', 'some',
-        'me', 'my', 'you', 'your', 'i', 'we', 'our',
-        'what', 'when', 'where', 'how', 'why', 'which',
-        'can', 'could', 'will', 'would', 'shall', 'should', 'may', 'might', 'must',
-        'do', 'does', 'did', 'have', 'has', 'had', 'is', 'are', 'was', 'were',
-        'need', 'want', 'like', 'please', 'don\'t', 'cannot', 'unknown', 'seems',
-        'a', 'an', 'the', 'any', 'some', 'all', 'every', 'each',
-        'and', 'or', 'but', 'so', 'because', 'if', 'then','whether', 'open', 'guide', 'membership', 'nearby', 'online',
-    'goodbye', 'result', 'information', 'available', 'live',
-    'slot', 'timings', 'details', 'equipment', 'shoes', 'availability',
-    'seems', 'unknown', 'understand', 'identify', 'request',
-    
-    # Location & prepositions
-    'near', 'at', 'around', 'within', 'inside', 'outside', 'for', 'to', 'of', 'with',
-    
-    # Sports context
-    'training', 'coaching', 'practice', 'session', 'lessons',
-    'match', 'game', 'tournament', 'league', 'tour', 'race',
-    'ticket', 'tickets', 'booking', 'bookings', 'seat', 'seats',
-    'price', 'prices', 'cost', 'fare', 'rate',
-    'table', 'ranking', 'rankings', 'result', 'results', 'schedule',
-    'team', 'teams', 'details', 'information', 'timings', 'time',
-    
-    # Verbs
-    'find', 'check', 'book', 'cancel', 'tell', 'guide', 'help', 'need',
-    
-    # Generic nouns
-    'membership', 'equipment', 'shoes', 'availability', 'details',
-    
-    # Greetings
-    'hi', 'hello', 'thanks', 'goodbye', 'bye', 'okay',
-    
-    # Uncertainty
-    'whether', 'this', 'that', 'these', 'those', 'some',
-    
-    # Pronouns
-    'me', 'my', 'you', 'your', 'i', 'we', 'our',
-    
-    # Question words
-    'what', 'when', 'where', 'how', 'why', 'which',
-    
-    # Modal verbs
-    'can', 'could', 'will', 'would', 'shall', 'should', 'may', 'might', 'must',
-    'do', 'does', 'did', 'have', 'has', 'had', 'is', 'are', 'was', 'were',
-    'need', 'want', 'like', 'please',
-    
-    # Negation
-    'don\'t', 'cannot', 'unknown', 'seems', 'understand', 'identify',
-    
-    # Articles
-    'a', 'an', 'the', 'any', 'some', 'all', 'every', 'each',
-    
-    # Conjunctions
-    'and', 'or', 'but', 'so', 'because', 'if', 'then'
-        }
-        
-        if word_lower in blocked_words:
+        if word_lower in self.blocked_words:
             return False
             
         if entity_type == 'location':
             return self._is_city(word)
         elif entity_type == 'date':
-            return bool(re.search(r'\d', word)) or word_lower in ['today', 'tomorrow', 'yesterday']
+            return bool(self._digit_regex.search(word)) or word_lower in ['today', 'tomorrow', 'yesterday']
         elif entity_type == 'time':
-            return bool(re.search(r'\d', word)) or word_lower in ['morning', 'afternoon', 'evening']
+            return bool(self._digit_regex.search(word)) or word_lower in ['morning', 'afternoon', 'evening']
         elif entity_type == 'flight_class':
             return word_lower in ['economy', 'business', 'first', 'premium']
         elif entity_type == 'passengers':
@@ -565,12 +1177,13 @@ class SimplePretrainedModel:
 
     def _is_city(self, word: str) -> bool:
         """Check if word is a known city"""
-        clean_word = word.lower().replace(',', '').replace('.', '')
-        return clean_word in self.known_cities
+        return self.gazetteer.contains(word)
 
 # Enhanced RASA-style Model with Confidence
 class RasaStyleModel:
     def __init__(self):
+        # Words that boost similarity when both the text and a training example contain them
+        self.important_words = ['book', 'cancel', 'check', 'weather', 'price', 'flight', 'hotel']
         self.training_data = []
         self.intent_patterns = {
             'book': [
@@ -617,11 +1230,96 @@ class RasaStyleModel:
             'similarity_match': 0.65,
             'fallback': 0.30
         }
-        
+
+    @property
+    def training_data(self):
+        return self._training_data
+
+    @training_data.setter
+    def training_data(self, training_data):
+        """Store training examples and rebuild the similarity index"""
+        self._training_data = training_data
+        self._build_similarity_index()
+
     def train(self, training_data):
         """Simple RASA-style training - store the data"""
         self.training_data = training_data
         print(f"RASA model trained with {len(training_data)} examples")
+
+    def _build_similarity_index(self):
+        """Build the token -> example inverted index used by similarity matching"""
+        self._examples = []
+        self._token_postings = {}
+        self._important_postings = {word: [] for word in self.important_words}
+        # Examples of two tokens or fewer can be contained in a text without sharing a whole
+        # token with it, so they are also matched as substrings in one automaton pass
+        self._short_examples = KeywordAutomaton()
+        self._short_example_ids = {}
+        self._empty_examples = []
+
+        for index, example in enumerate(self._training_data or []):
+            example_text = example['text'].lower()
+            self._examples.append((example_text, example['intent'], len(example_text)))
+
+            example_tokens = example_text.split()
+            for token in set(example_tokens):
+                self._token_postings.setdefault(token, []).append(index)
+            for word in self.important_words:
+                if word in example_text:
+                    self._important_postings[word].append(index)
+
+            if len(example_tokens) <= 2:
+                if not example_text:
+                    self._empty_examples.append(index)
+                elif example_text in self._short_example_ids:
+                    self._short_example_ids[example_text].append(index)
+                else:
+                    self._short_examples.add(example_text)
+                    self._short_example_ids[example_text] = [index]
+        self._short_examples.build()
+
+        # All example texts joined, so short texts can be located inside examples with str.find
+        self._corpus_starts = []
+        offset = 0
+        for example_text, _, example_length in self._examples:
+            self._corpus_starts.append(offset)
+            offset += example_length + 1
+        self._corpus = '\x00'.join(example_text for example_text, _, _ in self._examples)
+
+    def _similarity_candidates(self, text_lower: str, text_words: set) -> Dict[int, int]:
+        """Map every example that can score above zero to its shared-token count"""
+        candidates = {}
+        for word in text_words:
+            for index in self._token_postings.get(word, ()):
+                candidates[index] = candidates.get(index, 0) + 1
+
+        for word in self.important_words:
+            if word in text_lower:
+                for index in self._important_postings[word]:
+                    candidates.setdefault(index, 0)
+
+        # Short examples contained in the text
+        for index in self._empty_examples:
+            candidates.setdefault(index, 0)
+        for _, _, keyword_id in self._short_examples.iter_matches(text_lower):
+            for index in self._short_example_ids[self._short_examples.keywords[keyword_id]]:
+                candidates.setdefault(index, 0)
+
+        # Short texts contained in an example (longer texts always share a whole token)
+        if len(text_lower.split()) <= 2:
+            if '\x00' in text_lower:
+                for index in range(len(self._examples)):
+                    candidates.setdefault(index, 0)
+            else:
+                position = self._corpus.find(text_lower)
+                while position != -1:
+                    index = bisect.bisect_right(self._corpus_starts, position) - 1
+                    candidates.setdefault(index, 0)
+                    if index + 1 >= len(self._corpus_starts):
+                        break
+                    position = self._corpus.find(text_lower, self._corpus_starts[index + 1])
+
+        return candidates
         
     def predict_intent(self, text: str) -> Dict[str, Any]:
         """RASA-style intent prediction with confidence scoring"""
@@ -661,6 +1359,10 @@ class RasaStyleModel:
         except Exception as e:
             print(f"RASA prediction error: {e}")
             return {"intent": "unknown", "confidence": 0.0}
+
+    def predict_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """predict_intent for many texts, in order"""
+        return [self.predict_intent(text) for text in texts]
     
     def _pattern_match_with_confidence(self, text_lower: str) -> Dict[str, Any]:
         """Match against predefined patterns with confidence"""
@@ -685,49 +1387,47 @@ class RasaStyleModel:
         """Match based on similarity with training data and confidence"""
         best_score = 0
         best_intent = "unknown"
-        
-        for example in self.training_data:
-            example_text = example['text'].lower()
-            example_intent = example['intent']
-            
+
+        text_words = set(text_lower.split())
+        important_words = [word for word in self.important_words if word in text_lower]
+        candidates = self._similarity_candidates(text_lower, text_words)
+
+        # Only examples sharing a token, a containment or an important word can score
+        for index in sorted(candidates):
+            example_text, example_intent, example_length = self._examples[index]
+
             # Skip if example is too different in length
-            if abs(len(text_lower) - len(example_text)) > 50:
+            if abs(len(text_lower) - example_length) > 50:
                 continue
-                
-            # Calculate word overlap
-            example_words = set(example_text.split())
-            text_words = set(text_lower.split())
-            common_words = example_words.intersection(text_words)
-            
-            # Calculate similarity score
+
+            # Calculate similarity score from the word overlap
             if len(text_words) > 0:
-                score = len(common_words) / len(text_words)
+                score = candidates[index] / len(text_words)
             else:
                 score = 0
-            
+
             # Bonus for exact matches
             if example_text == text_lower:
                 score = 1.0
             elif example_text in text_lower or text_lower in example_text:
                 score = max(score, 0.8)
-            
+
             # Bonus for important words
-            important_words = ['book', 'cancel', 'check', 'weather', 'price', 'flight', 'hotel']
             for word in important_words:
-                if word in text_lower and word in example_text:
+                if word in example_text:
                     score += 0.2
-            
+
             if score > best_score:
                 best_score = score
                 best_intent = example_intent
-        
+
         # Convert similarity score to confidence
         if best_intent != "unknown" and best_score > 0.3:
             confidence = self.confidence_scores['similarity_match'] + (best_score * 0.3)
             return {"intent": best_intent, "confidence": min(confidence, 0.99)}
-        
+
         return {"intent": "unknown", "confidence": 0.0}
-    
+
     def _keyword_fallback_with_confidence(self, text_lower: str) -> Dict[str, Any]:
         """Keyword-based fallback with confidence"""
         keyword_scores = {}
@@ -834,6 +1534,10 @@ class RasaStyleModel:
         
         return entities
 
+    def extract_entities_batch(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        """extract_entities for many texts, in order"""
+        return [self.extract_entities(text) for text in texts]
+
     def _calculate_entity_pattern_confidence(self, entity_text: str, entity_type: str, 
                                            base_confidence: float, full_text: str) -> float:
         """Calculate confidence for entity patterns"""
@@ -912,85 +1616,9 @@ class BertStyleModel:
             'context_phrase': 0.1,
             'combination_bonus': 0.3
         }
-        
-    def train(self, training_data):
-        """BERT-style training simulation"""
-        self.training_data = training_data
-        print(f"BERT model trained with {len(training_data)} examples")
-        
-    def predict_intent(self, text: str) -> Dict[str, Any]:
-        """BERT-style intent prediction with semantic understanding and confidence"""
-        try:
-            if not text or not text.strip():
-                return {"intent": "unknown", "confidence": 0.0}
-                
-            text_lower = text.lower().strip()
-            
-            # Calculate confidence scores for all intents
-            intent_confidences = {}
-            
-            for intent, patterns in self.semantic_patterns.items():
-                confidence = self._calculate_semantic_confidence(text_lower, patterns)
-                intent_confidences[intent] = confidence
-            
-            # Get the best intent
-            if intent_confidences:
-                best_intent, best_confidence = max(intent_confidences.items(), key=lambda x: x[1])
-                if best_confidence >= 0.3:  # Minimum confidence threshold
-                    return {"intent": best_intent, "confidence": min(best_confidence, 0.99)}
-            
-            # Fallback strategies
-            fallback_result = self._contextual_fallback(text_lower)
-            if fallback_result["confidence"] > 0.2:
-                return fallback_result
-            
-            return {"intent": "unknown", "confidence": 0.1}
-            
-        except Exception as e:
-            print(f"BERT prediction error: {e}")
-            return {"intent": "unknown", "confidence": 0.0}
-    
-    def _calculate_semantic_confidence(self, text_lower: str, patterns: Dict) -> float:
-        """Calculate semantic confidence score"""
-        confidence = 0.0
-        
-        # Primary keywords (highest weight)
-        primary_matches = 0
-        for keyword in patterns['primary']:
-            if keyword in text_lower:
-                primary_matches += 1
-                # Exact match bonus
-                if f" {keyword} " in f" {text_lower} ":
-                    confidence += self.confidence_weights['primary_keyword'] * 1.2
-                else:
-                    confidence += self.confidence_weights['primary_keyword']
-        
-        # Secondary keywords (medium weight)
-        secondary_matches = 0
-        for keyword in patterns['secondary']:
-            if keyword in text_lower:
-                secondary_matches += 1
-                confidence += self.confidence_weights['secondary_keyword']
-        
-        # Context phrases (bonus weight)
-        context_matches = 0
-        for phrase in patterns['context']:
-            if phrase in text_lower:
-                context_matches += 1
-                confidence += self.confidence_weights['context_phrase']
-        
-        # Combination bonus
-        if primary_matches >= 2:
-            confidence += self.confidence_weights['combination_bonus']
-        elif primary_matches >= 1 and secondary_matches >= 1:
-            confidence += self.confidence_weights['combination_bonus'] * 0.7
-        
-        return confidence
-    
-    def _contextual_fallback(self, text_lower: str) -> Dict[str, Any]:
-        """Contextual fallback with confidence"""
-        # Check for specific phrases first
-        phrase_mapping = {
+
+        # Phrase and keyword tables for the contextual fallback
+        self.fallback_phrases = {
             'book a flight': {'intent': 'book', 'confidence': 0.85},
             'reserve a seat': {'intent': 'book', 'confidence': 0.80}, 
             'buy a ticket': {'intent': 'book', 'confidence': 0.80},
@@ -1013,13 +1641,7 @@ class BertStyleModel:
             'can you help me': {'intent': 'help', 'confidence': 0.90},
             'i need assistance': {'intent': 'help', 'confidence': 0.85}
         }
-        
-        for phrase, intent_data in phrase_mapping.items():
-            if phrase in text_lower:
-                return intent_data
-        
-        # Fallback to keyword matching with lower confidence
-        keyword_mapping = {
+        self.fallback_keywords = {
             'book': ['book', 'reserve', 'buy', 'purchase'],
             'cancel': ['cancel', 'refund', 'delete'],
             'check': ['check', 'status', 'track', 'where', 'when'],
@@ -1029,28 +1651,11 @@ class BertStyleModel:
             'bye': ['bye', 'goodbye', 'thank you', 'thanks'],
             'help': ['help', 'support', 'assist']
         }
-        
-        for intent, keywords in keyword_mapping.items():
-            if any(keyword in text_lower for keyword in keywords):
-                # Calculate basic keyword confidence
-                keyword_count = sum(1 for keyword in keywords if keyword in text_lower)
-                confidence = 0.5 + (keyword_count * 0.1)
-                return {"intent": intent, "confidence": min(confidence, 0.75)}
-        
-        return {"intent": "unknown", "confidence": 0.1}
-    
-    def extract_entities(self, text: str) -> List[Dict[str, Any]]:
-        """BERT-style entity extraction with context awareness and confidence"""
-        entities = []
-        if not text:
-            return entities
-            
-        text_lower = text.lower()
-        
+
         # Context-aware entity patterns with confidence
-        patterns = {
+        self.entity_patterns = {
             'location': {
-                'pattern': r'\b(mumbai|delhi|london|paris|tokyo|dubai|kolkata|patna|goa|bangalore|chennai|hyderabad|pune|new york|los angeles|chicago)\b',
+                # Matched with the gazetteer rather than a regex
                 'context': ['from', 'to', 'in', 'at', 'near', 'around'],
                 'base_confidence': 0.90
             },
@@ -1080,39 +1685,289 @@ class BertStyleModel:
                 'base_confidence': 0.90
             }
         }
+
+        # Built-in locations seed the gazetteer; ModelManager swaps in a workspace gazetteer
+        self.known_locations = ['mumbai', 'delhi', 'london', 'paris', 'tokyo', 'dubai', 'kolkata', 'patna', 'goa',
+                                'bangalore', 'chennai', 'hyderabad', 'pune', 'new york', 'los angeles', 'chicago']
+        self.gazetteer = Gazetteer(self.known_locations)
+
+        # Known cities get a confidence boost in _adjust_entity_confidence
+        self.known_cities = frozenset({'mumbai', 'delhi', 'london', 'paris', 'tokyo', 'dubai', 
+                                       'kolkata', 'bangalore', 'chennai', 'hyderabad'})
+        self._date_format_regex = re.compile(r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}')
+        self._number_regex = re.compile(r'\d+')
+
+        self.compile_semantic_patterns()
+        self.compile_entity_patterns()
+
+    def train(self, training_data):
+        """BERT-style training simulation"""
+        self.training_data = training_data
+        print(f"BERT model trained with {len(training_data)} examples")
+
+    def compile_semantic_patterns(self):
+        """Compile semantic_patterns and confidence_weights into phrase -> intent matrices for batch scoring"""
+        self._semantic_intents = list(self.semantic_patterns)
+        self._semantic_automaton = KeywordAutomaton()
+        phrase_ids = {}
+        memberships = {'primary': [], 'secondary': [], 'context': []}
+
+        for intent_index, intent in enumerate(self._semantic_intents):
+            for kind in memberships:
+                for phrase in self.semantic_patterns[intent][kind]:
+                    if phrase not in phrase_ids:
+                        phrase_ids[phrase] = self._semantic_automaton.add(phrase)
+                    memberships[kind].append((phrase_ids[phrase], intent_index))
+        self._semantic_automaton.build()
+
+        shape = (len(phrase_ids), len(self._semantic_intents))
+        counts = {}
+        for kind, pairs in memberships.items():
+            # Duplicate entries are summed, matching one score per listed phrase
+            rows = [phrase_id for phrase_id, _ in pairs]
+            cols = [intent_index for _, intent_index in pairs]
+            counts[kind] = sparse.csr_matrix((np.ones(len(pairs)), (rows, cols)), shape=shape)
+
+        weights = self.confidence_weights
+        self._primary_counts = counts['primary']
+        self._secondary_counts = counts['secondary']
+        self._phrase_weights = (
+            counts['primary'] * weights['primary_keyword']
+            + counts['secondary'] * weights['secondary_keyword']
+            + counts['context'] * weights['context_phrase']
+        ).tocsr()
+        # Whole-word primary matches score 1.2x the primary weight
+        self._word_match_weights = (counts['primary'] * (weights['primary_keyword'] * 0.2)).tocsr()
+
+    def _phrase_hit_matrices(self, texts_lower: List[str]):
+        """Map texts to sparse phrase-hit and whole-word-hit matrices"""
+        rows, cols, word_rows, word_cols = [], [], [], []
+        for row, text_lower in enumerate(texts_lower):
+            for phrase_id, word_match in self._semantic_automaton.find_all(text_lower).items():
+                rows.append(row)
+                cols.append(phrase_id)
+                if word_match:
+                    word_rows.append(row)
+                    word_cols.append(phrase_id)
+        shape = (len(texts_lower), len(self._semantic_automaton.keywords))
+        hits = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+        word_hits = sparse.csr_matrix((np.ones(len(word_rows)), (word_rows, word_cols)), shape=shape)
+        return hits, word_hits
+
+    def score_intents_batch(self, texts: List[str]) -> np.ndarray:
+        """Semantic confidence of every intent for every text (rows follow texts, columns _semantic_intents)"""
+        texts_lower = [(text or '').lower().strip() for text in texts]
+        hits, word_hits = self._phrase_hit_matrices(texts_lower)
+
+        confidences = (hits @ self._phrase_weights + word_hits @ self._word_match_weights).toarray()
+        primary_matches = (hits @ self._primary_counts).toarray()
+        secondary_matches = (hits @ self._secondary_counts).toarray()
+
+        # Combination bonus
+        bonus = self.confidence_weights['combination_bonus']
+        confidences += np.where(primary_matches >= 2, bonus, 0.0)
+        confidences += np.where((primary_matches == 1) & (secondary_matches >= 1), bonus * 0.7, 0.0)
+        return confidences
+
+    def predict_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Vectorized predict_intent for many texts at once"""
+        if not texts:
+            return []
+        confidences = self.score_intents_batch(texts)
+        best_indices = confidences.argmax(axis=1)
+
+        results = []
+        for row, text in enumerate(texts):
+            if not text or not text.strip():
+                results.append({"intent": "unknown", "confidence": 0.0})
+                continue
+            best_confidence = float(confidences[row, best_indices[row]])
+            if best_confidence >= 0.3:  # Minimum confidence threshold
+                results.append({"intent": self._semantic_intents[best_indices[row]], "confidence": min(best_confidence, 0.99)})
+                continue
+            fallback_result = self._contextual_fallback(text.lower().strip())
+            if fallback_result["confidence"] > 0.2:
+                results.append(fallback_result)
+            else:
+                results.append({"intent": "unknown", "confidence": 0.1})
+        return results
         
-        for entity_type, config in patterns.items():
-            matches = re.finditer(config['pattern'], text_lower)
-            for match in matches:
-                # Check context around the match
-                start_context = max(0, match.start() - 30)
-                end_context = min(len(text_lower), match.end() + 30)
-                context = text_lower[start_context:end_context]
-                
-                # Calculate context score
-                context_score = sum(1 for context_word in config['context'] if context_word in context)
-                context_bonus = min(context_score * 0.05, 0.15)  # Max 15% bonus
-                
-                # Calculate final confidence
-                final_confidence = config['base_confidence'] + context_bonus
-                
-                # Apply entity-specific confidence adjustments
-                final_confidence = self._adjust_entity_confidence(
-                    match.group(), entity_type, final_confidence, text_lower
-                )
+    def predict_intent(self, text: str) -> Dict[str, Any]:
+        """BERT-style intent prediction with semantic understanding and confidence"""
+        try:
+            if not text or not text.strip():
+                return {"intent": "unknown", "confidence": 0.0}
                 
-                entity_text = text[match.start():match.end()]
-                if not any(e['text'] == entity_text for e in entities):
-                    entities.append({
-                        'text': entity_text,
-                        'label': entity_type,
-                        'start': match.start(),
-                        'end': match.end(),
-                        'confidence': min(final_confidence, 0.99)
-                    })
+            text_lower = text.lower().strip()
+            
+            # Calculate confidence scores for all intents
+            intent_confidences = {}
+            
+            for intent, patterns in self.semantic_patterns.items():
+                confidence = self._calculate_semantic_confidence(text_lower, patterns)
+                intent_confidences[intent] = confidence
+            
+            # Get the best intent
+            if intent_confidences:
+                best_intent, best_confidence = max(intent_confidences.items(), key=lambda x: x[1])
+                if best_confidence >= 0.3:  # Minimum confidence threshold
+                    return {"intent": best_intent, "confidence": min(best_confidence, 0.99)}
+            
+            # Fallback strategies
+            fallback_result = self._contextual_fallback(text_lower)
+            if fallback_result["confidence"] > 0.2:
+                return fallback_result
+            
+            return {"intent": "unknown", "confidence": 0.1}
+            
+        except Exception as e:
+            print(f"BERT prediction error: {e}")
+            return {"intent": "unknown", "confidence": 0.0}
+    
+    def _calculate_semantic_confidence(self, text_lower: str, patterns: Dict) -> float:
+        """Calculate semantic confidence score"""
+        confidence = 0.0
+        
+        # Primary keywords (highest weight)
+        primary_matches = 0
+        for keyword in patterns['primary']:
+            if keyword in text_lower:
+                primary_matches += 1
+                # Exact match bonus
+                if f" {keyword} " in f" {text_lower} ":
+                    confidence += self.confidence_weights['primary_keyword'] * 1.2
+                else:
+                    confidence += self.confidence_weights['primary_keyword']
+        
+        # Secondary keywords (medium weight)
+        secondary_matches = 0
+        for keyword in patterns['secondary']:
+            if keyword in text_lower:
+                secondary_matches += 1
+                confidence += self.confidence_weights['secondary_keyword']
+        
+        # Context phrases (bonus weight)
+        context_matches = 0
+        for phrase in patterns['context']:
+            if phrase in text_lower:
+                context_matches += 1
+                confidence += self.confidence_weights['context_phrase']
+        
+        # Combination bonus
+        if primary_matches >= 2:
+            confidence += self.confidence_weights['combination_bonus']
+        elif primary_matches >= 1 and secondary_matches >= 1:
+            confidence += self.confidence_weights['combination_bonus'] * 0.7
+        
+        return confidence
+    
+    def _contextual_fallback(self, text_lower: str) -> Dict[str, Any]:
+        """Contextual fallback with confidence"""
+        # Check for specific phrases first
+        for phrase, intent_data in self.fallback_phrases.items():
+            if phrase in text_lower:
+                return intent_data
+        
+        # Fallback to keyword matching with lower confidence
+        for intent, keywords in self.fallback_keywords.items():
+            if any(keyword in text_lower for keyword in keywords):
+                # Calculate basic keyword confidence
+                keyword_count = sum(1 for keyword in keywords if keyword in text_lower)
+                confidence = 0.5 + (keyword_count * 0.1)
+                return {"intent": intent, "confidence": min(confidence, 0.75)}
+        
+        return {"intent": "unknown", "confidence": 0.1}
+
+    def compile_entity_patterns(self):
+        """Compile entity_patterns into one named-group regex and a context-word automaton"""
+        self._entity_regex = re.compile('|'.join(
+            f"(?P<{entity_type}>{config['pattern']})" for entity_type, config in self.entity_patterns.items()
+            if 'pattern' in config
+        ))
+        self._context_automaton = KeywordAutomaton()
+        context_ids = {}
+        self._entity_context_ids = {}
+        for entity_type, config in self.entity_patterns.items():
+            for context_word in config['context']:
+                if context_word not in context_ids:
+                    context_ids[context_word] = self._context_automaton.add(context_word)
+            self._entity_context_ids[entity_type] = [context_ids[word] for word in config['context']]
+        self._context_automaton.build()
+
+    def _count_context_words(self, context_starts: Dict[int, List[int]], entity_type: str,
+                             window_start: int, window_end: int) -> int:
+        """Count the entity's context words that occur inside [window_start, window_end)"""
+        context_score = 0
+        keywords = self._context_automaton.keywords
+        for word_id in self._entity_context_ids[entity_type]:
+            starts = context_starts.get(word_id)
+            if not starts:
+                continue
+            # The first occurrence starting inside the window is also the first to end
+            position = bisect.bisect_left(starts, window_start)
+            if position < len(starts) and starts[position] + len(keywords[word_id]) <= window_end:
+                context_score += 1
+        return context_score
+    
+    def extract_entities(self, text: str) -> List[Dict[str, Any]]:
+        """BERT-style entity extraction with context awareness and confidence"""
+        entities = []
+        if not text:
+            return entities
+            
+        text_lower = text.lower()
+
+        # Start offsets of every context word, collected in one pass
+        context_starts = {}
+        for start, _, word_id in self._context_automaton.iter_matches(text_lower):
+            context_starts.setdefault(word_id, []).append(start)
+
+        # Gazetteer locations and regex matches; overlaps go to the leftmost, then longest
+        candidates = [(start, end, 'location') for start, end in self.gazetteer.find_spans(text_lower)]
+        candidates.extend((match.start(), match.end(), match.lastgroup) for match in self._entity_regex.finditer(text_lower))
+        candidates.sort(key=lambda candidate: (candidate[0], candidate[0] - candidate[1]))
+
+        seen_texts = set()
+        last_end = 0
+        for match_start, match_end, entity_type in candidates:
+            if match_start < last_end:
+                continue
+            last_end = match_end
+            config = self.entity_patterns[entity_type]
+
+            # Check context around the match
+            start_context = max(0, match_start - 30)
+            end_context = min(len(text_lower), match_end + 30)
+            
+            # Calculate context score
+            context_score = self._count_context_words(context_starts, entity_type, start_context, end_context)
+            context_bonus = min(context_score * 0.05, 0.15)  # Max 15% bonus
+            
+            # Calculate final confidence
+            final_confidence = config['base_confidence'] + context_bonus
+            
+            # Apply entity-specific confidence adjustments
+            final_confidence = self._adjust_entity_confidence(
+                text_lower[match_start:match_end], entity_type, final_confidence, text_lower
+            )
+            
+            entity_text = text[match_start:match_end]
+            if entity_text not in seen_texts:
+                seen_texts.add(entity_text)
+                entities.append({
+                    'text': entity_text,
+                    'label': entity_type,
+                    'start': match_start,
+                    'end': match_end,
+                    'confidence': min(final_confidence, 0.99)
+                })
         
         return entities
 
+    def extract_entities_batch(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        """extract_entities for many texts, in order"""
+        return [self.extract_entities(text) for text in texts]
+
     def _adjust_entity_confidence(self, entity_text: str, entity_type: str, 
                                 current_confidence: float, full_text: str) -> float:
         """Apply entity-specific confidence adjustments"""
@@ -1120,19 +1975,17 @@ class BertStyleModel:
         
         if entity_type == 'location':
             # Known cities get confidence boost
-            known_cities = {'mumbai', 'delhi', 'london', 'paris', 'tokyo', 'dubai', 
-                           'kolkata', 'bangalore', 'chennai', 'hyderabad'}
-            if entity_text.lower() in known_cities:
+            if entity_text.lower() in self.known_cities:
                 confidence *= 1.1
         
         elif entity_type == 'date':
             # Specific date formats get boost
-            if re.match(r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}', entity_text):
+            if self._date_format_regex.match(entity_text):
                 confidence *= 1.05
         
         elif entity_type == 'passengers':
             # Reasonable passenger numbers get boost
-            numbers = re.findall(r'\d+', entity_text)
+            numbers = self._number_regex.findall(entity_text)
             if numbers:
                 passenger_count = int(numbers[0])
                 if 1 <= passenger_count <= 20:
@@ -1140,38 +1993,343 @@ class BertStyleModel:
         
         return min(confidence, 0.99)
 
+# Trainable TF-IDF + linear classifier model
+class TfidfLinearModel:
+    def __init__(self, classifier: str = "logreg"):
+        self.classifier = classifier
+        self.pipeline = None
+        self.intents = []
+        # Entities still come from the rule-based extractor; ModelManager swaps in a workspace one
+        self.entity_model = simple_model
+
+    def _build_pipeline(self, class_counts: Dict[str, int]) -> Pipeline:
+        """Word and character n-gram TF-IDF features feeding a probabilistic linear classifier"""
+        features = FeatureUnion([
+            ('word', TfidfVectorizer(analyzer='word', ngram_range=(1, 2), sublinear_tf=True, max_features=100000)),
+            ('char', TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 5), sublinear_tf=True, max_features=200000))
+        ])
+        # A calibrated linear SVM needs a few examples of every intent for its internal folds
+        if self.classifier == "svm" and min(class_counts.values()) >= 3:
+            classifier = CalibratedClassifierCV(LinearSVC(C=1.0), cv=3)
+        else:
+            classifier = LogisticRegression(C=10.0, max_iter=1000)
+        return Pipeline([('features', features), ('classifier', classifier)])
+
+    def fit(self, texts: List[str], intents: List[str]) -> 'TfidfLinearModel':
+        """Fit on parallel lists of texts and intents"""
+        class_counts = {}
+        for intent in intents:
+            class_counts[intent] = class_counts.get(intent, 0) + 1
+        if len(class_counts) < 2:
+            raise ValueError("Need annotations for at least 2 different intents to train")
+
+        self.pipeline = self._build_pipeline(class_counts)
+        self.pipeline.fit(texts, intents)
+        self.intents = [str(intent) for intent in self.pipeline.classes_]
+        # Pruned-term sets are only kept for introspection and bloat the artifact
+        for _, vectorizer in self.pipeline.named_steps['features'].transformer_list:
+            vectorizer.stop_words_ = None
+        return self
+
+    @classmethod
+    def train_and_evaluate(cls, texts: List[str], intents: List[str], classifier: str = "logreg", progress=None):
+        """Score on a held-out split, then refit on everything; returns (model, metrics)"""
+        intent_counts = {}
+        for intent in intents:
+            intent_counts[intent] = intent_counts.get(intent, 0) + 1
+
+        test_size = max(int(round(len(texts) * 0.2)), len(intent_counts))
+        evaluation = "held_out"
+        if len(intent_counts) >= 2 and len(texts) - test_size >= len(intent_counts):
+            stratify = intents if min(intent_counts.values()) >= 2 else None
+            train_texts, test_texts, train_intents, test_intents = train_test_split(
+                texts, intents, test_size=test_size, random_state=42, stratify=stratify
+            )
+            if len(set(train_intents)) < 2:
+                train_texts, train_intents, test_texts, test_intents = texts, intents, texts, intents
+                evaluation = "training"
+        else:
+            # Too little data to hold anything out - report training fit instead
+            train_texts, train_intents, test_texts, test_intents = texts, intents, texts, intents
+            evaluation = "training"
+
+        if progress:
+            progress("evaluating", 0.3)
+        predictions = cls(classifier).fit(train_texts, train_intents).pipeline.predict(test_texts)
+        precision, recall, f1_score, _ = precision_recall_fscore_support(
+            test_intents, predictions, average='weighted', zero_division=0
+        )
+        metrics = {
+            'accuracy': round(float(accuracy_score(test_intents, predictions)), 3),
+            'precision': round(float(precision), 3),
+            'recall': round(float(recall), 3),
+            'f1_score': round(float(f1_score), 3),
+            'training_samples': len(texts),
+            'test_samples': len(test_texts),
+            'evaluation': evaluation
+        }
+        if progress:
+            progress("fitting", 0.6)
+        return cls(classifier).fit(texts, intents), metrics
+
+    def to_bytes(self) -> bytes:
+        """Compressed artifact holding only the fitted pipeline"""
+        buffer = io.BytesIO()
+        joblib.dump({'classifier': self.classifier, 'pipeline': self.pipeline}, buffer, compress=3)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, artifact: bytes) -> 'TfidfLinearModel':
+        stored = joblib.load(io.BytesIO(artifact))
+        model = cls(stored['classifier'])
+        model.pipeline = stored['pipeline']
+        model.intents = [str(intent) for intent in model.pipeline.classes_]
+        return model
+
+    def predict_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Intent and calibrated probability for many texts"""
+        if not texts:
+            return []
+        probabilities = self.pipeline.predict_proba([text or '' for text in texts])
+        best_indices = probabilities.argmax(axis=1)
+        results = []
+        for row, text in enumerate(texts):
+            if not text or not text.strip():
+                results.append({"intent": "unknown", "confidence": 0.0})
+            else:
+                results.append({"intent": self.intents[best_indices[row]], "confidence": float(probabilities[row, best_indices[row]])})
+        return results
+
+    def predict_intent(self, text: str) -> Dict[str, Any]:
+        return self.predict_batch([text])[0]
+
+    def extract_entities(self, text: str) -> List[Dict[str, Any]]:
+        return self.entity_model.extract_entities(text)
+
+    def extract_entities_batch(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        return self.entity_model.extract_entities_batch(texts)
+
 # Initialize models
 simple_model = SimplePretrainedModel()
 rasa_model = RasaStyleModel()
 bert_model = BertStyleModel()
 
+# Model cache limits
+MODEL_CACHE_MAX_MODELS = int(os.environ.get("MODEL_CACHE_MAX_MODELS", "32"))
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("MODEL_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+def training_fingerprint(training_data) -> str:
+    """Stable content fingerprint of a training set (same value in every process)"""
+    payload = json.dumps(training_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Charged for every cached model on top of its training data (rule-based models share their word lists)
+MODEL_BASE_BYTES = 64 * 1024
+
+def estimate_model_size(training_data=None, artifact=None) -> int:
+    """Rough resident size of a model, from its artifact length or training-set size (no pickling)"""
+    if artifact:
+        return len(artifact)
+    return MODEL_BASE_BYTES + sum(len(str(example)) for example in training_data or [])
+
 # Model Manager to handle model instances
 class ModelManager:
-    def __init__(self):
-        self.models = {}
-    
-    def get_model(self, model_type, training_data=None):
-        key = f"{model_type}_{hash(str(training_data)) if training_data else 'default'}"
-        
-        if key not in self.models:
+    def __init__(self, max_models: int = MODEL_CACHE_MAX_MODELS, max_bytes: int = MODEL_CACHE_MAX_BYTES):
+        self.models = OrderedDict()
+        self.model_sizes = {}
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+    
+    def get_model(self, model_type, training_data=None, workspace=None, fingerprint=None, artifact=None, load=None):
+        """Get a model built from training_data (or a trained artifact), keyed by its fingerprint.
+        Callers that already know the fingerprint may pass load instead, called only on a miss
+        and returning (training_data, artifact)"""
+        if artifact:
+            # Keyed on the artifact itself - svm and logreg models trained on the same data differ
+            fingerprint = hashlib.sha256(artifact).hexdigest()
+        elif training_data:
+            fingerprint = fingerprint or training_fingerprint(training_data)
+        elif not (load and fingerprint):
+            fingerprint = 'default'
+            load = None
+        key = (model_type, fingerprint, workspace or 'builtin')
+        
+        with self._lock:
+            model = self.models.get(key)
+            if model is not None:
+                self.models.move_to_end(key)
+                self.hits += 1
+        
+        if model is None:
+            if load:
+                training_data, artifact = load()
             if model_type == "spacy":
-                self.models[key] = simple_model
+                model = SimplePretrainedModel() if workspace else simple_model
             elif model_type == "rasa":
                 model = RasaStyleModel()
                 if training_data:
                     model.training_data = training_data
-                self.models[key] = model
             elif model_type == "bert":
                 model = BertStyleModel()
                 if training_data:
                     model.training_data = training_data
-                self.models[key] = model
+            elif model_type == "tfidf" and artifact:
+                model = TfidfLinearModel.from_bytes(artifact)
             else:
                 return None
-        return self.models[key]
+            self._store(key, model, estimate_model_size(training_data, artifact))
+        
+        if workspace and model_type in ("spacy", "bert"):
+            # Picks up edits to the workspace locations file without rebuilding the model
+            seed = model.known_cities if model_type == "spacy" else model.known_locations
+            model.gazetteer = load_gazetteer(workspace, seed)
+        elif workspace and model_type == "tfidf":
+            model.entity_model = self.get_model("spacy", workspace=workspace)
+        return model
+
+    def _store(self, key, model, size):
+        """Insert a freshly built model and evict least recently used ones past the limits"""
+        with self._lock:
+            self.misses += 1
+            if key in self.models:
+                self.resident_bytes -= self.model_sizes.pop(key)
+            self.models[key] = model
+            self.model_sizes[key] = size
+            self.resident_bytes += size
+            # Always keep the newest model, even if it alone is over the byte limit
+            while len(self.models) > 1 and (len(self.models) > self.max_models or self.resident_bytes > self.max_bytes):
+                evicted_key, _ = self.models.popitem(last=False)
+                self.resident_bytes -= self.model_sizes.pop(evicted_key)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache hit/miss/eviction counters and resident size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "resident_models": len(self.models),
+                "resident_bytes": self.resident_bytes,
+                "max_models": self.max_models,
+                "max_bytes": self.max_bytes
+            }
 
 model_manager = ModelManager()
 
+# Hot model registry - ready-to-serve models keyed by (project_id, workspace, model_type)
+MODEL_REGISTRY_TTL = float(os.environ.get("MODEL_REGISTRY_TTL", "5"))
+
+class ModelRegistry:
+    def __init__(self, ttl: float = MODEL_REGISTRY_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self, model_id: int) -> Dict[str, Any]:
+        """Read and unpickle one trained model"""
+        db = get_db()
+        if not db:
+            raise RuntimeError("Database connection failed")
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT model_data FROM trained_models WHERE id = %s", (model_id,))
+            model_record = cursor.fetchone()
+        finally:
+            cursor.close()
+            db.close()
+        if not model_record:
+            raise RuntimeError(f"Trained model {model_id} no longer exists")
+        return pickle.loads(model_record['model_data'])
+
+    def _serve(self, entry: Dict[str, Any], model_type: str, workspace: str, model_data: Optional[Dict[str, Any]] = None):
+        """Resolve an entry through model_manager so its LRU decides what stays resident.
+        Entries hold no artifact or training data; a cache miss reloads them by model id"""
+        def load():
+            data = model_data or self._load(entry['model_id'])
+            return data.get('training_data', []), data.get('artifact')
+
+        model = model_manager.get_model(model_type, workspace=workspace, fingerprint=entry['fingerprint'], load=load)
+        if not model:
+            return None, None, f"Invalid model type: {model_type}"
+        return model, entry['model_info'], None
+
+    def get(self, project_id: int, model_type: str, workspace: str):
+        """Get (model, model_data, error) for the latest trained model, unpickling only when a newer one exists"""
+        key = (project_id, workspace, model_type)
+        entry = self._entries.get(key)
+        if entry and time.monotonic() - entry['checked_at'] < self.ttl:
+            return self._serve(entry, model_type, workspace)
+
+        db = get_db()
+        if not db:
+            if entry:
+                # Keep serving the last known model while the database is unreachable
+                return self._serve(entry, model_type, workspace)
+            return None, None, "Database connection failed"
+
+        cursor = db.cursor(dictionary=True)
+        try:
+            # Cheap version check - the id of the latest model, without the BLOB
+            cursor.execute(LATEST_MODEL_SQL, (project_id, model_type, workspace))
+            latest = cursor.fetchone()
+            if not latest:
+                self.invalidate(project_id, workspace, model_type)
+                return None, None, f"No trained {model_type} model found in {workspace}"
+
+            if entry and entry['model_id'] == latest['id']:
+                entry['checked_at'] = time.monotonic()
+                return self._serve(entry, model_type, workspace)
+
+            cursor.execute("SELECT model_data FROM trained_models WHERE id = %s", (latest['id'],))
+            model_record = cursor.fetchone()
+            if not model_record:
+                return None, None, f"No trained {model_type} model found in {workspace}"
+            model_data = pickle.loads(model_record['model_data'])
+        finally:
+            cursor.close()
+            db.close()
+
+        # Keep only the ids and hashes - the model itself lives (or is evicted) in model_manager.
+        # Models trained before fingerprints were stored get one computed here, once
+        training_data = model_data.get('training_data', [])
+        artifact = model_data.get('artifact')
+        if artifact:
+            fingerprint = hashlib.sha256(artifact).hexdigest()
+        elif training_data:
+            fingerprint = model_data.get('fingerprint') or training_fingerprint(training_data)
+        else:
+            fingerprint = None
+        entry = {
+            'model_id': latest['id'],
+            'fingerprint': fingerprint,
+            'model_info': {name: value for name, value in model_data.items() if name not in ('artifact', 'training_data')},
+            'checked_at': time.monotonic()
+        }
+        with self._lock:
+            self._entries[key] = entry
+        return self._serve(entry, model_type, workspace, model_data)
+
+    def invalidate(self, project_id: Optional[int] = None, workspace: Optional[str] = None, model_type: Optional[str] = None):
+        """Drop cached models matching every given field (no arguments drops everything)"""
+        with self._lock:
+            for key in list(self._entries):
+                entry_project, entry_workspace, entry_type = key
+                if ((project_id is None or entry_project == project_id)
+                        and (workspace is None or entry_workspace == workspace)
+                        and (model_type is None or entry_type == model_type)):
+                    del self._entries[key]
+
+model_registry = ModelRegistry()
+
 # Create tables if they don't exist
 def init_db():
     db = get_db()
@@ -1286,6 +2444,28 @@ def migrate_user_roles():
         cursor.close()
         db.close()
 
+def migrate_revoked_tokens_table():
+    """Create the revoked_tokens table used when TOKEN_REVOCATION is enabled"""
+    db = get_db()
+    if not db:
+        print("Database connection failed")
+        return
+    
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                jti CHAR(32) PRIMARY KEY,
+                expires_at DATETIME NOT NULL,
+                INDEX idx_revoked_tokens_expires (expires_at)
+            )
+        """)
+    except Exception as e:
+        print(f"Migration error: {e}")
+    finally:
+        cursor.close()
+        db.close()
+
 # Call this after init_db()
 #migrate_user_roles()
 # Add this function after init_db()
@@ -1395,6 +2575,169 @@ def migrate_activity_logs_table():
     finally:
         cursor.close()
         db.close()
+def migrate_training_jobs_table():
+    """Add training_jobs table for background training"""
+    db = get_db()
+    if not db:
+        print("Database connection failed")
+        return
+    
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS training_jobs (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                project_id INT,
+                username VARCHAR(50),
+                model_type VARCHAR(50),
+                classifier VARCHAR(20) DEFAULT 'logreg',
+                workspace VARCHAR(50) DEFAULT 'workspace1',
+                status VARCHAR(20) DEFAULT 'queued',
+                stage VARCHAR(50) DEFAULT 'queued',
+                progress FLOAT DEFAULT 0.0,
+                trained_model_id INT NULL,
+                result JSON,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP NULL,
+                updated_at TIMESTAMP NULL,
+                finished_at TIMESTAMP NULL,
+                INDEX idx_training_jobs_project (project_id, workspace, created_at)
+            )
+        """)
+    except Exception as e:
+        print(f"Migration error: {e}")
+    finally:
+        cursor.close()
+        db.close()
+def count_duplicate_annotations(cursor) -> int:
+    """Annotations that repeat the text (ignoring case) of another one in the same project and workspace"""
+    cursor.execute("""
+        SELECT COALESCE(SUM(copies - 1), 0) FROM (
+            SELECT COUNT(*) AS copies FROM annotations
+            WHERE project_id IS NOT NULL AND workspace IS NOT NULL AND text_hash IS NOT NULL
+            GROUP BY project_id, workspace, text_hash
+            HAVING COUNT(*) > 1
+        ) AS duplicated
+    """)
+    return int(cursor.fetchone()[0])
+
+def migrate_annotations_text_hash():
+    """Add a text hash column and a unique (project, workspace, text) key so annotations can be upserted.
+
+    Texts are hashed lower-cased, so "Hello" and "hello" are one annotation as they were for the old
+    case-insensitive `text = %s` lookups. Existing duplicates are only reported here; they are removed
+    by the explicit `python newback.py dedupe-annotations` step, after which the key is added.
+    """
+    db = get_db()
+    if not db:
+        print("Database connection failed")
+        return
+    
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.STATISTICS 
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'annotations' AND INDEX_NAME = 'uniq_annotation_text'
+        """)
+        has_key = cursor.fetchone()[0] > 0
+        
+        cursor.execute("""
+            SELECT GENERATION_EXPRESSION FROM information_schema.COLUMNS 
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'annotations' AND COLUMN_NAME = 'text_hash'
+        """)
+        column = cursor.fetchone()
+        if column is None or 'lower' not in (column[0] or '').lower():
+            # Generated, so every insert path fills it in. Columns from before the hash was
+            # case-insensitive are redefined, and their key re-added once the texts are checked again
+            if has_key:
+                cursor.execute("ALTER TABLE annotations DROP INDEX uniq_annotation_text")
+                has_key = False
+            action = "ADD" if column is None else "MODIFY"
+            cursor.execute(f"ALTER TABLE annotations {action} COLUMN text_hash CHAR(64) AS (SHA2(LOWER(text), 256)) STORED")
+            print("Database migrated successfully: Added case-insensitive text_hash column to annotations")
+        
+        if not has_key:
+            duplicates = count_duplicate_annotations(cursor)
+            if duplicates:
+                print(f"Found {duplicates} duplicate annotations (same project, workspace and text, ignoring case); "
+                      f"the unique annotation text key is not added until they are removed with: "
+                      f"python newback.py dedupe-annotations")
+                return
+            cursor.execute("ALTER TABLE annotations ADD UNIQUE KEY uniq_annotation_text (project_id, workspace, text_hash)")
+            print("Database migrated successfully: Added unique annotation text key")
+            
+    except Exception as e:
+        print(f"Migration error: {e}")
+    finally:
+        cursor.close()
+        db.close()
+
+def run_dedupe_annotations() -> int:
+    """Command-line step: python newback.py dedupe-annotations
+
+    Keeps the newest copy of each duplicated annotation, moving the older ones to
+    annotations_removed_duplicates, then adds the unique annotation text key.
+    """
+    db = get_db()
+    if not db:
+        print("Database connection failed")
+        return 1
+    
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS annotations_removed_duplicates (
+                id INT PRIMARY KEY,
+                project_id INT,
+                text TEXT,
+                intent VARCHAR(100),
+                entities JSON,
+                intent_confidence FLOAT,
+                entity_confidences JSON,
+                created_at TIMESTAMP NULL,
+                workspace VARCHAR(50),
+                kept_id INT,
+                removed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        db.start_transaction()
+        cursor.execute("""
+            INSERT IGNORE INTO annotations_removed_duplicates
+                (id, project_id, text, intent, entities, intent_confidence, entity_confidences, created_at, workspace, kept_id)
+            SELECT older.id, older.project_id, older.text, older.intent, older.entities, older.intent_confidence,
+                   older.entity_confidences, older.created_at, older.workspace, MAX(newer.id)
+            FROM annotations older
+            JOIN annotations newer
+              ON newer.project_id = older.project_id
+             AND newer.workspace = older.workspace
+             AND newer.text_hash = older.text_hash
+             AND newer.id > older.id
+            GROUP BY older.id
+        """)
+        cursor.execute("""
+            DELETE older FROM annotations older
+            JOIN annotations newer
+              ON newer.project_id = older.project_id
+             AND newer.workspace = older.workspace
+             AND newer.text_hash = older.text_hash
+             AND newer.id > older.id
+        """)
+        removed = cursor.rowcount
+        db.commit()
+        print(f"Removed {removed} duplicate annotations (copies kept in annotations_removed_duplicates)")
+    except Exception as e:
+        if db.in_transaction:
+            db.rollback()
+        print(f"Deduplication error: {e}")
+        return 1
+    finally:
+        cursor.close()
+        db.close()
+    
+    migrate_annotations_text_hash()
+    return 0
+
 def migrate_feedback_table_complete():
     """Complete migration for feedback table with all required columns"""
     db = get_db()
@@ -1591,9 +2934,491 @@ def verify_feedback_table():
         cursor.close()
         db.close()
 
-# Call this function
-              
-# Add to your existing migration calls
+# Composite indexes for the hot query paths - (table, index name, columns)
+HOT_QUERY_INDEXES = [
+    ('annotations', 'idx_annotations_project_ws_created', 'project_id, workspace, created_at'),
+    ('annotations', 'idx_annotations_project_ws_intent', 'project_id, workspace, intent, intent_confidence'),
+    ('annotations', 'idx_annotations_project_ws_conf', 'project_id, workspace, intent_confidence'),
+    ('annotations', 'idx_annotations_project_conf', 'project_id, intent_confidence'),
+    ('annotations', 'idx_annotations_ws_intent', 'workspace, intent, intent_confidence'),
+    ('trained_models', 'idx_models_project_type_ws_created', 'project_id, model_type, workspace, created_at'),
+    ('trained_models', 'idx_models_project_ws_created', 'project_id, workspace, created_at'),
+    ('trained_models', 'idx_models_ws_created', 'workspace, created_at'),
+    ('datasets', 'idx_datasets_project_ws', 'project_id, workspace'),
+    ('datasets', 'idx_datasets_ws_project', 'workspace, project_id'),
+    ('projects', 'idx_projects_username_ws', 'username, workspace'),
+    ('projects', 'idx_projects_ws_created', 'workspace, created_at'),
+    ('feedback', 'idx_feedback_project_ws_created', 'project_id, workspace, created_at'),
+    ('feedback', 'idx_feedback_ws_type', 'workspace, feedback_type'),
+    ('feedback', 'idx_feedback_ws_model', 'workspace, model_type'),
+    ('feedback', 'idx_feedback_created', 'created_at'),
+    ('feedback', 'idx_feedback_ws_created', 'workspace, created_at'),
+    ('activity_logs', 'idx_activity_ws_type', 'workspace, activity_type'),
+    ('activity_logs', 'idx_activity_ws_created', 'workspace, created_at'),
+    ('dataset_rows', 'idx_dataset_rows_sample', 'dataset_id, sample_key, row_index'),
+    ('dataset_rows', 'idx_dataset_rows_label', 'dataset_id, label, sample_key, row_index'),
+]
+
+def migrate_hot_query_indexes():
+    """Create the composite indexes in HOT_QUERY_INDEXES that don't exist yet"""
+    db = get_db()
+    if not db:
+        print("Database connection failed")
+        return
+    
+    cursor = db.cursor()
+    try:
+        for table, index_name, columns in HOT_QUERY_INDEXES:
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.STATISTICS 
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+            """, (table, index_name))
+            if cursor.fetchone()[0] == 0:
+                try:
+                    cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+                    print(f"Database migrated successfully: Created index {index_name} on {table}")
+                except Exception as e:
+                    print(f"Migration error creating {index_name}: {e}")
+    except Exception as e:
+        print(f"Migration error: {e}")
+    finally:
+        cursor.close()
+        db.close()
+
+# Annotation statistics rollup - one row per (project, workspace, intent), kept current by triggers on annotations
+annotation_stats_ready = False
+
+ANNOTATION_STATS_DELTA = """
+    COALESCE({row}.project_id, 0), COALESCE({row}.workspace, ''), COALESCE({row}.intent, ''),
+    {sign}1, {sign}({row}.intent_confidence IS NOT NULL), {sign}COALESCE({row}.intent_confidence, 0),
+    {sign}COALESCE({row}.intent_confidence < 0.5, 0),
+    {sign}COALESCE({row}.intent_confidence >= 0.5 AND {row}.intent_confidence < 0.8, 0),
+    {sign}COALESCE({row}.intent_confidence >= 0.8, 0)
+"""
+
+ANNOTATION_STATS_UPSERT = """
+    INSERT INTO annotation_stats 
+    (project_id, workspace, intent, annotation_count, confidence_count, confidence_sum, low_count, medium_count, high_count)
+    VALUES ({values})
+    ON DUPLICATE KEY UPDATE 
+        annotation_count = annotation_count + VALUES(annotation_count),
+        confidence_count = confidence_count + VALUES(confidence_count),
+        confidence_sum = confidence_sum + VALUES(confidence_sum),
+        low_count = low_count + VALUES(low_count),
+        medium_count = medium_count + VALUES(medium_count),
+        high_count = high_count + VALUES(high_count)
+"""
+
+def migrate_annotation_stats_table():
+    """Create the annotation_stats rollup, backfill it and install the triggers that maintain it"""
+    global annotation_stats_ready
+    db = get_db()
+    if not db:
+        print("Database connection failed")
+        return
+    
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.TABLES 
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'annotation_stats'
+        """)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("""
+                CREATE TABLE annotation_stats (
+                    project_id INT NOT NULL,
+                    workspace VARCHAR(50) NOT NULL,
+                    intent VARCHAR(100) NOT NULL,
+                    annotation_count INT NOT NULL DEFAULT 0,
+                    confidence_count INT NOT NULL DEFAULT 0,
+                    confidence_sum DOUBLE NOT NULL DEFAULT 0,
+                    low_count INT NOT NULL DEFAULT 0,
+                    medium_count INT NOT NULL DEFAULT 0,
+                    high_count INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (project_id, workspace, intent)
+                )
+            """)
+            print("Database migrated successfully: Created annotation_stats table")
+        
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.TRIGGERS 
+            WHERE TRIGGER_SCHEMA = DATABASE() AND EVENT_OBJECT_TABLE = 'annotations' AND TRIGGER_NAME LIKE 'annotations_stats_%'
+        """)
+        if cursor.fetchone()[0] < 3:
+            # Without all three triggers the rollup can't be trusted - rebuild it, then start maintaining it
+            # Writers are locked out until the triggers exist, so no annotation change is missed in between
+            cursor.execute("LOCK TABLES annotations WRITE, annotation_stats WRITE")
+            try:
+                cursor.execute("DROP TRIGGER IF EXISTS annotations_stats_insert")
+                cursor.execute("DROP TRIGGER IF EXISTS annotations_stats_update")
+                cursor.execute("DROP TRIGGER IF EXISTS annotations_stats_delete")
+                cursor.execute("DELETE FROM annotation_stats")
+                cursor.execute("""
+                    INSERT INTO annotation_stats 
+                    (project_id, workspace, intent, annotation_count, confidence_count, confidence_sum, low_count, medium_count, high_count)
+                    SELECT COALESCE(project_id, 0), COALESCE(workspace, ''), COALESCE(intent, ''),
+                           COUNT(*), COUNT(intent_confidence), COALESCE(SUM(intent_confidence), 0),
+                           COALESCE(SUM(intent_confidence < 0.5), 0),
+                           COALESCE(SUM(intent_confidence >= 0.5 AND intent_confidence < 0.8), 0),
+                           COALESCE(SUM(intent_confidence >= 0.8), 0)
+                    FROM annotations
+                    GROUP BY COALESCE(project_id, 0), COALESCE(workspace, ''), COALESCE(intent, '')
+                """)
+            
+                add_new = ANNOTATION_STATS_UPSERT.format(values=ANNOTATION_STATS_DELTA.format(row="NEW", sign=""))
+                remove_old = ANNOTATION_STATS_UPSERT.format(values=ANNOTATION_STATS_DELTA.format(row="OLD", sign="-"))
+                cursor.execute(f"CREATE TRIGGER annotations_stats_insert AFTER INSERT ON annotations FOR EACH ROW {add_new}")
+                cursor.execute(f"CREATE TRIGGER annotations_stats_delete AFTER DELETE ON annotations FOR EACH ROW {remove_old}")
+                cursor.execute(f"""
+                    CREATE TRIGGER annotations_stats_update AFTER UPDATE ON annotations FOR EACH ROW
+                    BEGIN
+                        IF NOT (OLD.project_id <=> NEW.project_id AND OLD.workspace <=> NEW.workspace
+                                AND OLD.intent <=> NEW.intent AND OLD.intent_confidence <=> NEW.intent_confidence) THEN
+                            {remove_old};
+                            {add_new};
+                        END IF;
+                    END
+                """)
+            finally:
+                cursor.execute("UNLOCK TABLES")
+            print("Database migrated successfully: Created annotation_stats triggers")
+        annotation_stats_ready = True
+            
+    except Exception as e:
+        print(f"Migration error: {e}")
+    finally:
+        cursor.close()
+        db.close()
+
+# Workspace summary rollup - dataset count, stored bytes and model count per workspace, kept current by triggers
+workspace_summary_ready = False
+
+WORKSPACE_SUMMARY_UPSERT = """
+    INSERT INTO workspace_summary (workspace, dataset_count, storage_bytes, model_count)
+    VALUES (COALESCE({row}.workspace, ''), {datasets}, {storage}, {models})
+    ON DUPLICATE KEY UPDATE 
+        dataset_count = dataset_count + VALUES(dataset_count),
+        storage_bytes = storage_bytes + VALUES(storage_bytes),
+        model_count = model_count + VALUES(model_count)
+"""
+
+def migrate_workspace_summary_table():
+    """Add datasets.file_size, create the workspace_summary rollup and install the triggers that maintain it"""
+    global workspace_summary_ready
+    db = get_db()
+    if not db:
+        print("Database connection failed")
+        return
+    
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS 
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'datasets' AND COLUMN_NAME = 'file_size'
+        """)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("ALTER TABLE datasets ADD COLUMN file_size BIGINT")
+            # Sizes are written at upload time; only rows from before the column existed need measuring
+            cursor.execute("UPDATE datasets SET file_size = COALESCE(LENGTH(file_data), 0)")
+            print("Database migrated successfully: Added file_size column to datasets")
+        
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.TABLES 
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'workspace_summary'
+        """)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("""
+                CREATE TABLE workspace_summary (
+                    workspace VARCHAR(50) NOT NULL PRIMARY KEY,
+                    dataset_count INT NOT NULL DEFAULT 0,
+                    storage_bytes BIGINT NOT NULL DEFAULT 0,
+                    model_count INT NOT NULL DEFAULT 0
+                )
+            """)
+            print("Database migrated successfully: Created workspace_summary table")
+        
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.TRIGGERS 
+            WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME LIKE 'workspace_summary_%'
+        """)
+        if cursor.fetchone()[0] < 5:
+            # Rebuild from the source tables, then keep it current
+            for trigger in ("datasets_insert", "datasets_update", "datasets_delete", "models_insert", "models_delete"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS workspace_summary_{trigger}")
+            cursor.execute("DELETE FROM workspace_summary")
+            cursor.execute("""
+                INSERT INTO workspace_summary (workspace, dataset_count, storage_bytes, model_count)
+                SELECT workspace, SUM(dataset_count), SUM(storage_bytes), SUM(model_count)
+                FROM (
+                    SELECT COALESCE(workspace, '') as workspace, COUNT(*) as dataset_count,
+                           COALESCE(SUM(file_size), 0) as storage_bytes, 0 as model_count
+                    FROM datasets GROUP BY COALESCE(workspace, '')
+                    UNION ALL
+                    SELECT COALESCE(workspace, ''), 0, 0, COUNT(*)
+                    FROM trained_models GROUP BY COALESCE(workspace, '')
+                ) per_table
+                GROUP BY workspace
+            """)
+            
+            add_dataset = WORKSPACE_SUMMARY_UPSERT.format(row="NEW", datasets="1", storage="COALESCE(NEW.file_size, 0)", models="0")
+            remove_dataset = WORKSPACE_SUMMARY_UPSERT.format(row="OLD", datasets="-1", storage="-COALESCE(OLD.file_size, 0)", models="0")
+            cursor.execute(f"CREATE TRIGGER workspace_summary_datasets_insert AFTER INSERT ON datasets FOR EACH ROW {add_dataset}")
+            cursor.execute(f"CREATE TRIGGER workspace_summary_datasets_delete AFTER DELETE ON datasets FOR EACH ROW {remove_dataset}")
+            cursor.execute(f"""
+                CREATE TRIGGER workspace_summary_datasets_update AFTER UPDATE ON datasets FOR EACH ROW
+                BEGIN
+                    IF NOT (OLD.workspace <=> NEW.workspace AND OLD.file_size <=> NEW.file_size) THEN
+                        {remove_dataset};
+                        {add_dataset};
+                    END IF;
+                END
+            """)
+            add_model = WORKSPACE_SUMMARY_UPSERT.format(row="NEW", datasets="0", storage="0", models="1")
+            remove_model = WORKSPACE_SUMMARY_UPSERT.format(row="OLD", datasets="0", storage="0", models="-1")
+            cursor.execute(f"CREATE TRIGGER workspace_summary_models_insert AFTER INSERT ON trained_models FOR EACH ROW {add_model}")
+            cursor.execute(f"CREATE TRIGGER workspace_summary_models_delete AFTER DELETE ON trained_models FOR EACH ROW {remove_model}")
+            print("Database migrated successfully: Created workspace_summary triggers")
+        workspace_summary_ready = True
+            
+    except Exception as e:
+        print(f"Migration error: {e}")
+    finally:
+        cursor.close()
+        db.close()
+
+def migrate_dataset_storage():
+    """Add the file-store columns to datasets and create the dataset_rows table filled at ingest time"""
+    db = get_db()
+    if not db:
+        print("Database connection failed")
+        return
+    
+    cursor = db.cursor()
+    try:
+        columns = [
+            ("storage_path", "VARCHAR(255)"),
+            ("file_format", "VARCHAR(10)"),
+            ("encoding", "VARCHAR(20)"),
+            ("content_hash", "CHAR(64)"),
+            ("row_count", "INT"),
+            ("ingest_status", "VARCHAR(20)"),
+            ("csv_delimiter", "VARCHAR(1)"),
+            ("ingest_started_at", "TIMESTAMP NULL"),
+        ]
+        for column_name, column_type in columns:
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.COLUMNS 
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'datasets' AND COLUMN_NAME = %s
+            """, (column_name,))
+            if cursor.fetchone()[0] == 0:
+                cursor.execute(f"ALTER TABLE datasets ADD COLUMN {column_name} {column_type}")
+                print(f"Database migrated successfully: Added {column_name} column to datasets")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS dataset_rows (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                dataset_id INT NOT NULL,
+                row_index INT NOT NULL,
+                text TEXT NOT NULL,
+                label VARCHAR(100),
+                sample_key INT UNSIGNED,
+                UNIQUE KEY uniq_dataset_row (dataset_id, row_index),
+                FOREIGN KEY (dataset_id) REFERENCES datasets(id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS 
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'dataset_rows' AND COLUMN_NAME = 'sample_key'
+        """)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("ALTER TABLE dataset_rows ADD COLUMN sample_key INT UNSIGNED")
+            cursor.execute("UPDATE dataset_rows SET sample_key = FLOOR(RAND() * 2147483648)")
+            print("Database migrated successfully: Added sample_key column to dataset_rows")
+            
+    except Exception as e:
+        print(f"Migration error: {e}")
+    finally:
+        cursor.close()
+        db.close()
+
+# Hot queries - the endpoints execute these, and explain_checks() EXPLAINs the very same SQL
+LATEST_MODEL_SQL = """
+    SELECT id FROM trained_models 
+    WHERE project_id = %s AND model_type = %s AND workspace = %s
+    ORDER BY created_at DESC, id DESC LIMIT 1
+"""
+PROJECT_MODELS_SQL = """
+    SELECT id, model_name, model_type, training_data_count, metrics, created_at 
+    FROM trained_models
+    WHERE project_id = %s AND workspace = %s
+    ORDER BY created_at DESC
+"""
+WORKSPACE_MODELS_SQL = """
+    SELECT model_type, training_data_count, metrics, created_at
+    FROM trained_models
+    WHERE workspace = %s
+"""
+ANNOTATION_LISTING_SQL = """
+    SELECT id, text, intent, entities, intent_confidence, entity_confidences, created_at 
+    FROM annotations
+"""
+TRAINING_ANNOTATIONS_SQL = "SELECT text, intent, entities FROM annotations WHERE project_id = %s AND workspace = %s"
+PROJECT_INTENTS_SQL = "SELECT DISTINCT intent FROM annotations WHERE project_id = %s AND workspace = %s"
+LOW_CONFIDENCE_ANNOTATIONS_SQL = """
+    SELECT id, text, intent, entities, intent_confidence, entity_confidences, created_at 
+    FROM annotations 
+    WHERE project_id = %s 
+    AND intent_confidence < 0.5
+    AND intent IS NOT NULL
+    AND intent != ''
+    ORDER BY intent_confidence ASC
+"""
+ANNOTATION_STATS_SQL = """
+    SELECT intent, COUNT(*) as annotation_count, COUNT(intent_confidence) as confidence_count,
+           COALESCE(SUM(intent_confidence), 0) as confidence_sum,
+           COALESCE(SUM(intent_confidence < 0.5), 0) as low_count,
+           COALESCE(SUM(intent_confidence >= 0.5 AND intent_confidence < 0.8), 0) as medium_count,
+           COALESCE(SUM(intent_confidence >= 0.8), 0) as high_count
+    FROM annotations 
+    WHERE project_id = %s AND workspace = %s
+    GROUP BY intent
+"""
+ANNOTATION_STATS_ROLLUP_SQL = """
+    SELECT NULLIF(intent, '') AS intent, annotation_count, confidence_count, confidence_sum, low_count, medium_count, high_count
+    FROM annotation_stats 
+    WHERE project_id = %s AND workspace = %s AND annotation_count > 0
+"""
+WORKSPACE_INTENT_DISTRIBUTION_SQL = """
+    SELECT intent, COUNT(*) as count, 
+           AVG(intent_confidence) as avg_confidence
+    FROM annotations 
+    WHERE workspace = %s AND intent IS NOT NULL
+    GROUP BY intent 
+    ORDER BY count DESC
+"""
+USER_PROJECTS_SQL = "SELECT id, project_name FROM projects WHERE username = %s AND workspace = %s"
+USER_DATASETS_SQL = """
+    SELECT d.id, p.project_name, d.file_name, d.file_type 
+    FROM datasets d 
+    JOIN projects p ON d.project_id = p.id 
+    WHERE p.username = %s AND d.workspace = %s
+"""
+WORKSPACE_DATASETS_SQL = """
+    SELECT d.id, p.project_name, d.file_name, d.file_type, p.username
+    FROM datasets d 
+    JOIN projects p ON d.project_id = p.id 
+    WHERE d.workspace = %s
+    ORDER BY p.username, p.project_name
+"""
+WORKSPACE_FEEDBACK_TYPES_SQL = """
+    SELECT feedback_type, COUNT(*) as count
+    FROM feedback 
+    WHERE workspace = %s
+    GROUP BY feedback_type 
+    ORDER BY count DESC
+"""
+WORKSPACE_FEEDBACK_MODELS_SQL = """
+    SELECT model_type, COUNT(*) as count
+    FROM feedback 
+    WHERE workspace = %s
+    GROUP BY model_type 
+    ORDER BY count DESC
+"""
+USER_ROLE_SQL = "SELECT role FROM users WHERE username = %s"
+DATASET_LABEL_COUNTS_SQL = """
+    SELECT label, COUNT(*) as count FROM dataset_rows 
+    WHERE {where} 
+    GROUP BY label 
+    ORDER BY label
+"""
+DATASET_ROWS_PAGE_SQL = """
+    SELECT row_index, text, label, sample_key FROM dataset_rows 
+    WHERE {where} 
+    ORDER BY {order} 
+    LIMIT %s OFFSET %s
+"""
+
+def annotation_text_lookup_sql(count: int) -> str:
+    """Existing texts among count candidates, matched on the case-insensitive text_hash key"""
+    placeholders = ", ".join(["SHA2(LOWER(%s), 256)"] * count)
+    return f"""
+        SELECT text FROM annotations 
+        WHERE project_id = %s AND workspace = %s AND text_hash IN ({placeholders})
+    """
+
+# EXPLAIN check - every hot query must use an index; run against a database with realistic data
+# (explain_check.py seeds one), since MySQL may prefer a scan on near-empty tables
+def explain_checks() -> List[Tuple[str, str, tuple]]:
+    """(name, sql, sample params) for each hot query, built by the same code the endpoints run"""
+    annotation_conditions = ["project_id = %s", "workspace = %s"]
+    listing_sql, listing_params = keyset_page_query(ANNOTATION_LISTING_SQL, annotation_conditions, [1, 'workspace1'],
+                                                    encode_page_cursor(datetime(2024, 1, 1), 1), 50)
+    sentences_sql, sentences_params = dataset_page_query(["dataset_id = %s"], [1], "sequential", (0,), 0, 50)
+    sample_sql, sample_params = dataset_page_query(["dataset_id = %s"], [1], "random", (0, 0), 0, 50)
+    return [
+        ("latest model lookup", LATEST_MODEL_SQL, (1, 'spacy', 'workspace1')),
+        ("project models", PROJECT_MODELS_SQL, (1, 'workspace1')),
+        ("workspace models", WORKSPACE_MODELS_SQL, ('workspace1',)),
+        ("project annotations page", listing_sql, tuple(listing_params)),
+        ("training annotations", TRAINING_ANNOTATIONS_SQL, (1, 'workspace1')),
+        ("project intents", PROJECT_INTENTS_SQL, (1, 'workspace1')),
+        ("annotation text lookup", annotation_text_lookup_sql(1), (1, 'workspace1', 'hello')),
+        ("low confidence annotations", LOW_CONFIDENCE_ANNOTATIONS_SQL, (1,)),
+        ("annotation statistics", ANNOTATION_STATS_SQL, (1, 'workspace1')),
+        ("annotation statistics rollup", ANNOTATION_STATS_ROLLUP_SQL, (1, 'workspace1')),
+        ("workspace intent analytics", WORKSPACE_INTENT_DISTRIBUTION_SQL, ('workspace1',)),
+        ("user projects", USER_PROJECTS_SQL, ('admin', 'workspace1')),
+        ("user datasets", USER_DATASETS_SQL, ('admin', 'workspace1')),
+        ("workspace datasets", WORKSPACE_DATASETS_SQL, ('workspace1',)),
+        ("workspace feedback types", WORKSPACE_FEEDBACK_TYPES_SQL, ('workspace1',)),
+        ("workspace feedback models", WORKSPACE_FEEDBACK_MODELS_SQL, ('workspace1',)),
+        ("user role", USER_ROLE_SQL, ('admin',)),
+        ("dataset sentences page", sentences_sql, tuple(sentences_params)),
+        ("dataset random sample page", sample_sql, tuple(sample_params)),
+        ("dataset label counts", DATASET_LABEL_COUNTS_SQL.format(where="dataset_id = %s"), (1,)),
+    ]
+
+def explain_hot_queries(db) -> List[Dict[str, Any]]:
+    """EXPLAIN every query in explain_checks(); a plan row with access type ALL is a full table scan"""
+    results = []
+    cursor = db.cursor(dictionary=True)
+    try:
+        for name, sql, params in explain_checks():
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = cursor.fetchall()
+            scans = [row['table'] for row in plan if row.get('type') == 'ALL']
+            results.append({
+                "query": name,
+                "full_scan": bool(scans),
+                "scanned_tables": scans,
+                "plan": [{"table": row.get('table'), "type": row.get('type'), "key": row.get('key'),
+                          "rows": row.get('rows'), "extra": row.get('Extra')} for row in plan]
+            })
+    finally:
+        cursor.close()
+    return results
+
+def run_explain_check() -> int:
+    """Command-line check: python newback.py explain-check (exits 1 if any hot query scans a table)"""
+    db = get_db()
+    if not db:
+        print("Database connection failed")
+        return 1
+    try:
+        results = explain_hot_queries(db)
+    finally:
+        db.close()
+    for result in results:
+        status = "FULL SCAN" if result['full_scan'] else "ok"
+        keys = ", ".join(f"{step['table']}:{step['type']}:{step['key']}" for step in result['plan'])
+        print(f"{status:9} {result['query']} [{keys}]")
+    failures = [result['query'] for result in results if result['full_scan']]
+    if failures:
+        print(f"{len(failures)} of {len(results)} hot queries fall back to a full table scan")
+        return 1
+    print(f"All {len(results)} hot queries use an index")
+    return 0
+
 
 # Call this after your other migrations
 # Initialize database and run migrations
@@ -1606,53 +3431,124 @@ def verify_feedback_table():
 # # Call this after init_db() and other migrations
 # migrate_feedback_table_complete()
 # Initialize database and run migrations
-init_db()
-migrate_user_roles()
-migrate_database()
-migrate_projects_table()
-migrate_activity_logs_table()
-migrate_feedback_table_complete()  # This should create the table
-verify_feedback_table_structure()   # ADD THIS LINE to verify structure
-verify_feedback_table() 
+def run_migrations():
+    init_db()
+    migrate_user_roles()
+    migrate_revoked_tokens_table()
+    migrate_database()
+    migrate_projects_table()
+    migrate_activity_logs_table()
+    migrate_training_jobs_table()
+    migrate_annotations_text_hash()
+    migrate_annotation_stats_table()
+    migrate_workspace_summary_table()
+    migrate_dataset_storage()
+    migrate_feedback_table_complete()  # This should create the table
+    verify_feedback_table_structure()   # ADD THIS LINE to verify structure
+    verify_feedback_table() 
+    migrate_hot_query_indexes()
+
+# RUN_MIGRATIONS=0 lets a script import this module before its database exists and migrate later
+if os.environ.get("RUN_MIGRATIONS", "1") == "1":
+    run_migrations()
+
+# Helper functions
+def hash_pw(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def create_token(username, role="user"):
+    now = datetime.utcnow()
+    claims = {
+        "sub": username,
+        "role": role,
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+        "jti": secrets.token_hex(16)
+    }
+    return jwt.encode(claims, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+def decode_token(token) -> Optional[Dict[str, Any]]:
+    """Claims of a valid, unexpired and unrevoked token, else None"""
+    if not token:
+        return None
+    try:
+        claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        return None
+    if not claims.get("sub"):
+        return None
+    if TOKEN_REVOCATION and token_revocations.is_revoked(claims.get("jti", "")):
+        return None
+    return claims
+
+def verify_token(token):
+    claims = decode_token(token)
+    return claims["sub"] if claims else None
+
+ROLE_CACHE_TTL = float(os.environ.get("ROLE_CACHE_TTL", "60"))
+
+class RoleCache:
+    """username -> role for up to ttl seconds; this process drops entries itself when a user changes, other workers after the ttl"""
+    def __init__(self, ttl: float = ROLE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry and time.monotonic() - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        
+        db = get_db()
+        if not db:
+            return None
+        
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.execute(USER_ROLE_SQL, (username,))
+            user = cursor.fetchone()
+        except Exception as e:
+            print(f"Role lookup error: {e}")
+            return None
+        finally:
+            cursor.close()
+            db.close()
+        
+        with self._lock:
+            if user:
+                self._entries[username] = (user['role'], time.monotonic())
+            else:
+                self._entries.pop(username, None)
+        return user['role'] if user else None
 
-# Helper functions
-def hash_pw(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    def invalidate(self, username: Optional[str] = None):
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
 
-def create_token(username):
-    token = secrets.token_hex(32)
-    tokens[token] = {"username": username, "expiry": time.time() + 7200}
-    return token
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
 
-def verify_token(token):
-    if token in tokens and time.time() < tokens[token]["expiry"]:
-        return tokens[token]["username"]
-    return None
+role_cache = RoleCache()
 
 def verify_admin(token: str):
     """Verify if the token belongs to an admin user"""
-    username = verify_token(token)
-    if not username:
-        return None
-    
-    db = get_db()
-    if not db:
-        return None
-    
-    cursor = db.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT role FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        
-        if user and user['role'] == 'admin':
-            return username
-        return None
-    except Exception as e:
-        print(f"Admin verification error: {e}")
+    claims = decode_token(token)
+    # Only tokens issued with the admin role need the (cached) check that the user is still an admin
+    if not claims or claims.get("role") != "admin":
         return None
-    finally:
-        cursor.close()
-        db.close()
+    username = claims["sub"]
+    if role_cache.get(username) == 'admin':
+        return username
+    return None
         
 def calculate_metrics(true_intents, pred_intents):
     """Calculate evaluation metrics"""
@@ -1744,10 +3640,305 @@ def plot_metrics_comparison(metrics_dict):
     
     return base64.b64encode(buf.getvalue()).decode('utf-8')
 
+# Inference executor - model and plotting work runs on bounded pools with backpressure and timeouts
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "4"))
+INFERENCE_MAX_PENDING = int(os.environ.get("INFERENCE_MAX_PENDING", "64"))
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "30"))
+PLOT_WORKERS = int(os.environ.get("PLOT_WORKERS", "2"))
+PLOT_TIMEOUT = float(os.environ.get("PLOT_TIMEOUT", "60"))
+
+class InferenceBusy(Exception):
+    pass
+
+class InferenceTimeout(Exception):
+    pass
+
+class InferenceExecutor:
+    """Runs calls on a thread pool (light models) or a process pool (heavy work such as plotting)"""
+
+    def __init__(self, name: str, max_workers: int, max_pending: int, timeout: float, use_processes: bool = False):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        self.timeout = timeout
+        self.use_processes = use_processes
+        self.executor = None
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_latency = 0.0
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                if self.use_processes:
+                    self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self.executor
+
+    def _reset_executor(self, broken):
+        with self.lock:
+            if self.executor is broken:
+                self.executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, fn, *args, timeout: Optional[float] = None, **kwargs):
+        """Run fn and wait for its result; raises InferenceBusy when the queue is full"""
+        timeout = self.timeout if timeout is None else timeout
+        # Backpressure: wait briefly for a slot instead of queueing without bound
+        if not self.slots.acquire(timeout=min(timeout, 1.0)):
+            with self.lock:
+                self.rejected += 1
+            raise InferenceBusy(f"{self.name} executor is busy ({self.max_pending} calls pending), try again shortly")
+        
+        submitted_at = time.monotonic()
+        with self.lock:
+            self.pending += 1
+        executor = self._get_executor()
+        try:
+            try:
+                future = executor.submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                # A crashed worker process poisons the pool - start a fresh one and retry once
+                self._reset_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._finish(submitted_at, False)
+            raise
+
+        future.add_done_callback(lambda f: self._finish(submitted_at, not f.cancelled() and f.exception() is None))
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            with self.lock:
+                self.timed_out += 1
+            raise InferenceTimeout(f"{self.name} call timed out after {timeout:g}s")
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise
+        return result
+
+    def _finish(self, submitted_at, ok):
+        elapsed = time.monotonic() - submitted_at
+        with self.lock:
+            self.pending -= 1
+            self.total_latency += elapsed
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self.slots.release()
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            finished = self.completed + self.failed
+            return {
+                "kind": "process" if self.use_processes else "thread",
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "queue_depth": max(0, self.pending - self.max_workers),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_latency_ms": round(self.total_latency / finished * 1000, 2) if finished else 0.0,
+                "timeout_s": self.timeout
+            }
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+inference_executor = InferenceExecutor("inference", INFERENCE_WORKERS, INFERENCE_MAX_PENDING, INFERENCE_TIMEOUT)
+plot_executor = InferenceExecutor("plot", PLOT_WORKERS, INFERENCE_MAX_PENDING, PLOT_TIMEOUT, use_processes=True)
+
+def tokenize(text: str) -> List[str]:
+    if SPACY_AVAILABLE:
+        return [token.text for token in nlp(text)]
+    return text.split()
+
+def analyze_text(model, text: str, include_tokens: bool = True):
+    """Intent, entities and (optionally) tokens for one text"""
+    intent_result = model.predict_intent(text)
+    entities = model.extract_entities(text)
+    tokens = tokenize(text) if include_tokens else None
+    return intent_result, entities, tokens
+
 # Auth endpoints
 # Add after the existing auth endpoints
+# Activity log write-behind - events are queued by the endpoints and written by one thread in multi-row batches
+ACTIVITY_LOG_BATCH = int(os.environ.get("ACTIVITY_LOG_BATCH", "200"))
+ACTIVITY_LOG_FLUSH_MS = int(os.environ.get("ACTIVITY_LOG_FLUSH_MS", "500"))
+ACTIVITY_LOG_QUEUE_MAX = int(os.environ.get("ACTIVITY_LOG_QUEUE_MAX", "10000"))
+ACTIVITY_LOG_PUT_TIMEOUT = float(os.environ.get("ACTIVITY_LOG_PUT_TIMEOUT", "0.5"))
+ACTIVITY_LOG_REQUEST_MAX = 500
+# Client timestamps are clamped into the TIMESTAMP column's range (a day of slack for the session time zone)
+ACTIVITY_LOG_MIN_TIME = datetime(1970, 1, 2)
+ACTIVITY_LOG_INSERT_SQL = """
+    INSERT INTO activity_logs (username, activity_type, activity_details, workspace, created_at)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+class ActivityLogWriter:
+    """Buffers (username, activity_type, activity_details, workspace, created_at) rows and flushes them every batch_size rows or flush_interval seconds"""
+    def __init__(self, batch_size: int = ACTIVITY_LOG_BATCH, flush_interval: float = ACTIVITY_LOG_FLUSH_MS / 1000,
+                 max_queue: int = ACTIVITY_LOG_QUEUE_MAX, put_timeout: float = ACTIVITY_LOG_PUT_TIMEOUT):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.batches = 0
+        self.last_error = None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, rows: List[Tuple[str, str, str, str, datetime]]) -> int:
+        """Queue rows without waiting for the database; a full queue waits up to put_timeout, then the rest are rejected"""
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        deadline = time.monotonic() + self.put_timeout
+        accepted = 0
+        for row in rows:
+            try:
+                self._queue.put(row, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                self.rejected += len(rows) - accepted
+                break
+            accepted += 1
+        return accepted
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    if self._stopping.is_set():
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        for attempt in range(3):
+            db = get_db()
+            if db:
+                cursor = db.cursor()
+                try:
+                    # executemany on an INSERT ... VALUES is sent as one multi-row statement
+                    cursor.executemany(ACTIVITY_LOG_INSERT_SQL, batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                    return
+                except Exception as e:
+                    self.last_error = str(e)
+                    if isinstance(e, mysql.connector.errors.DatabaseError) and not isinstance(e, mysql.connector.errors.OperationalError):
+                        # The server refused a value rather than the connection: retry row by row so only bad rows are lost
+                        self._write_rows(cursor, batch)
+                        return
+                finally:
+                    cursor.close()
+                    db.close()
+            else:
+                self.last_error = "Database connection failed"
+            time.sleep(0.2 * (attempt + 1))
+        self.dropped += len(batch)
+        print(f"Activity log writer dropped {len(batch)} events: {self.last_error}")
+
+    def _write_rows(self, cursor, batch):
+        dropped = 0
+        for row in batch:
+            try:
+                cursor.execute(ACTIVITY_LOG_INSERT_SQL, row)
+                self.written += 1
+            except Exception as e:
+                self.last_error = str(e)
+                dropped += 1
+        self.batches += 1
+        if dropped:
+            self.dropped += dropped
+            print(f"Activity log writer dropped {dropped} of {len(batch)} events: {self.last_error}")
+
+    def stop(self, timeout: float = 10.0):
+        """Write everything still queued, then stop the thread"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": round(self.flush_interval * 1000),
+            "written": self.written,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "last_error": self.last_error
+        }
+
+activity_writer = ActivityLogWriter()
+
+@app.on_event("shutdown")
+def flush_activity_log():
+    activity_writer.stop()
+
+def activity_log_row(username: str, activity_type: str, activity_details, workspace: str, created_at: Optional[str] = None):
+    """Validated activity_logs row that strict-mode MySQL accepts, so one bad event cannot fail a whole batch.
+    activity_details must be JSON without NaN or Infinity (a string is parsed and re-serialized, anything else is serialized)"""
+    if not activity_type:
+        raise ValueError("activity_type is required")
+    if workspace is not None and not isinstance(workspace, str):
+        raise ValueError("workspace must be a string")
+    if isinstance(activity_details, str):
+        activity_details = json.loads(activity_details)
+    activity_details = json.dumps(activity_details if activity_details is not None else {}, allow_nan=False)
+    now = datetime.now()
+    timestamp = now
+    if created_at:
+        # Buffered client events keep the time they happened, clamped to the column's range and to our clock
+        timestamp = datetime.fromisoformat(created_at)
+        if timestamp.tzinfo is not None:
+            try:
+                timestamp = timestamp.astimezone().replace(tzinfo=None)
+            except (OverflowError, OSError):
+                timestamp = now if timestamp.year > 1970 else ACTIVITY_LOG_MIN_TIME
+        timestamp = min(max(timestamp, ACTIVITY_LOG_MIN_TIME), now)
+    return (username, str(activity_type)[:100], activity_details, (workspace or "workspace1")[:50], timestamp)
+
 @app.post("/log-activity")
-async def log_activity_endpoint(
+def log_activity_endpoint(
     activity_type: str = Form(...),
     activity_details: str = Form(...),
     workspace: str = Form("workspace1"),
@@ -1758,33 +3949,166 @@ async def log_activity_endpoint(
     if not username:
         return {"success": False, "error": "Invalid token"}
     
-    db = get_db()
-    if not db:
-        return {"success": False, "error": "Database connection failed"}
+    try:
+        row = activity_log_row(username, activity_type, activity_details, workspace)
+    except ValueError as e:
+        return {"success": False, "error": f"Invalid activity: {str(e)}"}
+    
+    if not activity_writer.submit([row]):
+        return {"success": False, "error": "Activity log is busy, try again later"}
+    return {"success": True, "message": "Activity logged"}
+
+@app.post("/log-activity/batch")
+def log_activity_batch(events: str = Form(...), token: str = Form(...)):
+    """Log a JSON list of {activity_type, activity_details, workspace, created_at} events in one call.
+    Returns the list positions of events that were dropped as invalid and of events not queued (retry those)"""
+    username = verify_token(token)
+    if not username:
+        return {"success": False, "error": "Invalid token"}
     
-    cursor = db.cursor()
     try:
-        cursor.execute("""
-            INSERT INTO activity_logs (username, activity_type, activity_details, workspace)
-            VALUES (%s, %s, %s, %s)
-        """, (username, activity_type, activity_details, workspace))
-        
-        return {"success": True, "message": "Activity logged"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-    finally:
-        cursor.close()
-        db.close()
-        
+        events = json.loads(events)
+    except ValueError:
+        return {"success": False, "error": "events must be a JSON list"}
+    if not isinstance(events, list):
+        return {"success": False, "error": "events must be a JSON list"}
+    if len(events) > ACTIVITY_LOG_REQUEST_MAX:
+        return {"success": False, "error": f"At most {ACTIVITY_LOG_REQUEST_MAX} events per request"}
+    
+    rows = []
+    row_indexes = []
+    invalid = []
+    for index, event in enumerate(events):
+        try:
+            rows.append(activity_log_row(username, event.get("activity_type"), event.get("activity_details"),
+                                         event.get("workspace"), event.get("created_at")))
+            row_indexes.append(index)
+        except (ValueError, TypeError, AttributeError):
+            invalid.append(index)
+    
+    accepted = activity_writer.submit(rows) if rows else 0
+    if accepted < len(rows):
+        return {
+            "success": False, 
+            "error": "Activity log is busy, try again later", 
+            "accepted": accepted, 
+            "invalid": invalid,
+            "rejected": row_indexes[accepted:]
+        }
+    return {
+        "success": True, 
+        "message": f"{accepted} activities logged", 
+        "accepted": accepted, 
+        "invalid": invalid, 
+        "rejected": []
+    }
+
+# Keyset pagination - listings are ordered newest first on (created_at, id); the cursor is the last row's key.
+# Rows without created_at sort after all dated ones (NULL is lowest in DESC order) and are paged on id alone
+PAGE_SIZE_MAX = int(os.environ.get("PAGE_SIZE_MAX", "500"))
+
+def encode_page_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat() if created_at else ''}|{row_id}".encode()).decode()
+
+def decode_page_cursor(page_cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(page_cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except Exception:
+        raise ValueError("Invalid page cursor")
+
+def parse_date_filter(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    """YYYY-MM-DD or ISO datetime; a bare end date covers that whole day"""
+    if not value or not value.strip():
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if end and len(value.strip()) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def add_listing_filters(conditions: List[str], params: List[Any], created_column: str,
+                        date_from: Optional[str] = None, date_to: Optional[str] = None,
+                        intent_column: Optional[str] = None, intent: Optional[str] = None,
+                        confidence_column: Optional[str] = None,
+                        min_confidence: Optional[float] = None, max_confidence: Optional[float] = None):
+    """Append the shared intent, confidence range and date range filters"""
+    if intent_column and intent and intent.strip():
+        conditions.append(f"{intent_column} = %s")
+        params.append(intent.strip())
+    if confidence_column and min_confidence is not None:
+        conditions.append(f"{confidence_column} >= %s")
+        params.append(min_confidence)
+    if confidence_column and max_confidence is not None:
+        conditions.append(f"{confidence_column} <= %s")
+        params.append(max_confidence)
+    start = parse_date_filter(date_from)
+    if start:
+        conditions.append(f"{created_column} >= %s")
+        params.append(start)
+    end = parse_date_filter(date_to, end=True)
+    if end:
+        conditions.append(f"{created_column} {'<' if len(date_to.strip()) == 10 else '<='} %s")
+        params.append(end)
+
+def keyset_page_query(select_sql: str, conditions: List[str], params: List[Any],
+                      page_cursor: Optional[str], limit: int, alias: str = "") -> Tuple[str, List[Any]]:
+    """select_sql with the filters plus the keyset bound, newest first, fetching limit + 1 rows"""
+    prefix = f"{alias}." if alias else ""
+    conditions = list(conditions)
+    params = list(params)
+    if page_cursor:
+        created_at, row_id = decode_page_cursor(page_cursor)
+        if created_at is None:
+            conditions.append(f"({prefix}created_at IS NULL AND {prefix}id < %s)")
+            params.append(row_id)
+        else:
+            conditions.append(f"({prefix}created_at < %s OR ({prefix}created_at = %s AND {prefix}id < %s) "
+                              f"OR {prefix}created_at IS NULL)")
+            params += [created_at, created_at, row_id]
+    return f"""
+        {select_sql}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {prefix}created_at DESC, {prefix}id DESC
+        LIMIT %s
+    """, params + [limit + 1]
+
+def fetch_keyset_page(cursor, select_sql: str, conditions: List[str], params: List[Any],
+                      page_cursor: Optional[str], limit: int, alias: str = ""):
+    """Run select_sql with the filters plus the keyset bound; returns (rows, next_cursor)"""
+    limit = max(1, min(limit, PAGE_SIZE_MAX))
+    cursor.execute(*keyset_page_query(select_sql, conditions, params, page_cursor, limit, alias))
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_page_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+def estimate_row_count(cursor, table: str, conditions: List[str], params: List[Any]) -> int:
+    """Optimizer row estimate for the filtered listing - cheap, but approximate"""
+    cursor.execute(f"EXPLAIN SELECT 1 FROM {table} WHERE {' AND '.join(conditions)}", tuple(params))
+    plan = cursor.fetchall()
+    if not plan:
+        return 0
+    rows = plan[0].get('rows') or 0
+    filtered = plan[0].get('filtered') or 100
+    return int(round(int(rows) * float(filtered) / 100))
+
 @app.get("/admin/activity-logs")
-async def get_activity_logs(
+def get_activity_logs(
     token: str = Query(...),
     workspace: str = Query("workspace1"),
     username: str = Query(None),
     activity_type: str = Query(None),
-    limit: int = Query(100)  # This will now work with your frontend
+    limit: int = Query(100),  # This will now work with your frontend
+    page_cursor: Optional[str] = Query(None, alias="cursor"),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None)
 ):
-    """Get activity logs for admin panel"""
+    """Get activity logs for admin panel, one keyset page at a time"""
     admin_username = verify_admin(token)
     if not admin_username:
         return {"success": False, "error": "Admin access required"}
@@ -1797,22 +4121,22 @@ async def get_activity_logs(
         cursor = db.cursor(dictionary=True)
         
         # Build query with filters
-        query = "SELECT * FROM activity_logs WHERE workspace = %s"
+        conditions = ["workspace = %s"]
         params = [workspace]
         
         if username:
-            query += " AND username = %s"
+            conditions.append("username = %s")
             params.append(username)
         
         if activity_type:
-            query += " AND activity_type = %s"
+            conditions.append("activity_type = %s")
             params.append(activity_type)
         
-        query += " ORDER BY created_at DESC LIMIT %s"
-        params.append(limit)
+        add_listing_filters(conditions, params, "created_at", date_from, date_to)
         
-        cursor.execute(query, params)
-        activities = cursor.fetchall()
+        activities, next_cursor = fetch_keyset_page(
+            cursor, "SELECT * FROM activity_logs", conditions, params, page_cursor, limit
+        )
         
         # Parse JSON details
         for activity in activities:
@@ -1822,34 +4146,43 @@ async def get_activity_logs(
                 except:
                     activity['activity_details'] = {}
         
-        # Get statistics
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_activities,
-                COUNT(DISTINCT username) as unique_users,
-                MIN(created_at) as first_activity,
-                MAX(created_at) as last_activity
-            FROM activity_logs 
-            WHERE workspace = %s
-        """, (workspace,))
-        stats = cursor.fetchone()
-        
-        # Get activity type distribution
-        cursor.execute("""
-            SELECT activity_type, COUNT(*) as count
-            FROM activity_logs 
-            WHERE workspace = %s
-            GROUP BY activity_type 
-            ORDER BY count DESC
-        """, (workspace,))
-        activity_distribution = cursor.fetchall()
+        # Workspace statistics only come with the first page
+        stats = None
+        activity_distribution = None
+        total_count = None
+        if not page_cursor:
+            cursor.execute("""
+                SELECT 
+                    COUNT(*) as total_activities,
+                    COUNT(DISTINCT username) as unique_users,
+                    MIN(created_at) as first_activity,
+                    MAX(created_at) as last_activity
+                FROM activity_logs 
+                WHERE workspace = %s
+            """, (workspace,))
+            stats = cursor.fetchone()
+            
+            # Get activity type distribution
+            cursor.execute("""
+                SELECT activity_type, COUNT(*) as count
+                FROM activity_logs 
+                WHERE workspace = %s
+                GROUP BY activity_type 
+                ORDER BY count DESC
+            """, (workspace,))
+            activity_distribution = cursor.fetchall()
+            total_count = estimate_row_count(cursor, "activity_logs", conditions, params)
         
         return {
             "success": True,
             "activities": activities,
             "statistics": stats,
             "activity_distribution": activity_distribution,
-            "total_count": len(activities)
+            "count": len(activities),
+            "total_count": total_count,
+            "total_count_estimated": True,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
         
     except Exception as e:
@@ -1858,7 +4191,7 @@ async def get_activity_logs(
         cursor.close()
         
 @app.get("/debug/feedback-table")
-async def debug_feedback_table():
+def debug_feedback_table():
     """Debug endpoint to check feedback table structure and data"""
     db = get_db()
     if not db:
@@ -1896,7 +4229,7 @@ async def debug_feedback_table():
         cursor.close()
         db.close() 
 @app.post("/feedback/save")
-async def save_feedback(
+def save_feedback(
     token: str = Form(...),
     project_id: int = Form(...),
     model_type: str = Form(...),
@@ -1988,6 +4321,7 @@ async def save_feedback(
                     INSERT INTO annotations 
                     (project_id, text, intent, entities, annotated_by, workspace, is_corrected_feedback)
                     VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE intent = VALUES(intent), is_corrected_feedback = VALUES(is_corrected_feedback)
                 """
                 update_params = (
                     project_id,
@@ -2022,7 +4356,7 @@ async def save_feedback(
         cursor.close()
         db.close()         
 @app.post("/feedback/test-no-auth")
-async def test_feedback_no_auth(
+def test_feedback_no_auth(
     project_id: int = Form(1),
     model_type: str = Form("test"),
     input_text: str = Form("Test feedback without auth"),
@@ -2067,15 +4401,21 @@ async def test_feedback_no_auth(
     finally:
         cursor.close()                      
 @app.get("/admin/feedback")
-async def get_all_feedback(
+def get_all_feedback(
     token: str = Query(...),
     workspace: str = Query("workspace1"),
     username: str = Query(None),
     model_type: str = Query(None),
     feedback_type: str = Query(None),
-    limit: int = Query(100)
+    limit: int = Query(100),
+    page_cursor: Optional[str] = Query(None, alias="cursor"),
+    intent: Optional[str] = Query(None),
+    min_confidence: Optional[float] = Query(None),
+    max_confidence: Optional[float] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None)
 ):
-    """Get all user feedback for admin panel"""
+    """Get user feedback for admin panel, one keyset page at a time"""
     admin_username = verify_admin(token)
     if not admin_username:
         return {"success": False, "error": "Admin access required"}
@@ -2087,31 +4427,31 @@ async def get_all_feedback(
     cursor = db.cursor(dictionary=True)
     try:
         # Updated query without the removed columns
-        query = """
-            SELECT id, project_id, model_type, input_text, predicted_intent,
-                   feedback_type, corrected_intent, suggestion_text, username, 
-                   created_at, workspace
-            FROM feedback 
-            WHERE workspace = %s
-        """
+        conditions = ["workspace = %s"]
         params = [workspace]        
         if username and username.strip():
-            query += " AND username = %s"
+            conditions.append("username = %s")
             params.append(username.strip())
         
         if model_type and model_type.strip():
-            query += " AND model_type = %s"
+            conditions.append("model_type = %s")
             params.append(model_type.strip())
         
         if feedback_type and feedback_type.strip():
-            query += " AND feedback_type = %s"
+            conditions.append("feedback_type = %s")
             params.append(feedback_type.strip())
         
-        query += " ORDER BY created_at DESC LIMIT %s"
-        params.append(limit)
+        add_listing_filters(conditions, params, "created_at", date_from, date_to,
+                            intent_column="predicted_intent", intent=intent,
+                            confidence_column="predicted_intent_confidence",
+                            min_confidence=min_confidence, max_confidence=max_confidence)
         
-        cursor.execute(query, params)
-        feedbacks = cursor.fetchall()
+        feedbacks, next_cursor = fetch_keyset_page(cursor, """
+            SELECT id, project_id, model_type, input_text, predicted_intent,
+                   feedback_type, corrected_intent, suggestion_text, username, 
+                   created_at, workspace
+            FROM feedback
+        """, conditions, params, page_cursor, limit)
         
         # Parse JSON fields properly
         for fb in feedbacks:
@@ -2134,42 +4474,37 @@ async def get_all_feedback(
             if fb.get('created_at'):
                 fb['created_at'] = fb['created_at'].strftime('%Y-%m-%d %H:%M:%S')
         
-        # Get comprehensive statistics
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_feedback,
-                COUNT(DISTINCT username) as unique_users,
-                COUNT(CASE WHEN feedback_type = 'correct' THEN 1 END) as correct_count,
-                COUNT(CASE WHEN feedback_type = 'incorrect' THEN 1 END) as incorrect_count,
-                COUNT(CASE WHEN feedback_type = 'suggestion' THEN 1 END) as suggestion_count,
-                COUNT(CASE WHEN feedback_type = 'helpful' THEN 1 END) as helpful_count,
-                COUNT(CASE WHEN feedback_type = 'not_helpful' THEN 1 END) as not_helpful_count,
-                COUNT(CASE WHEN feedback_type = 'general' THEN 1 END) as general_count,
-                AVG(user_rating) as avg_rating
-            FROM feedback 
-            WHERE workspace = %s
-        """, (workspace,))
-        stats = cursor.fetchone()
+        # Workspace statistics only come with the first page
+        stats = None
+        feedback_distribution = None
+        model_distribution = None
+        total_count = None
+        if not page_cursor:
+            # Get comprehensive statistics
+            cursor.execute("""
+                SELECT 
+                    COUNT(*) as total_feedback,
+                    COUNT(DISTINCT username) as unique_users,
+                    COUNT(CASE WHEN feedback_type = 'correct' THEN 1 END) as correct_count,
+                    COUNT(CASE WHEN feedback_type = 'incorrect' THEN 1 END) as incorrect_count,
+                    COUNT(CASE WHEN feedback_type = 'suggestion' THEN 1 END) as suggestion_count,
+                    COUNT(CASE WHEN feedback_type = 'helpful' THEN 1 END) as helpful_count,
+                    COUNT(CASE WHEN feedback_type = 'not_helpful' THEN 1 END) as not_helpful_count,
+                    COUNT(CASE WHEN feedback_type = 'general' THEN 1 END) as general_count,
+                    AVG(user_rating) as avg_rating
+                FROM feedback 
+                WHERE workspace = %s
+            """, (workspace,))
+            stats = cursor.fetchone()
         
-        # Get feedback type distribution
-        cursor.execute("""
-            SELECT feedback_type, COUNT(*) as count
-            FROM feedback 
-            WHERE workspace = %s
-            GROUP BY feedback_type 
-            ORDER BY count DESC
-        """, (workspace,))
-        feedback_distribution = cursor.fetchall()
+            # Get feedback type distribution
+            cursor.execute(WORKSPACE_FEEDBACK_TYPES_SQL, (workspace,))
+            feedback_distribution = cursor.fetchall()
         
-        # Get model type distribution
-        cursor.execute("""
-            SELECT model_type, COUNT(*) as count
-            FROM feedback 
-            WHERE workspace = %s
-            GROUP BY model_type 
-            ORDER BY count DESC
-        """, (workspace,))
-        model_distribution = cursor.fetchall()
+            # Get model type distribution
+            cursor.execute(WORKSPACE_FEEDBACK_MODELS_SQL, (workspace,))
+            model_distribution = cursor.fetchall()
+            total_count = estimate_row_count(cursor, "feedback", conditions, params)
         
         return {
             "success": True,
@@ -2177,7 +4512,11 @@ async def get_all_feedback(
             "statistics": stats,
             "feedback_distribution": feedback_distribution,
             "model_distribution": model_distribution,
-            "total_count": len(feedbacks)
+            "count": len(feedbacks),
+            "total_count": total_count,
+            "total_count_estimated": True,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
         
     except Exception as e:
@@ -2188,7 +4527,7 @@ async def get_all_feedback(
 # Add these endpoints after your existing endpoints
 
 @app.get("/debug/token")
-async def debug_token(token: str = Query(...)):
+def debug_token(token: str = Query(...)):
     """Debug endpoint to check token verification"""
     username = verify_token(token)
     if username:
@@ -2207,7 +4546,7 @@ async def debug_token(token: str = Query(...)):
         }
 
 @app.get("/debug/feedback-check")
-async def debug_feedback_check():
+def debug_feedback_check():
     """Check feedback table structure and data"""
     db = get_db()
     if not db:
@@ -2239,7 +4578,7 @@ async def debug_feedback_check():
     finally:
         cursor.close()        
 @app.post("/register")
-async def register(username: str = Form(...), password: str = Form(...), role: str = Form("user")):
+def register(username: str = Form(...), password: str = Form(...), role: str = Form("user")):
     db = get_db()
     if not db:
         return {"success": False, "error": "Database connection failed"}
@@ -2265,7 +4604,7 @@ async def register(username: str = Form(...), password: str = Form(...), role: s
 # Add the new statistics endpoints with admin verification:
 
 @app.get("/admin/statistics")
-async def get_system_statistics(token: str):
+def get_system_statistics(token: str):
     admin_username = verify_admin(token)
     if not admin_username:
         return {"success": False, "error": "Admin access required"}
@@ -2329,7 +4668,7 @@ async def get_system_statistics(token: str):
         db.close()
 
 @app.get("/admin/projects-overview")
-async def get_projects_overview(token: str):
+def get_projects_overview(token: str):
     admin_username = verify_admin(token)
     if not admin_username:
         return {"success": False, "error": "Admin access required"}
@@ -2347,15 +4686,20 @@ async def get_projects_overview(token: str):
                 p.project_name,
                 p.username,
                 p.workspace,
-                COUNT(DISTINCT d.id) as dataset_count,
-                COUNT(DISTINCT a.id) as annotation_count,
-                COUNT(DISTINCT tm.id) as model_count,
+                COALESCE(d.dataset_count, 0) as dataset_count,
+                COALESCE(a.annotation_count, 0) as annotation_count,
+                COALESCE(tm.model_count, 0) as model_count,
                 p.created_at
             FROM projects p
-            LEFT JOIN datasets d ON p.id = d.project_id AND p.workspace = d.workspace
-            LEFT JOIN annotations a ON p.id = a.project_id AND p.workspace = a.workspace
-            LEFT JOIN trained_models tm ON p.id = tm.project_id AND p.workspace = tm.workspace
-            GROUP BY p.id, p.project_name, p.username, p.workspace, p.created_at
+            LEFT JOIN (
+                SELECT project_id, workspace, COUNT(*) as dataset_count FROM datasets GROUP BY project_id, workspace
+            ) d ON p.id = d.project_id AND p.workspace = d.workspace
+            LEFT JOIN (
+                SELECT project_id, workspace, COUNT(*) as annotation_count FROM annotations GROUP BY project_id, workspace
+            ) a ON p.id = a.project_id AND p.workspace = a.workspace
+            LEFT JOIN (
+                SELECT project_id, workspace, COUNT(*) as model_count FROM trained_models GROUP BY project_id, workspace
+            ) tm ON p.id = tm.project_id AND p.workspace = tm.workspace
             ORDER BY p.created_at DESC
         """)
         projects = cursor.fetchall()
@@ -2367,7 +4711,7 @@ async def get_projects_overview(token: str):
         cursor.close()
         db.close()
 @app.get("/admin/users")
-async def get_all_users(token: str):
+def get_all_users(token: str):
     admin_username = verify_admin(token)
     if not admin_username:
         return {"success": False, "error": "Admin access required"}
@@ -2389,7 +4733,7 @@ async def get_all_users(token: str):
         cursor.close()
         db.close()
 @app.delete("/admin/users/{user_id}")
-async def delete_user(user_id: int, token: str = Form(...)):
+def delete_user(user_id: int, token: str = Form(...)):
     admin_username = verify_admin(token)
     if not admin_username:
         return {"success": False, "error": "Admin access required"}
@@ -2413,8 +4757,11 @@ async def delete_user(user_id: int, token: str = Form(...)):
         
         for project in projects:
             cursor.execute("DELETE FROM annotations WHERE project_id = %s", (project[0],))
+            dataset_files = collect_dataset_files(cursor, "project_id = %s", (project[0],))
             cursor.execute("DELETE FROM datasets WHERE project_id = %s", (project[0],))
+            remove_dataset_files(dataset_files)
             cursor.execute("DELETE FROM trained_models WHERE project_id = %s", (project[0],))
+            model_registry.invalidate(project_id=project[0])
         
         cursor.execute("DELETE FROM projects WHERE username = (SELECT username FROM users WHERE id = %s)", (user_id,))
         
@@ -2422,6 +4769,7 @@ async def delete_user(user_id: int, token: str = Form(...)):
         cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
         
         if cursor.rowcount > 0:
+            role_cache.invalidate(target_user[0])
             return {"success": True, "message": "User deleted successfully"}
         else:
             return {"success": False, "error": "User not found"}
@@ -2433,7 +4781,7 @@ async def delete_user(user_id: int, token: str = Form(...)):
         db.close()
         
 @app.post("/admin/users/{user_id}/reset-password")
-async def reset_user_password(user_id: int, new_password: str = Form(...), token: str = Form(...)):
+def reset_user_password(user_id: int, new_password: str = Form(...), token: str = Form(...)):
     admin_username = verify_admin(token)
     if not admin_username:
         return {"success": False, "error": "Admin access required"}
@@ -2444,9 +4792,12 @@ async def reset_user_password(user_id: int, new_password: str = Form(...), token
     
     cursor = db.cursor()
     try:
+        cursor.execute("SELECT username FROM users WHERE id = %s", (user_id,))
+        target_user = cursor.fetchone()
         cursor.execute("UPDATE users SET password = %s WHERE id = %s", (hash_pw(new_password), user_id))
         
         if cursor.rowcount > 0:
+            role_cache.invalidate(target_user[0])
             return {"success": True, "message": "Password reset successfully"}
         else:
             return {"success": False, "error": "User not found"}
@@ -2463,9 +4814,61 @@ async def reset_user_password(user_id: int, new_password: str = Form(...), token
 # Workspaces Management Endpoints
 # Add these endpoints after the existing admin endpoints
 
+def fetch_workspace_summaries(cursor, workspace: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Per-workspace counts; each table is aggregated on its own (or read from its rollup) before joining"""
+    where = "WHERE workspace = %s" if workspace is not None else ""
+    params = []
+    
+    def source(sql):
+        if workspace is not None:
+            params.append(workspace)
+        return sql.format(where=where)
+    
+    projects_sql = source("""
+        SELECT workspace, COUNT(*) as project_count, COUNT(DISTINCT username) as user_count,
+               MIN(created_at) as first_activity, MAX(created_at) as last_activity
+        FROM projects {where} GROUP BY workspace
+    """)
+    if workspace_summary_ready:
+        datasets_sql = source("SELECT workspace, dataset_count, storage_bytes FROM workspace_summary {where}")
+        models_sql = source("SELECT workspace, model_count FROM workspace_summary {where}")
+    else:
+        datasets_sql = source("""
+            SELECT workspace, COUNT(*) as dataset_count, SUM(file_size) as storage_bytes
+            FROM datasets {where} GROUP BY workspace
+        """)
+        models_sql = source("SELECT workspace, COUNT(*) as model_count FROM trained_models {where} GROUP BY workspace")
+    if annotation_stats_ready:
+        annotations_sql = source("SELECT workspace, SUM(annotation_count) as annotation_count FROM annotation_stats {where} GROUP BY workspace")
+    else:
+        annotations_sql = source("SELECT workspace, COUNT(*) as annotation_count FROM annotations {where} GROUP BY workspace")
+    
+    cursor.execute(f"""
+        SELECT 
+            p.workspace,
+            p.project_count,
+            COALESCE(d.dataset_count, 0) as dataset_count,
+            COALESCE(a.annotation_count, 0) as annotation_count,
+            COALESCE(m.model_count, 0) as model_count,
+            p.user_count,
+            p.first_activity,
+            p.last_activity,
+            COALESCE(d.storage_bytes, 0) as total_storage_bytes
+        FROM ({projects_sql}) p
+        LEFT JOIN ({datasets_sql}) d ON d.workspace = p.workspace
+        LEFT JOIN ({annotations_sql}) a ON a.workspace = p.workspace
+        LEFT JOIN ({models_sql}) m ON m.workspace = p.workspace
+        ORDER BY p.workspace
+    """, tuple(params))
+    rows = cursor.fetchall()
+    for row in rows:
+        for key in ('project_count', 'dataset_count', 'annotation_count', 'model_count', 'user_count', 'total_storage_bytes'):
+            row[key] = int(row[key] or 0)
+    return rows
+
 # Workspaces Management Endpoints
 @app.get("/admin/workspaces")
-async def get_all_workspaces(token: str):
+def get_all_workspaces(token: str):
     """Get all workspaces with detailed statistics"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -2478,27 +4881,11 @@ async def get_all_workspaces(token: str):
     cursor = db.cursor(dictionary=True)
     try:
         # Get all workspaces with comprehensive statistics
-        cursor.execute("""
-            SELECT 
-                p.workspace,
-                COUNT(DISTINCT p.id) as project_count,
-                COUNT(DISTINCT d.id) as dataset_count,
-                COUNT(DISTINCT a.id) as annotation_count,
-                COUNT(DISTINCT tm.id) as model_count,
-                COUNT(DISTINCT p.username) as user_count,
-                MAX(p.created_at) as last_activity,
-                SUM(LENGTH(d.file_data)) as total_storage_bytes
-            FROM projects p
-            LEFT JOIN datasets d ON p.workspace = d.workspace
-            LEFT JOIN annotations a ON p.workspace = a.workspace
-            LEFT JOIN trained_models tm ON p.workspace = tm.workspace
-            GROUP BY p.workspace
-            ORDER BY p.workspace
-        """)
-        workspaces = cursor.fetchall()
+        workspaces = fetch_workspace_summaries(cursor)
         
         # Format the data
         for ws in workspaces:
+            del ws['first_activity']
             # Convert storage to human-readable format
             if ws['total_storage_bytes']:
                 total_bytes = ws['total_storage_bytes']
@@ -2530,7 +4917,7 @@ async def get_all_workspaces(token: str):
         cursor.close()
         db.close()
 @app.get("/admin/feedback")
-async def get_admin_feedback(
+def get_admin_feedback(
     token: str = Query(...),
     workspace: str = Query("workspace1"),
     username: Optional[str] = Query(None),
@@ -2665,7 +5052,7 @@ async def get_admin_feedback(
         cursor.close()
         db.close()
 @app.delete("/admin/workspaces/{workspace_name}")
-async def delete_workspace(workspace_name: str, token: str = Form(...)):
+def delete_workspace(workspace_name: str, token: str = Form(...)):
     """Delete a workspace and all its data"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -2686,12 +5073,15 @@ async def delete_workspace(workspace_name: str, token: str = Form(...)):
         
         # Delete data from all tables for this workspace
         cursor.execute("DELETE FROM trained_models WHERE workspace = %s", (workspace_name,))
+        model_registry.invalidate(workspace=workspace_name)
         cursor.execute("DELETE FROM annotations WHERE workspace = %s", (workspace_name,))
+        dataset_files = collect_dataset_files(cursor, "workspace = %s", (workspace_name,))
         cursor.execute("DELETE FROM datasets WHERE workspace = %s", (workspace_name,))
         cursor.execute("DELETE FROM projects WHERE workspace = %s", (workspace_name,))
         
         # Commit transaction
         db.commit()
+        remove_dataset_files(dataset_files)
         
         return {
             "success": True, 
@@ -2707,7 +5097,7 @@ async def delete_workspace(workspace_name: str, token: str = Form(...)):
         db.close()
 
 @app.get("/admin/workspaces/{workspace_name}/export")
-async def export_workspace_data(workspace_name: str, token: str, data_type: str = "all"):
+def export_workspace_data(workspace_name: str, token: str, data_type: str = "all"):
     """Export workspace data (datasets, models, logs)"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -2726,12 +5116,15 @@ async def export_workspace_data(workspace_name: str, token: str, data_type: str
             # Export datasets
             cursor.execute("""
                 SELECT p.project_name, d.file_name, d.file_type, d.file_data, 
-                       LENGTH(d.file_data) as file_size, d.id
+                       d.file_size, d.id, d.storage_path
                 FROM datasets d
                 JOIN projects p ON d.project_id = p.id
                 WHERE d.workspace = %s
             """, (workspace_name,))
             datasets = cursor.fetchall()
+            for dataset in datasets:
+                dataset['file_data'] = load_dataset_bytes(dataset)
+                del dataset['storage_path']
             export_data['datasets'] = datasets
         
         if data_type in ["all", "models"]:
@@ -2795,7 +5188,7 @@ async def export_workspace_data(workspace_name: str, token: str, data_type: str
         db.close()
 
 @app.get("/admin/workspaces/{workspace_name}/analytics")
-async def get_workspace_analytics(workspace_name: str, token: str):
+def get_workspace_analytics(workspace_name: str, token: str):
     """Get detailed analytics for a specific workspace"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -2808,32 +5201,20 @@ async def get_workspace_analytics(workspace_name: str, token: str):
     cursor = db.cursor(dictionary=True)
     try:
         # Basic workspace stats
-        cursor.execute("""
-            SELECT 
-                COUNT(DISTINCT p.id) as total_projects,
-                COUNT(DISTINCT p.username) as total_users,
-                COUNT(DISTINCT d.id) as total_datasets,
-                COUNT(DISTINCT a.id) as total_annotations,
-                COUNT(DISTINCT tm.id) as total_models,
-                MIN(p.created_at) as workspace_created,
-                MAX(p.created_at) as last_activity
-            FROM projects p
-            LEFT JOIN datasets d ON p.workspace = d.workspace
-            LEFT JOIN annotations a ON p.workspace = a.workspace
-            LEFT JOIN trained_models tm ON p.workspace = tm.workspace
-            WHERE p.workspace = %s
-        """, (workspace_name,))
-        basic_stats = cursor.fetchone()
+        summaries = fetch_workspace_summaries(cursor, workspace_name)
+        summary = summaries[0] if summaries else None
+        basic_stats = {
+            "total_projects": summary['project_count'] if summary else 0,
+            "total_users": summary['user_count'] if summary else 0,
+            "total_datasets": summary['dataset_count'] if summary else 0,
+            "total_annotations": summary['annotation_count'] if summary else 0,
+            "total_models": summary['model_count'] if summary else 0,
+            "workspace_created": summary['first_activity'] if summary else None,
+            "last_activity": summary['last_activity'] if summary else None
+        }
         
         # Intent distribution
-        cursor.execute("""
-            SELECT intent, COUNT(*) as count, 
-                   AVG(intent_confidence) as avg_confidence
-            FROM annotations 
-            WHERE workspace = %s AND intent IS NOT NULL
-            GROUP BY intent 
-            ORDER BY count DESC
-        """, (workspace_name,))
+        cursor.execute(WORKSPACE_INTENT_DISTRIBUTION_SQL, (workspace_name,))
         intent_distribution = cursor.fetchall()
         
         # Model performance
@@ -2893,7 +5274,7 @@ async def get_workspace_analytics(workspace_name: str, token: str):
         
 # === WORKSAPCES MANAGEMENT ENDPOINTS ===
 @app.delete("/admin/workspaces/{workspace_name}")
-async def delete_workspace(workspace_name: str, token: str = Form(...)):
+def delete_workspace(workspace_name: str, token: str = Form(...)):
     """Delete a workspace and all its data"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -2922,10 +5303,12 @@ async def delete_workspace(workspace_name: str, token: str = Form(...)):
         # Delete data from all tables in correct order
         cursor.execute("DELETE FROM trained_models WHERE workspace = %s", (workspace_name,))
         models_deleted = cursor.rowcount
+        model_registry.invalidate(workspace=workspace_name)
         
         cursor.execute("DELETE FROM annotations WHERE workspace = %s", (workspace_name,))
         annotations_deleted = cursor.rowcount
         
+        dataset_files = collect_dataset_files(cursor, "workspace = %s", (workspace_name,))
         cursor.execute("DELETE FROM datasets WHERE workspace = %s", (workspace_name,))
         datasets_deleted = cursor.rowcount
         
@@ -2934,6 +5317,7 @@ async def delete_workspace(workspace_name: str, token: str = Form(...)):
         
         # Commit transaction
         db.commit()
+        remove_dataset_files(dataset_files)
         
         return {
             "success": True, 
@@ -2956,7 +5340,7 @@ async def delete_workspace(workspace_name: str, token: str = Form(...)):
         cursor.close()
         db.close()        
 @app.get("/admin/datasets")
-async def get_all_datasets(token: str, workspace: str = "workspace1"):
+def get_all_datasets(token: str, workspace: str = "workspace1"):
     """Admin endpoint to get ALL datasets across all users"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -2968,13 +5352,7 @@ async def get_all_datasets(token: str, workspace: str = "workspace1"):
     
     cursor = db.cursor(dictionary=True)
     try:
-        cursor.execute("""
-            SELECT d.id, p.project_name, d.file_name, d.file_type, p.username
-            FROM datasets d 
-            JOIN projects p ON d.project_id = p.id 
-            WHERE d.workspace = %s
-            ORDER BY p.username, p.project_name
-        """, (workspace,))
+        cursor.execute(WORKSPACE_DATASETS_SQL, (workspace,))
         datasets = cursor.fetchall()
         return {"success": True, "datasets": datasets}
     except Exception as e:
@@ -2985,154 +5363,38 @@ async def get_all_datasets(token: str, workspace: str = "workspace1"):
         
 # Admin dataset preview endpoint
 @app.get("/admin/datasets/preview/{dataset_id}")
-async def admin_preview_dataset(dataset_id: int, token: str, workspace: str = "workspace1"):
-    """Admin preview endpoint - no user restrictions"""
-    admin_username = verify_admin(token)
-    if not admin_username:
-        raise HTTPException(status_code=401, detail="Admin access required.")
-    
-    db = get_db()
-    if not db:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    cursor = db.cursor(dictionary=True)
-    try:
-        # No user restriction for admin
-        cursor.execute("""
-            SELECT d.id, d.file_name, d.file_type, d.file_data
-            FROM datasets d
-            WHERE d.id = %s AND d.workspace = %s
-        """, (dataset_id, workspace))
-        result = cursor.fetchone()
-        
-        if not result:
-            raise HTTPException(status_code=404, detail="Dataset not found.")
-        
-        # ... rest of your existing preview logic from /datasets/preview/{dataset_id}
-        file_name = result["file_name"]
-        file_type = result["file_type"].lower() if result["file_type"] else "csv"
-        file_data = result["file_data"]
-        
-        print(f"Admin Preview: Processing file {file_name}, type: {file_type}")
-        
-        if not file_data:
-            raise HTTPException(status_code=400, detail="File data is empty")
-        
-        # Convert to bytes if needed
-        if isinstance(file_data, str):
-            file_content = file_data.encode('utf-8')
-        elif isinstance(file_data, bytes):
-            file_content = file_data
-        else:
-            file_content = bytes(file_data)
-        
-        if len(file_content) == 0:
-            raise HTTPException(status_code=400, detail="File content is empty")
-        
-        # Process different file types (same as your existing preview logic)
-        df = None
-        error_messages = []
-        
-        try:
-            if file_type == "csv":
-                encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252', 'utf-8-sig']
-                for encoding in encodings:
-                    try:
-                        df = pd.read_csv(io.BytesIO(file_content), encoding=encoding)
-                        print(f"Successfully read CSV with encoding: {encoding}")
-                        break
-                    except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                        error_messages.append(f"Encoding {encoding} failed: {str(e)}")
-                        continue
-                
-                if df is None:
-                    try:
-                        df = pd.read_csv(io.BytesIO(file_content), encoding='utf-8', errors='ignore')
-                    except Exception as e:
-                        raise HTTPException(status_code=400, detail=f"Failed to read CSV: {str(e)}")
-                        
-            elif file_type == "json":
-                try:
-                    content_str = file_content.decode('utf-8')
-                    json_data = json.loads(content_str)
-                    
-                    if isinstance(json_data, list):
-                        df = pd.DataFrame(json_data)
-                    elif isinstance(json_data, dict):
-                        if 'data' in json_data and isinstance(json_data['data'], list):
-                            df = pd.DataFrame(json_data['data'])
-                        else:
-                            df = pd.DataFrame([json_data])
-                    else:
-                        raise HTTPException(status_code=400, detail="Unsupported JSON structure")
-                        
-                except json.JSONDecodeError:
-                    try:
-                        lines = content_str.strip().split('\n')
-                        json_list = []
-                        for line in lines:
-                            if line.strip():
-                                json_list.append(json.loads(line.strip()))
-                        df = pd.DataFrame(json_list)
-                    except:
-                        raise HTTPException(status_code=400, detail="Invalid JSON format")
-            else:
-                try:
-                    df = pd.read_csv(io.BytesIO(file_content))
-                    file_type = "csv"
-                except:
-                    try:
-                        content_str = file_content.decode('utf-8')
-                        json_data = json.loads(content_str)
-                        df = pd.DataFrame(json_data) if isinstance(json_data, list) else pd.DataFrame([json_data])
-                        file_type = "json"
-                    except:
-                        raise HTTPException(status_code=400, detail="Unsupported file format")
-            
-            if df is None or df.empty:
-                raise HTTPException(status_code=400, detail="No data could be extracted from file")
-            
-            # Clean the dataframe
-            df = df.fillna('')
-            df = df.where(pd.notnull(df), '')
-            
-            # Get preview data
-            preview_records = df.to_dict(orient="records")
-            
-            # Clean data for JSON serialization
-            cleaned_preview = []
-            for record in preview_records:
-                cleaned_record = {}
-                for key, value in record.items():
-                    if value is None:
-                        cleaned_record[str(key)] = None
-                    elif isinstance(value, (pd.Timestamp, datetime)):
-                        cleaned_record[str(key)] = value.isoformat()
-                    elif isinstance(value, (int, float, bool, str)):
-                        cleaned_record[str(key)] = value
-                    else:
-                        cleaned_record[str(key)] = str(value)
-                cleaned_preview.append(cleaned_record)
-            
-            response_data = {
-                "success": True,
-                "file_name": file_name,
-                "file_type": file_type,
-                "rows": len(df),
-                "columns": len(df.columns),
-                "preview": cleaned_preview,
-                "column_names": [str(col) for col in df.columns.tolist()],
-                "data_sample": cleaned_preview[:5]
-            }
-            
-            print(f"Admin Preview generated: {len(cleaned_preview)} records, {len(df.columns)} columns")
-            
-            return response_data
-            
+def admin_preview_dataset(dataset_id: int, token: str, workspace: str = "workspace1", limit: Optional[int] = Query(None, ge=1)):
+    """Admin preview endpoint - no user restrictions"""
+    admin_username = verify_admin(token)
+    if not admin_username:
+        raise HTTPException(status_code=401, detail="Admin access required.")
+    
+    db = get_db()
+    if not db:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    cursor = db.cursor(dictionary=True)
+    try:
+        # No user restriction for admin; legacy BLOBs are only read up to the preview head
+        cursor.execute("""
+            SELECT d.id, d.file_name, d.storage_path, d.content_hash, d.row_count, d.ingest_status, d.csv_delimiter,
+                   SUBSTRING(d.file_data, 1, %s) as file_head, LENGTH(d.file_data) as blob_size
+            FROM datasets d
+            WHERE d.id = %s AND d.workspace = %s
+        """, (DATASET_PREVIEW_BYTES, dataset_id, workspace))
+        result = cursor.fetchone()
+        
+        if not result:
+            raise HTTPException(status_code=404, detail="Dataset not found.")
+        
+        try:
+            preview = get_dataset_preview(result, min(limit or DATASET_PREVIEW_ROWS, DATASET_PREVIEW_MAX_ROWS))
         except Exception as e:
             print(f"Error processing file: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Failed to process file: {str(e)}")
         
+        return {"success": True, "file_name": result["file_name"], **preview}
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -3144,7 +5406,7 @@ async def admin_preview_dataset(dataset_id: int, token: str, workspace: str = "w
 
 # Admin dataset download endpoint
 @app.get("/admin/datasets/download/{dataset_id}")
-async def admin_download_dataset(dataset_id: int, token: str, workspace: str = "workspace1"):
+def admin_download_dataset(dataset_id: int, token: str, workspace: str = "workspace1"):
     """Admin download endpoint - no user restrictions"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -3158,7 +5420,7 @@ async def admin_download_dataset(dataset_id: int, token: str, workspace: str = "
     try:
         # No user restriction for admin
         cursor.execute("""
-            SELECT d.file_name, d.file_type, d.file_data
+            SELECT d.file_name, d.file_type, d.file_data, d.storage_path
             FROM datasets d
             WHERE d.id = %s AND d.workspace = %s
         """, (dataset_id, workspace))
@@ -3169,18 +5431,12 @@ async def admin_download_dataset(dataset_id: int, token: str, workspace: str = "
         
         file_name = result["file_name"]
         file_type = result["file_type"]
-        file_data = result["file_data"]
+        file_data = load_dataset_bytes(result)
         
         if not file_data:
             raise HTTPException(status_code=400, detail="File data is empty")
         
-        # Convert to bytes if needed
-        if isinstance(file_data, str):
-            file_content = file_data.encode('utf-8')
-        elif isinstance(file_data, bytes):
-            file_content = file_data
-        else:
-            file_content = bytes(file_data)
+        file_content = file_data
         
         # Determine media type
         media_type = "text/csv" if file_type.lower() == "csv" else "application/json"
@@ -3202,7 +5458,7 @@ async def admin_download_dataset(dataset_id: int, token: str, workspace: str = "
 
 # Admin dataset delete endpoint
 @app.delete("/admin/datasets/{dataset_id}")
-async def admin_delete_dataset(dataset_id: int, token: str = Form(...), workspace: str = Form("workspace1")):
+def admin_delete_dataset(dataset_id: int, token: str = Form(...), workspace: str = Form("workspace1")):
     """Admin delete endpoint - no user restrictions"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -3215,7 +5471,7 @@ async def admin_delete_dataset(dataset_id: int, token: str = Form(...), workspac
     cursor = db.cursor()
     try:
         # No user restriction for admin
-        cursor.execute("SELECT id FROM datasets WHERE id = %s AND workspace = %s", (dataset_id, workspace))
+        cursor.execute("SELECT id, storage_path FROM datasets WHERE id = %s AND workspace = %s", (dataset_id, workspace))
         result = cursor.fetchone()
         
         if not result:
@@ -3224,6 +5480,7 @@ async def admin_delete_dataset(dataset_id: int, token: str = Form(...), workspac
         cursor.execute("DELETE FROM datasets WHERE id = %s", (dataset_id,))
         
         if cursor.rowcount > 0:
+            remove_dataset_files([result[1]])
             return {"success": True, "message": "Dataset deleted successfully"}
         else:
             return {"success": False, "error": "Failed to delete dataset"}
@@ -3236,7 +5493,7 @@ async def admin_delete_dataset(dataset_id: int, token: str = Form(...), workspac
         cursor.close()
         db.close()                             
 @app.post("/login")
-async def login(username: str = Form(...), password: str = Form(...)):
+def login(username: str = Form(...), password: str = Form(...)):
     db = get_db()
     if not db:
         return {"success": False, "error": "Database connection failed"}
@@ -3247,7 +5504,7 @@ async def login(username: str = Form(...), password: str = Form(...)):
         user = cursor.fetchone()
         
         if user and user["password"] == hash_pw(password):
-            token = create_token(username)
+            token = create_token(username, user["role"])
             return {
                 "success": True, 
                 "token": token, 
@@ -3261,14 +5518,32 @@ async def login(username: str = Form(...), password: str = Form(...)):
     finally:
         cursor.close()
         db.close()
+
+@app.post("/logout")
+def logout(token: str = Form(...)):
+    """Revoke a token before it expires; without TOKEN_REVOCATION it simply runs out"""
+    claims = decode_token(token)
+    if not claims:
+        return {"success": False, "error": "Invalid token"}
+    if not TOKEN_REVOCATION:
+        return {"success": True, "message": "Logged out", "revoked": False}
+    try:
+        revoked = token_revocations.revoke(claims["jti"], datetime.utcfromtimestamp(claims["exp"]))
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    if not revoked:
+        return {"success": False, "error": "Database connection failed"}
+    return {"success": True, "message": "Logged out", "revoked": True}
+
 @app.put("/admin/datasets/{dataset_id}/replace")
-async def replace_dataset(
+def replace_dataset(
     dataset_id: int, 
     file: UploadFile = File(...), 
     workspace: str = Form("workspace1"), 
     token: str = Form(...)
 ):
-    """Replace an existing dataset with a new file"""
+    """Replace an existing dataset with a new file.
+    The file is ingested in the background under a new dataset id, which takes the old dataset's place when done"""
     admin_username = verify_admin(token)
     if not admin_username:
         return {"success": False, "error": "Admin access required"}
@@ -3278,25 +5553,38 @@ async def replace_dataset(
         return {"success": False, "error": "Database connection failed"}
     
     cursor = db.cursor()
+    stored = None
     try:
         # Verify dataset exists
-        cursor.execute("SELECT id FROM datasets WHERE id = %s AND workspace = %s", (dataset_id, workspace))
-        if not cursor.fetchone():
+        cursor.execute("SELECT id, storage_path FROM datasets WHERE id = %s AND workspace = %s", (dataset_id, workspace))
+        existing = cursor.fetchone()
+        if not existing:
             return {"success": False, "error": "Dataset not found"}
         
-        # Read new file data
-        file_data = await file.read()
+        stored = store_upload(file.file, file.filename)
+        encoding, file_format, delimiter = sniff_dataset(stored["head"], file.filename)
         
-        # Update dataset
+        # The old dataset stays in place until the staging row has all its rows; a failed parse only drops the staging row
         cursor.execute("""
-            UPDATE datasets 
-            SET file_name = %s, file_type = %s, file_data = %s 
-            WHERE id = %s AND workspace = %s
-        """, (file.filename, file.filename.split('.')[-1], file_data, dataset_id, workspace))
+            INSERT INTO datasets (project_id, file_name, file_type, file_size, workspace, storage_path, 
+                                  file_format, encoding, csv_delimiter, content_hash, ingest_status, ingest_started_at) 
+            VALUES (NULL, %s, %s, %s, NULL, %s, %s, %s, %s, %s, 'ingesting', NOW())
+        """, (file.filename, file.filename.split('.')[-1], stored["size"], stored["storage_path"],
+              file_format, encoding, delimiter, stored["content_hash"]))
+        replacement_id = cursor.lastrowid
+        dataset_ingest_executor.submit(run_dataset_ingest, replacement_id, stored["storage_path"], encoding, file_format,
+                                       delimiter, replaces=dataset_id)
         
-        return {"success": True, "message": "Dataset replaced successfully"}
+        return {
+            "success": True, 
+            "message": "Replacement is being ingested; the dataset switches to the new file when it is done", 
+            "replacement_id": replacement_id, 
+            "format": file_format
+        }
         
     except Exception as e:
+        if stored:
+            remove_dataset_files([stored["storage_path"]])
         return {"success": False, "error": str(e)}
     finally:
         cursor.close()
@@ -3305,7 +5593,7 @@ async def replace_dataset(
 # Add these endpoints to your FastAPI app
 
 @app.get("/admin/models")
-async def get_all_models(token: str, workspace: str = "workspace1"):
+def get_all_models(token: str, workspace: str = "workspace1"):
     """Admin endpoint to get ALL models across all users"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -3343,7 +5631,7 @@ async def get_all_models(token: str, workspace: str = "workspace1"):
         db.close()
 
 @app.get("/admin/models/{model_id}/download")
-async def download_model(model_id: int, token: str, workspace: str = "workspace1"):
+def download_model(model_id: int, token: str, workspace: str = "workspace1"):
     """Download model data"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -3395,7 +5683,7 @@ async def download_model(model_id: int, token: str, workspace: str = "workspace1
         db.close()
 
 @app.delete("/admin/models/{model_id}")
-async def delete_model(model_id: int, token: str = Form(...), workspace: str = Form("workspace1")):
+def delete_model(model_id: int, token: str = Form(...), workspace: str = Form("workspace1")):
     """Delete a model (admin only)"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -3414,6 +5702,7 @@ async def delete_model(model_id: int, token: str = Form(...), workspace: str = F
         
         # Delete the model
         cursor.execute("DELETE FROM trained_models WHERE id = %s", (model_id,))
+        model_registry.invalidate(workspace=workspace)
         
         if cursor.rowcount > 0:
             return {"success": True, "message": "Model deleted successfully"}
@@ -3426,8 +5715,72 @@ async def delete_model(model_id: int, token: str = Form(...), workspace: str = F
         cursor.close()
         db.close()
 
+@app.get("/admin/models/cache-stats")
+def get_model_cache_stats(token: str):
+    """In-memory model cache counters (admin only)"""
+    admin_username = verify_admin(token)
+    if not admin_username:
+        return {"success": False, "error": "Admin access required"}
+    
+    return {
+        "success": True,
+        "model_cache": model_manager.stats(),
+        "registry_entries": len(model_registry),
+        "role_cache": role_cache.stats()
+    }
+
+@app.get("/admin/db-pool-stats")
+def get_db_pool_stats(token: str):
+    """Database connection pool usage (admin only)"""
+    admin_username = verify_admin(token)
+    if not admin_username:
+        return {"success": False, "error": "Admin access required"}
+    
+    return {"success": True, "db_pool": db_pool.status()}
+
+@app.get("/admin/db/explain-check")
+def get_explain_check(token: str):
+    """EXPLAIN the hot queries and report any that fall back to a full table scan (admin only)"""
+    admin_username = verify_admin(token)
+    if not admin_username:
+        return {"success": False, "error": "Admin access required"}
+    
+    db = get_db()
+    if not db:
+        return {"success": False, "error": "Database connection failed"}
+    
+    try:
+        results = explain_hot_queries(db)
+        return {
+            "success": True,
+            "passed": not any(result['full_scan'] for result in results),
+            "full_scans": [result['query'] for result in results if result['full_scan']],
+            "results": results
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        db.close()
+
+@app.get("/admin/event-loop-stats")
+def get_event_loop_stats(token: str):
+    """Event loop lag and API threadpool usage (admin only)"""
+    admin_username = verify_admin(token)
+    if not admin_username:
+        return {"success": False, "error": "Admin access required"}
+    
+    return {
+        "success": True,
+        "event_loop": event_loop_monitor.status(),
+        "threadpool": threadpool_status(),
+        "inference": inference_executor.status(),
+        "plotting": plot_executor.status(),
+        "db_pool": db_pool.status(),
+        "activity_log": activity_writer.status()
+    }
+
 @app.get("/admin/models/statistics")
-async def get_model_statistics(token: str, workspace: str = "workspace1"):
+def get_model_statistics(token: str, workspace: str = "workspace1"):
     """Get comprehensive model statistics"""
     admin_username = verify_admin(token)
     if not admin_username:
@@ -3440,11 +5793,7 @@ async def get_model_statistics(token: str, workspace: str = "workspace1"):
     cursor = db.cursor(dictionary=True)
     try:
         # Get all models
-        cursor.execute("""
-            SELECT model_type, training_data_count, metrics, created_at
-            FROM trained_models
-            WHERE workspace = %s
-        """, (workspace,))
+        cursor.execute(WORKSPACE_MODELS_SQL, (workspace,))
         models = cursor.fetchall()
         
         statistics = {
@@ -3523,7 +5872,7 @@ async def get_model_statistics(token: str, workspace: str = "workspace1"):
         db.close()               
 # Projects endpoints
 @app.post("/projects")
-async def create_project(project_name: str = Form(...), workspace: str = Form("workspace1"), token: str = Form(...)):
+def create_project(project_name: str = Form(...), workspace: str = Form("workspace1"), token: str = Form(...)):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -3544,7 +5893,7 @@ async def create_project(project_name: str = Form(...), workspace: str = Form("w
         db.close()
 
 @app.get("/projects")
-async def get_projects(token: str, workspace: str = "workspace1"):
+def get_projects(token: str, workspace: str = "workspace1"):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -3555,7 +5904,7 @@ async def get_projects(token: str, workspace: str = "workspace1"):
     
     cursor = db.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT id, project_name FROM projects WHERE username = %s AND workspace = %s", (username, workspace))
+        cursor.execute(USER_PROJECTS_SQL, (username, workspace))
         projects = cursor.fetchall()
         return {"success": True, "projects": projects}
     except Exception as e:
@@ -3564,9 +5913,604 @@ async def get_projects(token: str, workspace: str = "workspace1"):
         cursor.close()
         db.close()
 
+# Dataset ingestion - uploads are streamed to the file store in chunks, then parsed incrementally into dataset_rows
+DATASET_STORE_DIR = os.path.join(os.environ.get("UPLOAD_FOLDER", "./uploaded_files"), "datasets")
+DATASET_MAX_BYTES = int(os.environ.get("DATASET_MAX_BYTES", str(1024 * 1024 * 1024)))
+DATASET_MAX_ROWS = int(os.environ.get("DATASET_MAX_ROWS", "5000000"))
+DATASET_CHUNK_SIZE = int(os.environ.get("DATASET_CHUNK_SIZE", str(1024 * 1024)))
+DATASET_ROW_BATCH = int(os.environ.get("DATASET_ROW_BATCH", "1000"))
+DATASET_SNIFF_BYTES = 64 * 1024
+DATASET_MAX_TEXT_CHARS = 16000  # dataset_rows.text is a TEXT column (64 KB)
+DATASET_TEXT_KEYS = ("text", "sentence", "utterance", "query", "message")
+DATASET_LABEL_KEYS = ("intent", "label", "category")
+
+csv.field_size_limit(DATASET_MAX_TEXT_CHARS * 64)
+
+class DatasetTooLarge(ValueError):
+    pass
+
+class DatasetNotReady(ValueError):
+    pass
+
+def dataset_file_path(storage_path: str) -> str:
+    return os.path.join(DATASET_STORE_DIR, storage_path)
+
+def store_upload(stream, file_name: str) -> Dict[str, Any]:
+    """Copy an upload stream into the file store chunk by chunk, enforcing DATASET_MAX_BYTES"""
+    os.makedirs(DATASET_STORE_DIR, exist_ok=True)
+    extension = re.sub(r'[^a-z0-9]', '', (file_name or '').rsplit('.', 1)[-1].lower())[:10] or "dat"
+    storage_path = f"{secrets.token_hex(16)}.{extension}"
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+    try:
+        with open(dataset_file_path(storage_path), "wb") as out:
+            while True:
+                chunk = stream.read(DATASET_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > DATASET_MAX_BYTES:
+                    raise DatasetTooLarge(f"File exceeds the {DATASET_MAX_BYTES // (1024 * 1024)} MB upload limit")
+                if len(head) < DATASET_SNIFF_BYTES:
+                    head += chunk[:DATASET_SNIFF_BYTES - len(head)]
+                digest.update(chunk)
+                out.write(chunk)
+    except Exception:
+        remove_dataset_files([storage_path])
+        raise
+    return {"storage_path": storage_path, "size": size, "content_hash": digest.hexdigest(), "head": head}
+
+def remove_dataset_files(storage_paths):
+    for storage_path in storage_paths:
+        if storage_path:
+            try:
+                os.remove(dataset_file_path(storage_path))
+            except OSError:
+                pass
+
+def collect_dataset_files(cursor, where: str, params) -> List[str]:
+    """Storage paths of the datasets about to be deleted; remove them once the delete is committed"""
+    cursor.execute(f"SELECT storage_path FROM datasets WHERE {where}", params)
+    paths = []
+    for row in cursor.fetchall():
+        path = row["storage_path"] if isinstance(row, dict) else row[0]
+        if path:
+            paths.append(path)
+    return paths
+
+def load_dataset_bytes(dataset: Dict[str, Any]) -> bytes:
+    """Whole content of a dataset row, from the legacy BLOB or the file store"""
+    file_data = dataset.get("file_data")
+    if file_data:
+        if isinstance(file_data, str):
+            return file_data.encode('utf-8')
+        return bytes(file_data)
+    if dataset.get("storage_path"):
+        with open(dataset_file_path(dataset["storage_path"]), "rb") as f:
+            return f.read()
+    return b""
+
+def sniff_csv_delimiter(sample: str) -> str:
+    try:
+        return csv.Sniffer().sniff(sample[:16384], delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+def sniff_dataset(head: bytes, file_name: str = "") -> Tuple[str, str, Optional[str]]:
+    """Detect (encoding, format, csv delimiter) from the first bytes of a file; format is csv, json or jsonl"""
+    if head.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    elif head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = "utf-16"
+    else:
+        try:
+            # Incremental so a multi-byte character cut at the end of the head is not an error
+            codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+            encoding = "utf-8"
+        except UnicodeDecodeError:
+            try:
+                head.decode("cp1252")
+                encoding = "cp1252"
+            except UnicodeDecodeError:
+                encoding = "latin-1"
+    
+    text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(head, final=False).lstrip()
+    if text.startswith("["):
+        return encoding, "json", None
+    if text.startswith("{"):
+        first_line = text.split("\n", 1)[0].strip()
+        try:
+            record = json.loads(first_line)
+        except ValueError:
+            # A pretty-printed object spans lines
+            return encoding, "json", None
+        if isinstance(record, dict) and isinstance(record.get("data"), list):
+            return encoding, "json", None
+        return encoding, "jsonl", None
+    extension = (file_name or "").rsplit(".", 1)[-1].lower()
+    if extension in ("json", "jsonl") and not text:
+        return encoding, extension, None
+    return encoding, "csv", sniff_csv_delimiter(text)
+
+def iter_json_array(stream):
+    """Yield the items of a top-level JSON array (or the array under "data") while reading the stream in chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(DATASET_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return not eof
+    
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or not read_more():
+                return
+    
+    skip(" \t\r\n")
+    if buffer[pos:pos + 1] == "{":
+        data_key = re.compile(r'"data"\s*:\s*\[')
+        match = data_key.search(buffer, pos)
+        while not match and len(buffer) - pos <= DATASET_SNIFF_BYTES and read_more():
+            match = data_key.search(buffer, pos)
+        if not match:
+            # A single object is a single record
+            while read_more():
+                pass
+            yield json.loads(buffer[pos:])
+            return
+        pos = match.end() - 1
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError("Expected a JSON array of records")
+    pos += 1
+    
+    while True:
+        skip(" \t\r\n,")
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of JSON array")
+        if buffer[pos] == "]":
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A value that ends exactly at the buffer edge may continue in the next chunk
+                if end < len(buffer) or eof or not read_more():
+                    break
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise ValueError("Invalid or truncated JSON array")
+        pos = end
+        yield item
+
+def normalize_record(record) -> Tuple[Optional[str], Optional[str]]:
+    """(text, label) for one parsed record"""
+    label = None
+    if isinstance(record, dict):
+        lowered = {str(key).strip().lower(): value for key, value in record.items()}
+        text = next((lowered[key] for key in DATASET_TEXT_KEYS if lowered.get(key) not in (None, "")), None)
+        if text is None:
+            text = next((value for value in record.values() if value not in (None, "")), None)
+        label = next((lowered[key] for key in DATASET_LABEL_KEYS if lowered.get(key) not in (None, "")), None)
+    elif isinstance(record, (list, tuple)):
+        text = record[0] if record else None
+    else:
+        text = record
+    
+    if text is None or isinstance(text, (dict, list)):
+        return None, None
+    text = str(text).strip()[:DATASET_MAX_TEXT_CHARS]
+    if not text:
+        return None, None
+    if label is not None:
+        label = str(label).strip()[:100] or None
+    return text, label
+
+def iter_dataset_records(stream, file_format: str, delimiter: Optional[str] = None):
+    """Yield (text, label) from a decoded text stream"""
+    if file_format == "csv":
+        reader = csv.reader(stream, delimiter=delimiter or ",")
+        header = next(reader, None)
+        if not header:
+            return
+        names = [name.strip().lower() for name in header]
+        text_index = next((names.index(key) for key in DATASET_TEXT_KEYS if key in names), 0)
+        label_index = next((names.index(key) for key in DATASET_LABEL_KEYS if key in names), None)
+        for row in reader:
+            if len(row) <= text_index:
+                continue
+            label = row[label_index] if label_index is not None and label_index < len(row) else None
+            text, label = normalize_record({"text": row[text_index], "label": label})
+            if text:
+                yield text, label
+    elif file_format == "jsonl":
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Invalid JSON on line {line_number}")
+            text, label = normalize_record(record)
+            if text:
+                yield text, label
+    else:
+        for record in iter_json_array(stream):
+            text, label = normalize_record(record)
+            if text:
+                yield text, label
+
+def ingest_dataset(db, dataset_id: int, storage_path: str, encoding: str, file_format: str, delimiter: Optional[str] = None) -> int:
+    """Parse a stored file into dataset_rows in DATASET_ROW_BATCH inserts; returns the row count"""
+    cursor = db.cursor()
+    try:
+        cursor.execute("DELETE FROM dataset_rows WHERE dataset_id = %s", (dataset_id,))
+        batch = []
+        row_count = 0
+        with open(dataset_file_path(storage_path), "r", encoding=encoding, errors="replace", newline="") as stream:
+            for text, label in iter_dataset_records(stream, file_format, delimiter):
+                if row_count >= DATASET_MAX_ROWS:
+                    raise DatasetTooLarge(f"File exceeds the {DATASET_MAX_ROWS} row limit")
+                # A random key per row gives every dataset a stable shuffled order for sampling
+                batch.append((dataset_id, row_count, text, label, random.getrandbits(31)))
+                row_count += 1
+                if len(batch) >= DATASET_ROW_BATCH:
+                    cursor.executemany("INSERT INTO dataset_rows (dataset_id, row_index, text, label, sample_key) VALUES (%s, %s, %s, %s, %s)", batch)
+                    batch = []
+                    # Progress keeps a long ingest from being expired as dead
+                    cursor.execute("UPDATE datasets SET ingest_started_at = NOW() WHERE id = %s", (dataset_id,))
+        if batch:
+            cursor.executemany("INSERT INTO dataset_rows (dataset_id, row_index, text, label, sample_key) VALUES (%s, %s, %s, %s, %s)", batch)
+        cursor.execute("UPDATE datasets SET row_count = %s, ingest_status = 'ready' WHERE id = %s", (row_count, dataset_id))
+        return row_count
+    finally:
+        cursor.close()
+
+# Uploads are parsed on background threads; the request returns once the file is stored and the row inserted.
+# A replacement is ingested into a staging row (no project or workspace, so no listing shows it) that
+# takes the old dataset's place once all its rows are in
+DATASET_INGEST_WORKERS = int(os.environ.get("DATASET_INGEST_WORKERS", "2"))
+dataset_ingest_executor = ThreadPoolExecutor(max_workers=DATASET_INGEST_WORKERS, thread_name_prefix="dataset-ingest")
+
+def drop_dataset_rows(db, dataset_id: int):
+    """Delete a dataset's rows in DATASET_ROW_BATCH chunks rather than one long statement"""
+    cursor = db.cursor()
+    try:
+        while True:
+            cursor.execute("DELETE FROM dataset_rows WHERE dataset_id = %s LIMIT %s", (dataset_id, DATASET_ROW_BATCH))
+            if cursor.rowcount < DATASET_ROW_BATCH:
+                break
+    finally:
+        cursor.close()
+
+def drop_dataset(db, dataset_id: int, storage_path: Optional[str]):
+    """Delete a dataset, its rows and its file"""
+    drop_dataset_rows(db, dataset_id)
+    cursor = db.cursor()
+    try:
+        cursor.execute("DELETE FROM datasets WHERE id = %s", (dataset_id,))
+    finally:
+        cursor.close()
+    if storage_path:
+        remove_dataset_files([storage_path])
+
+def swap_in_dataset(db, staging_id: int, dataset_id: int) -> bool:
+    """Give an ingested staging row the project and workspace of the dataset it replaces and drop the old one.
+    False (and the staging row is dropped) if that dataset was deleted or replaced in the meantime"""
+    cursor = db.cursor()
+    try:
+        db.start_transaction()
+        cursor.execute("""
+            SELECT project_id, workspace, storage_path FROM datasets 
+            WHERE id = %s AND project_id IS NOT NULL FOR UPDATE
+        """, (dataset_id,))
+        old = cursor.fetchone()
+        if old:
+            cursor.execute("UPDATE datasets SET project_id = NULL, workspace = NULL WHERE id = %s", (dataset_id,))
+            cursor.execute("UPDATE datasets SET project_id = %s, workspace = %s WHERE id = %s", (old[0], old[1], staging_id))
+        db.commit()
+    except Exception:
+        if db.in_transaction:
+            db.rollback()
+        raise
+    finally:
+        cursor.close()
+    if not old:
+        cursor = db.cursor()
+        try:
+            cursor.execute("SELECT storage_path FROM datasets WHERE id = %s", (staging_id,))
+            staged = cursor.fetchone()
+        finally:
+            cursor.close()
+        drop_dataset(db, staging_id, staged[0] if staged else None)
+        return False
+    drop_dataset(db, dataset_id, old[2])
+    return True
+
+def run_dataset_ingest(dataset_id: int, storage_path: str, encoding: str, file_format: str,
+                       delimiter: Optional[str] = None, replaces: Optional[int] = None):
+    """Background entry point: parse an upload into dataset_rows, then swap it in when it is a replacement.
+    A failed upload is marked 'failed' (retry through the sentences endpoint); a failed replacement is dropped"""
+    db = get_db()
+    if not db:
+        # The row stays 'ingesting' and expires after DATASET_INGEST_TIMEOUT
+        print(f"Dataset ingest error: no database connection for dataset {dataset_id}")
+        return
+    try:
+        try:
+            ingest_dataset(db, dataset_id, storage_path, encoding, file_format, delimiter)
+        except Exception as e:
+            print(f"Dataset ingest error: {str(e)}")
+            if replaces:
+                drop_dataset(db, dataset_id, storage_path)
+            else:
+                cursor = db.cursor()
+                try:
+                    cursor.execute("UPDATE datasets SET ingest_status = 'failed' WHERE id = %s", (dataset_id,))
+                finally:
+                    cursor.close()
+                drop_dataset_rows(db, dataset_id)
+            return
+        if replaces:
+            swap_in_dataset(db, dataset_id, replaces)
+    except Exception as e:
+        print(f"Dataset ingest error: {str(e)}")
+    finally:
+        db.close()
+
+# Dataset preview - built from a bounded head of the file and cached by dataset id and content hash
+DATASET_PREVIEW_BYTES = int(os.environ.get("DATASET_PREVIEW_BYTES", str(256 * 1024)))
+DATASET_PREVIEW_ROWS = int(os.environ.get("DATASET_PREVIEW_ROWS", "100"))
+DATASET_PREVIEW_MAX_ROWS = 1000
+DATASET_PREVIEW_CACHE_SIZE = int(os.environ.get("DATASET_PREVIEW_CACHE_SIZE", "256"))
+
+_dataset_preview_cache = OrderedDict()
+_dataset_preview_lock = threading.Lock()
+
+def read_dataset_head(dataset: Dict[str, Any]) -> Tuple[bytes, int]:
+    """(first DATASET_PREVIEW_BYTES, total size) from the file store, or from the file_head/blob_size columns of a legacy row"""
+    if dataset.get("storage_path"):
+        path = dataset_file_path(dataset["storage_path"])
+        with open(path, "rb") as f:
+            return f.read(DATASET_PREVIEW_BYTES), os.path.getsize(path)
+    head = dataset.get("file_head") or b""
+    if isinstance(head, str):
+        head = head.encode("utf-8")
+    return bytes(head), int(dataset.get("blob_size") or len(head))
+
+def build_dataset_preview(head: bytes, size: int, file_name: str, max_rows: int, delimiter: Optional[str] = None) -> Dict[str, Any]:
+    """Parse only the head of a file; the row total is extrapolated when the head does not hold the whole file.
+    delimiter is the one stored at ingest, so the preview splits columns the way the ingested rows were"""
+    if not head:
+        raise ValueError("File data is empty")
+    truncated = len(head) < size
+    encoding, file_format, sniffed_delimiter = sniff_dataset(head, file_name)
+    text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(head, final=not truncated)
+    if truncated and file_format != "json":
+        # The last line is probably cut off
+        text = text[:text.rfind("\n") + 1] or text
+    
+    if file_format == "csv":
+        delimiter = delimiter or sniffed_delimiter
+        df = pd.read_csv(io.StringIO(text), sep=delimiter, on_bad_lines="skip")
+        rows_in_head = len(df)
+        df = df.head(max_rows)
+    else:
+        delimiter = None
+        records = []
+        if file_format == "jsonl":
+            for line in text.splitlines():
+                if line.strip():
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        if not truncated:
+                            raise ValueError("Invalid JSON format")
+        else:
+            try:
+                for item in iter_json_array(io.StringIO(text)):
+                    records.append(item)
+            except ValueError:
+                # Running off the end of the head is expected; anything else is a bad file
+                if not truncated:
+                    raise ValueError("Invalid JSON format")
+        rows_in_head = len(records)
+        df = pd.DataFrame([record if isinstance(record, dict) else {"value": record} for record in records[:max_rows]])
+    
+    if df.empty:
+        raise ValueError("No data could be extracted from file")
+    
+    df = df.fillna('')
+    preview = []
+    for record in df.to_dict(orient="records"):
+        cleaned_record = {}
+        for key, value in record.items():
+            if value is None:
+                cleaned_record[str(key)] = None
+            elif isinstance(value, (pd.Timestamp, datetime)):
+                cleaned_record[str(key)] = value.isoformat()
+            elif isinstance(value, (int, float, bool, str)):
+                cleaned_record[str(key)] = value
+            else:
+                cleaned_record[str(key)] = str(value)
+        preview.append(cleaned_record)
+    
+    return {
+        "file_type": file_format,
+        "encoding": encoding,
+        "delimiter": delimiter,
+        "rows": round(rows_in_head * size / len(head)) if truncated else rows_in_head,
+        "rows_estimated": truncated,
+        "columns": len(df.columns),
+        "column_names": [str(col) for col in df.columns.tolist()],
+        "preview": preview,
+        "data_sample": preview[:5]
+    }
+
+def get_dataset_preview(dataset: Dict[str, Any], max_rows: int) -> Dict[str, Any]:
+    """Preview of a dataset row, from the cache when its content has been previewed before"""
+    key = (dataset["id"], dataset.get("content_hash"), max_rows)
+    with _dataset_preview_lock:
+        preview = _dataset_preview_cache.get(key) if key[1] else None
+    if preview is None:
+        head, size = read_dataset_head(dataset)
+        if not key[1]:
+            # Legacy rows have no content hash; the head and size stand in for it
+            key = (dataset["id"], f"{size}:{hashlib.sha256(head).hexdigest()}", max_rows)
+            with _dataset_preview_lock:
+                preview = _dataset_preview_cache.get(key)
+        if preview is None:
+            preview = build_dataset_preview(head, size, dataset["file_name"], max_rows, dataset.get("csv_delimiter"))
+    with _dataset_preview_lock:
+        _dataset_preview_cache[key] = preview
+        _dataset_preview_cache.move_to_end(key)
+        while len(_dataset_preview_cache) > DATASET_PREVIEW_CACHE_SIZE:
+            _dataset_preview_cache.popitem(last=False)
+    
+    result = dict(preview)
+    if dataset.get("ingest_status") == "ready":
+        result["rows"] = dataset["row_count"] or 0
+        result["rows_estimated"] = False
+    return result
+
+# An ingest that has not written a batch for this long died with its worker and counts as failed
+DATASET_INGEST_TIMEOUT = int(os.environ.get("DATASET_INGEST_TIMEOUT", "900"))
+
+def ensure_dataset_rows(db, dataset: Dict[str, Any], retry: bool = False) -> int:
+    """Ingest a dataset that has no rows yet (uploaded before ingestion); returns the row count.
+
+    A failed parse is only tried again when retry is set. The ingest is claimed with a conditional
+    UPDATE, so a dataset is parsed by one request at a time across every worker process.
+    """
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            UPDATE datasets SET ingest_status = 'failed' 
+            WHERE id = %s AND ingest_status = 'ingesting' 
+              AND (ingest_started_at IS NULL OR ingest_started_at < NOW() - INTERVAL %s SECOND)
+        """, (dataset['id'], DATASET_INGEST_TIMEOUT))
+        claimable = "ingest_status IS NULL OR ingest_status = 'failed'" if retry else "ingest_status IS NULL"
+        cursor.execute(f"""
+            UPDATE datasets SET ingest_status = 'ingesting', ingest_started_at = NOW() 
+            WHERE id = %s AND ({claimable})
+        """, (dataset['id'],))
+        claimed = cursor.rowcount > 0
+        cursor.execute("SELECT file_data, storage_path, ingest_status, row_count FROM datasets WHERE id = %s", (dataset['id'],))
+        current = cursor.fetchone()
+        if not claimed:
+            if current['ingest_status'] == 'ready':
+                return current['row_count'] or 0
+            if current['ingest_status'] == 'ingesting':
+                raise DatasetNotReady("Dataset is still being ingested, try again shortly")
+            raise DatasetNotReady("Dataset ingestion failed; fix the file or retry with retry_ingest=true")
+        
+        storage_path = current['storage_path']
+        moved = False
+        try:
+            if storage_path:
+                with open(dataset_file_path(storage_path), "rb") as f:
+                    head = f.read(DATASET_SNIFF_BYTES)
+                content_hash = None
+            else:
+                # Legacy BLOB: move it into the file store first
+                stored = store_upload(io.BytesIO(load_dataset_bytes(current)), dataset['file_name'])
+                storage_path, head, content_hash = stored["storage_path"], stored["head"], stored["content_hash"]
+                moved = True
+            encoding, file_format, delimiter = sniff_dataset(head, dataset['file_name'])
+            row_count = ingest_dataset(db, dataset['id'], storage_path, encoding, file_format, delimiter)
+        except Exception:
+            cursor.execute("UPDATE datasets SET ingest_status = 'failed' WHERE id = %s", (dataset['id'],))
+            if moved:
+                remove_dataset_files([storage_path])
+            raise
+        cursor.execute("""
+            UPDATE datasets 
+            SET storage_path = %s, file_format = %s, encoding = %s, csv_delimiter = %s,
+                content_hash = COALESCE(%s, content_hash), file_data = NULL 
+            WHERE id = %s
+        """, (storage_path, file_format, encoding, delimiter, content_hash, dataset['id']))
+        return row_count
+    finally:
+        cursor.close()
+
+def encode_sentence_cursor(mode: str, position: Tuple[int, ...]) -> str:
+    return base64.urlsafe_b64encode("|".join([mode] + [str(value) for value in position]).encode()).decode()
+
+def decode_sentence_cursor(page_cursor: str, mode: str) -> Tuple[int, ...]:
+    try:
+        cursor_mode, *position = base64.urlsafe_b64decode(page_cursor.encode()).decode().split("|")
+        position = tuple(int(value) for value in position)
+    except Exception:
+        raise ValueError("Invalid page cursor")
+    if cursor_mode != mode or len(position) != (2 if mode == "random" else 1):
+        raise ValueError("Page cursor does not match the requested sample")
+    return position
+
+def stratified_slice(label_counts: List[Tuple[Optional[str], int]], start: int, stop: int) -> List[Tuple[Optional[str], int, int]]:
+    """(label, offset, limit) per label for positions [start, stop) of a proportional walk over all labels"""
+    total = sum(count for _, count in label_counts)
+    if not total:
+        return []
+    stop = min(stop, total)
+    slices = []
+    for label, count in label_counts:
+        # Cumulative floor shares: pages never overlap and the full walk covers every row exactly once
+        low = start * count // total
+        high = stop * count // total
+        if high > low:
+            slices.append((label, low, high - low))
+    return slices
+
+def fetch_stratified_rows(cursor, conditions: List[str], params: List[Any], start: int, limit: int, total: int) -> List[Dict[str, Any]]:
+    """A page where each label contributes rows in proportion to its share, each label in its stable random order"""
+    cursor.execute(DATASET_LABEL_COUNTS_SQL.format(where=' AND '.join(conditions)), params)
+    label_counts = [(row['label'], row['count']) for row in cursor.fetchall()]
+    rows = []
+    for label, label_offset, label_limit in stratified_slice(label_counts, start, start + limit):
+        cursor.execute(f"""
+            SELECT row_index, text, label, sample_key FROM dataset_rows 
+            WHERE {' AND '.join(conditions)} AND label <=> %s 
+            ORDER BY sample_key, row_index 
+            LIMIT %s OFFSET %s
+        """, params + [label, label_limit, label_offset])
+        rows.extend(cursor.fetchall())
+    # Interleave the labels instead of returning them in blocks
+    rows.sort(key=lambda row: (row['sample_key'], row['row_index']))
+    return rows
+
+def dataset_page_query(conditions: List[str], params: List[Any], mode: str, position: Optional[tuple],
+                       offset: int, limit: int, dense: bool = True) -> Tuple[str, List[Any]]:
+    """SQL and parameters for one sequential or random page of dataset_rows (limit + 1 rows, to detect more)"""
+    order = "row_index" if mode == "sequential" else "sample_key, row_index"
+    page_conditions = list(conditions)
+    page_params = list(params)
+    skip = 0
+    if position:
+        if mode == "sequential":
+            page_conditions.append("row_index > %s")
+        else:
+            page_conditions.append("(sample_key, row_index) > (%s, %s)")
+        page_params.extend(position)
+    elif mode == "sequential" and dense:
+        # row_index is dense, so an offset is an index range rather than a scan
+        page_conditions.append("row_index >= %s")
+        page_params.append(offset)
+    else:
+        skip = offset
+    return DATASET_ROWS_PAGE_SQL.format(where=' AND '.join(page_conditions), order=order), page_params + [limit + 1, skip]
+
 # Datasets endpoints  
 @app.post("/datasets/upload")
-async def upload_dataset(project_id: int = Form(...), file: UploadFile = File(...), workspace: str = Form("workspace1"), token: str = Form(...)):
+def upload_dataset(project_id: int = Form(...), file: UploadFile = File(...), workspace: str = Form("workspace1"), token: str = Form(...)):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -3576,19 +6520,42 @@ async def upload_dataset(project_id: int = Form(...), file: UploadFile = File(..
         return {"success": False, "error": "Database connection failed"}
     
     cursor = db.cursor()
+    stored = None
+    dataset_id = None
     try:
-        file_data = await file.read()
-        cursor.execute("INSERT INTO datasets (project_id, file_name, file_type, file_data, workspace) VALUES (%s, %s, %s, %s, %s)",
-                      (project_id, file.filename, file.filename.split('.')[-1], file_data, workspace))
-        return {"success": True, "message": "File uploaded"}
+        stored = store_upload(file.file, file.filename)
+        encoding, file_format, delimiter = sniff_dataset(stored["head"], file.filename)
+        cursor.execute("""
+            INSERT INTO datasets (project_id, file_name, file_type, file_size, workspace, storage_path, 
+                                  file_format, encoding, csv_delimiter, content_hash, ingest_status, ingest_started_at) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'ingesting', NOW())
+        """, (project_id, file.filename, file.filename.split('.')[-1], stored["size"], workspace, stored["storage_path"],
+              file_format, encoding, delimiter, stored["content_hash"]))
+        dataset_id = cursor.lastrowid
+        dataset_ingest_executor.submit(run_dataset_ingest, dataset_id, stored["storage_path"], encoding, file_format, delimiter)
+        return {
+            "success": True, 
+            "message": "File uploaded, rows are being ingested", 
+            "dataset_id": dataset_id, 
+            "ingest_status": "ingesting", 
+            "format": file_format, 
+            "encoding": encoding
+        }
     except Exception as e:
+        if dataset_id:
+            try:
+                cursor.execute("DELETE FROM datasets WHERE id = %s", (dataset_id,))
+            except Exception:
+                pass
+        if stored:
+            remove_dataset_files([stored["storage_path"]])
         return {"success": False, "error": str(e)}
     finally:
         cursor.close()
         db.close()
 
 @app.get("/datasets")
-async def get_datasets(token: str, workspace: str = "workspace1"):
+def get_datasets(token: str, workspace: str = "workspace1"):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -3599,12 +6566,7 @@ async def get_datasets(token: str, workspace: str = "workspace1"):
     
     cursor = db.cursor(dictionary=True)
     try:
-        cursor.execute("""
-            SELECT d.id, p.project_name, d.file_name, d.file_type 
-            FROM datasets d 
-            JOIN projects p ON d.project_id = p.id 
-            WHERE p.username = %s AND d.workspace = %s
-        """, (username, workspace))
+        cursor.execute(USER_DATASETS_SQL, (username, workspace))
         datasets = cursor.fetchall()
         return {"success": True, "datasets": datasets}
     except Exception as e:
@@ -3614,7 +6576,7 @@ async def get_datasets(token: str, workspace: str = "workspace1"):
         db.close()
 
 @app.delete("/datasets/{dataset_id}")
-async def delete_dataset(dataset_id: int, token: str = Form(...)):
+def delete_dataset(dataset_id: int, token: str = Form(...)):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -3626,7 +6588,7 @@ async def delete_dataset(dataset_id: int, token: str = Form(...)):
     cursor = db.cursor()
     try:
         cursor.execute("""
-            SELECT d.id 
+            SELECT d.id, d.storage_path 
             FROM datasets d
             JOIN projects p ON d.project_id = p.id
             WHERE d.id = %s AND p.username = %s
@@ -3639,6 +6601,7 @@ async def delete_dataset(dataset_id: int, token: str = Form(...)):
         cursor.execute("DELETE FROM datasets WHERE id = %s", (dataset_id,))
         
         if cursor.rowcount > 0:
+            remove_dataset_files([result[1]])
             return {"success": True, "message": "Dataset deleted successfully"}
         else:
             return {"success": False, "error": "Failed to delete dataset - no rows affected"}
@@ -3652,8 +6615,8 @@ async def delete_dataset(dataset_id: int, token: str = Form(...)):
         db.close()
 
 @app.get("/datasets/preview/{dataset_id}")
-async def preview_dataset(dataset_id: int, token: str):
-    """Preview dataset content with better error handling"""
+def preview_dataset(dataset_id: int, token: str, limit: int = Query(20, ge=1)):
+    """Preview the first rows of a dataset without reading the whole file"""
     username = verify_token(token)
     if not username:
         raise HTTPException(status_code=401, detail="Invalid token.")
@@ -3664,150 +6627,27 @@ async def preview_dataset(dataset_id: int, token: str):
     
     cursor = db.cursor(dictionary=True)
     try:
-        # First verify the dataset belongs to the user
+        # Verify the dataset belongs to the user; legacy BLOBs are only read up to the preview head
         cursor.execute("""
-            SELECT d.id, d.file_name, d.file_type, d.file_data
+            SELECT d.id, d.file_name, d.storage_path, d.content_hash, d.row_count, d.ingest_status, d.csv_delimiter,
+                   SUBSTRING(d.file_data, 1, %s) as file_head, LENGTH(d.file_data) as blob_size
             FROM datasets d
             JOIN projects p ON d.project_id = p.id
             WHERE d.id = %s AND p.username = %s
-        """, (dataset_id, username))
+        """, (DATASET_PREVIEW_BYTES, dataset_id, username))
         result = cursor.fetchone()
         
         if not result:
             raise HTTPException(status_code=404, detail="Dataset not found or access denied.")
         
-        file_name = result["file_name"]
-        file_type = result["file_type"].lower() if result["file_type"] else "csv"
-        file_data = result["file_data"]
-        
-        print(f"Debug: Processing file {file_name}, type: {file_type}")
-        
-        if not file_data:
-            raise HTTPException(status_code=400, detail="File data is empty")
-        
-        # Convert to bytes if needed
-        if isinstance(file_data, str):
-            file_content = file_data.encode('utf-8')
-        elif isinstance(file_data, bytes):
-            file_content = file_data
-        else:
-            file_content = bytes(file_data)
-        
-        if len(file_content) == 0:
-            raise HTTPException(status_code=400, detail="File content is empty")
-        
-        # Process different file types
-        df = None
-        error_messages = []
-        
         try:
-            if file_type == "csv":
-                # Try multiple encodings for CSV
-                encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252', 'utf-8-sig']
-                for encoding in encodings:
-                    try:
-                        df = pd.read_csv(io.BytesIO(file_content), encoding=encoding)
-                        print(f"Successfully read CSV with encoding: {encoding}")
-                        break
-                    except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                        error_messages.append(f"Encoding {encoding} failed: {str(e)}")
-                        continue
-                
-                if df is None:
-                    # Last attempt: try with error handling
-                    try:
-                        df = pd.read_csv(io.BytesIO(file_content), encoding='utf-8', errors='ignore')
-                    except Exception as e:
-                        raise HTTPException(status_code=400, detail=f"Failed to read CSV: {str(e)}")
-                        
-            elif file_type == "json":
-                try:
-                    content_str = file_content.decode('utf-8')
-                    json_data = json.loads(content_str)
-                    
-                    # Handle different JSON structures
-                    if isinstance(json_data, list):
-                        df = pd.DataFrame(json_data)
-                    elif isinstance(json_data, dict):
-                        # Check if it's a nested structure
-                        if 'data' in json_data and isinstance(json_data['data'], list):
-                            df = pd.DataFrame(json_data['data'])
-                        else:
-                            # Flatten the dictionary
-                            df = pd.DataFrame([json_data])
-                    else:
-                        raise HTTPException(status_code=400, detail="Unsupported JSON structure")
-                        
-                except json.JSONDecodeError:
-                    # Try JSON lines format
-                    try:
-                        lines = content_str.strip().split('\n')
-                        json_list = []
-                        for line in lines:
-                            if line.strip():
-                                json_list.append(json.loads(line.strip()))
-                        df = pd.DataFrame(json_list)
-                    except:
-                        raise HTTPException(status_code=400, detail="Invalid JSON format")
-            else:
-                # Auto-detect format
-                try:
-                    df = pd.read_csv(io.BytesIO(file_content))
-                    file_type = "csv"
-                except:
-                    try:
-                        content_str = file_content.decode('utf-8')
-                        json_data = json.loads(content_str)
-                        df = pd.DataFrame(json_data) if isinstance(json_data, list) else pd.DataFrame([json_data])
-                        file_type = "json"
-                    except:
-                        raise HTTPException(status_code=400, detail="Unsupported file format")
-            
-            if df is None or df.empty:
-                raise HTTPException(status_code=400, detail="No data could be extracted from file")
-            
-            # Clean the dataframe
-            df = df.fillna('')
-            df = df.where(pd.notnull(df), '')
-            
-            # Get preview data
-            preview_records = df.head(20).to_dict(orient="records")
-            
-            # Clean data for JSON serialization
-            cleaned_preview = []
-            for record in preview_records:
-                cleaned_record = {}
-                for key, value in record.items():
-                    # Handle different data types
-                    if value is None:
-                        cleaned_record[str(key)] = None
-                    elif isinstance(value, (pd.Timestamp, datetime)):
-                        cleaned_record[str(key)] = value.isoformat()
-                    elif isinstance(value, (int, float, bool, str)):
-                        cleaned_record[str(key)] = value
-                    else:
-                        cleaned_record[str(key)] = str(value)
-                cleaned_preview.append(cleaned_record)
-            
-            response_data = {
-                "success": True,
-                "file_name": file_name,
-                "file_type": file_type,
-                "rows": len(df),
-                "columns": len(df.columns),
-                "preview": cleaned_preview,
-                "column_names": [str(col) for col in df.columns.tolist()],
-                "data_sample": cleaned_preview[:5]  # First 5 records as sample
-            }
-            
-            print(f"Preview generated: {len(cleaned_preview)} records, {len(df.columns)} columns")
-            
-            return response_data
-            
+            preview = get_dataset_preview(result, min(limit, DATASET_PREVIEW_MAX_ROWS))
         except Exception as e:
             print(f"Error processing file: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Failed to process file: {str(e)}")
         
+        return {"success": True, "file_name": result["file_name"], **preview}
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -3816,9 +6656,9 @@ async def preview_dataset(dataset_id: int, token: str):
     finally:
         cursor.close()
         db.close()
- 
+
 @app.get("/datasets/debug/{dataset_id}")
-async def debug_dataset(dataset_id: int, token: str):
+def debug_dataset(dataset_id: int, token: str):
     """Debug endpoint to check dataset issues"""
     username = verify_token(token)
     if not username:
@@ -3831,8 +6671,8 @@ async def debug_dataset(dataset_id: int, token: str):
     cursor = db.cursor(dictionary=True)
     try:
         cursor.execute("""
-            SELECT d.id, d.file_name, d.file_type, LENGTH(d.file_data) as file_size,
-                   p.project_name, p.username
+            SELECT d.id, d.file_name, d.file_type, d.file_size, d.file_format, d.encoding,
+                   d.row_count, d.ingest_status, p.project_name, p.username
             FROM datasets d
             JOIN projects p ON d.project_id = p.id
             WHERE d.id = %s AND p.username = %s
@@ -3849,6 +6689,10 @@ async def debug_dataset(dataset_id: int, token: str):
                 "file_name": result["file_name"],
                 "file_type": result["file_type"],
                 "file_size": result["file_size"],
+                "file_format": result["file_format"],
+                "encoding": result["encoding"],
+                "row_count": result["row_count"],
+                "ingest_status": result["ingest_status"],
                 "project_name": result["project_name"],
                 "username": result["username"]
             }
@@ -3862,10 +6706,25 @@ async def debug_dataset(dataset_id: int, token: str):
                 
 # Annotation endpoints
 @app.get("/datasets/{dataset_id}/sentences")
-async def get_sentences(dataset_id: int, token: str):
+def get_sentences(
+    dataset_id: int, 
+    token: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1),
+    page_cursor: Optional[str] = Query(None, alias="cursor"),
+    sample: Optional[str] = None,
+    label: Optional[str] = None,
+    retry_ingest: bool = False
+):
+    """Page through a dataset's sentences in file order, a stable random order (sample=random) or stratified by label.
+    A dataset whose ingest failed is only parsed again when retry_ingest is set"""
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
+    if sample not in (None, "", "random", "stratified"):
+        return {"success": False, "error": "sample must be 'random' or 'stratified'"}
+    mode = sample or "sequential"
+    limit = min(limit, PAGE_SIZE_MAX)
     
     db = get_db()
     if not db:
@@ -3874,7 +6733,7 @@ async def get_sentences(dataset_id: int, token: str):
     cursor = db.cursor(dictionary=True)
     try:
         cursor.execute("""
-            SELECT d.file_data, d.file_type 
+            SELECT d.id, d.file_name, d.file_data, d.storage_path, d.ingest_status, d.row_count 
             FROM datasets d 
             JOIN projects p ON d.project_id = p.id 
             WHERE d.id = %s AND p.username = %s
@@ -3884,25 +6743,97 @@ async def get_sentences(dataset_id: int, token: str):
         if not dataset:
             return {"success": False, "error": "Dataset not found"}
         
-        file_data = dataset['file_data']
-        file_type = dataset['file_type']
-        
-        if file_type == 'csv':
-            df = pd.read_csv(io.BytesIO(file_data))
+        if dataset['ingest_status'] != 'ready':
+            dataset['row_count'] = ensure_dataset_rows(db, dataset, retry=retry_ingest)
+        
+        position = decode_sentence_cursor(page_cursor, mode) if page_cursor else None
+        conditions = ["dataset_id = %s"]
+        params: List[Any] = [dataset_id]
+        if label is not None:
+            conditions.append("label <=> %s")
+            params.append(label or None)
+            cursor.execute(f"SELECT COUNT(*) as total FROM dataset_rows WHERE {' AND '.join(conditions)}", params)
+            total = cursor.fetchone()['total']
         else:
-            df = pd.read_json(io.BytesIO(file_data))
+            total = dataset['row_count'] or 0
         
-        sentences = df.iloc[:, 0].dropna().tolist()
-        return {"success": True, "sentences": sentences[:50]}
+        if mode == "stratified":
+            start = position[0] if position else offset
+            rows = fetch_stratified_rows(cursor, conditions, params, start, limit, total)
+            next_position = (start + limit,) if start + limit < total else None
+        else:
+            cursor.execute(*dataset_page_query(conditions, params, mode, position, offset, limit, dense=label is None))
+            rows = cursor.fetchall()
+            next_position = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_position = (last['row_index'],) if mode == "sequential" else (last['sample_key'], last['row_index'])
+        
+        for row in rows:
+            del row['sample_key']
+        return {
+            "success": True,
+            "sentences": [row['text'] for row in rows],
+            "rows": rows,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "sample": mode,
+            "next_cursor": encode_sentence_cursor(mode, next_position) if next_position else None,
+            "has_more": next_position is not None
+        }
         
     except Exception as e:
         return {"success": False, "error": str(e)}
     finally:
         cursor.close()
-        db.close()
+        db.close()
+
+# Annotation upsert - rows are keyed on (project_id, workspace, text_hash) and written in chunks in one transaction
+ANNOTATION_UPSERT_CHUNK = int(os.environ.get("ANNOTATION_UPSERT_CHUNK", "500"))
+
+def upsert_annotations(db, project_id: int, workspace: str, rows: List[Tuple[str, str, str, float, str]]) -> Tuple[int, int]:
+    """Insert or update (text, intent, entities_json, intent_confidence, entity_confidences_json) rows; returns (saved, updated)"""
+    saved_count = 0
+    updated_count = 0
+    seen = set()
+    cursor = db.cursor()
+    try:
+        db.start_transaction()
+        for start in range(0, len(rows), ANNOTATION_UPSERT_CHUNK):
+            chunk = rows[start:start + ANNOTATION_UPSERT_CHUNK]
+            # Matched ignoring case, like the unique text_hash key
+            texts = list({row[0].lower() for row in chunk} - seen)
+            if texts:
+                # Texts that already exist are counted as updates, one indexed lookup per chunk
+                cursor.execute(annotation_text_lookup_sql(len(texts)), (project_id, workspace, *texts))
+                seen.update(row[0].lower() for row in cursor.fetchall())
+            
+            for row in chunk:
+                if row[0].lower() in seen:
+                    updated_count += 1
+                else:
+                    saved_count += 1
+                    seen.add(row[0].lower())
+            
+            cursor.executemany("""
+                INSERT INTO annotations (project_id, text, intent, entities, intent_confidence, entity_confidences, workspace)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE intent = VALUES(intent), entities = VALUES(entities),
+                    intent_confidence = VALUES(intent_confidence), entity_confidences = VALUES(entity_confidences)
+            """, [(project_id, text, intent, entities, intent_confidence, entity_confidences, workspace)
+                  for text, intent, entities, intent_confidence, entity_confidences in chunk])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+    return saved_count, updated_count
 
 @app.post("/annotations")
-async def save_annotation(project_id: int = Form(...), text: str = Form(...), intent: str = Form(...), 
+def save_annotation(project_id: int = Form(...), text: str = Form(...), intent: str = Form(...), 
                    entities: str = Form(...), workspace: str = Form("workspace1"), token: str = Form(...)):
     username = verify_token(token)
     if not username:
@@ -3912,7 +6843,6 @@ async def save_annotation(project_id: int = Form(...), text: str = Form(...), in
     if not db:
         return {"success": False, "error": "Database connection failed"}
     
-    cursor = db.cursor()
     try:
         # For manual annotations, set default confidence of 1.0 (human-verified)
         intent_confidence = 1.0
@@ -3927,22 +6857,19 @@ async def save_annotation(project_id: int = Form(...), text: str = Form(...), in
                 'confidence': 1.0  # Human-verified entities get max confidence
             })
         
-        cursor.execute("""
-            INSERT INTO annotations (project_id, text, intent, entities, intent_confidence, entity_confidences, workspace) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (project_id, text, intent, entities, intent_confidence, json.dumps(entity_confidences), workspace))
+        upsert_annotations(db, project_id, workspace, [(text, intent, entities, intent_confidence, json.dumps(entity_confidences))])
         return {"success": True, "message": "Annotation saved with confidence scores"}
     except Exception as e:
         return {"success": False, "error": str(e)}
     finally:
-        cursor.close()
         db.close()
         # Enhanced Auto-Annotation Endpoint with Confidence Storage
 @app.post("/projects/{project_id}/simple-auto-annotate")
-async def simple_auto_annotate(
+def simple_auto_annotate(
     project_id: int,
     text: str = Form(...),
-    token: str = Form(...)
+    token: str = Form(...),
+    workspace: Optional[str] = Form(None)
 ):
     """Enhanced auto-annotation with confidence scores for intents and entities"""
     username = verify_token(token)
@@ -3950,9 +6877,9 @@ async def simple_auto_annotate(
         return {"success": False, "error": "Invalid token"}
     
     try:
-        # Get enhanced prediction with confidence
-        intent_result = simple_model.predict_intent(text)
-        entities = simple_model.extract_entities(text)
+        # Get enhanced prediction with confidence, using the workspace gazetteer
+        model = model_manager.get_model("spacy", workspace=workspace)
+        intent_result, entities, _ = inference_executor.run(analyze_text, model, text, False)
         
         # Extract entity confidences
         entity_confidences = []
@@ -3995,7 +6922,7 @@ async def simple_auto_annotate(
 # Enhanced Save single annotation from model suggestion
 # Enhanced Save single annotation with confidence scores
 @app.post("/projects/{project_id}/save-single-annotation")
-async def save_single_annotation(
+def save_single_annotation(
     project_id: int,
     text: str = Form(...),
     intent: str = Form(...),
@@ -4014,31 +6941,10 @@ async def save_single_annotation(
     if not db:
         return {"success": False, "error": "Database connection failed"}
     
-    cursor = db.cursor()
     try:
-        # Check if this text already exists for this project
-        cursor.execute("""
-            SELECT id FROM annotations 
-            WHERE project_id = %s AND text = %s AND workspace = %s
-        """, (project_id, text, workspace))
-        
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Update existing annotation with confidence scores
-            cursor.execute("""
-                UPDATE annotations 
-                SET intent = %s, entities = %s, intent_confidence = %s, entity_confidences = %s
-                WHERE id = %s
-            """, (intent, entities, intent_confidence, entity_confidences, existing[0]))
-            action = "updated"
-        else:
-            # Insert new annotation with confidence scores
-            cursor.execute("""
-                INSERT INTO annotations (project_id, text, intent, entities, intent_confidence, entity_confidences, workspace)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (project_id, text, intent, entities, intent_confidence, entity_confidences, workspace))
-            action = "saved"
+        # Insert, or update the existing annotation for this text
+        saved_count, _ = upsert_annotations(db, project_id, workspace, [(text, intent, entities, intent_confidence, entity_confidences)])
+        action = "saved" if saved_count else "updated"
         
         return {
             "success": True,
@@ -4049,12 +6955,11 @@ async def save_single_annotation(
     except Exception as e:
         return {"success": False, "error": str(e)}
     finally:
-        cursor.close()
         db.close()
 
 # Enhanced Save multiple annotations with confidence scores
 @app.post("/projects/{project_id}/save-bulk-annotations")
-async def save_bulk_annotations(
+def save_bulk_annotations(
     project_id: int,
     annotations: str = Form(...),
     workspace: str = Form("workspace1"),
@@ -4069,45 +6974,15 @@ async def save_bulk_annotations(
     if not db:
         return {"success": False, "error": "Database connection failed"}
     
-    cursor = db.cursor()
     try:
         annotations_list = json.loads(annotations)
-        saved_count = 0
-        updated_count = 0
-        
-        for ann in annotations_list:
-            if ann.get('text') and ann.get('intent'):
-                entities = ann.get('entities', [])
-                entities_json = json.dumps(entities)
-                
-                # Extract confidence scores
-                intent_confidence = ann.get('intent_confidence', 0.5)
-                entity_confidences = ann.get('entity_confidences', [])
-                entity_confidences_json = json.dumps(entity_confidences)
-                
-                # Check if this text already exists
-                cursor.execute("""
-                    SELECT id FROM annotations 
-                    WHERE project_id = %s AND text = %s AND workspace = %s
-                """, (project_id, ann['text'], workspace))
-                
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing annotation with confidence scores
-                    cursor.execute("""
-                        UPDATE annotations 
-                        SET intent = %s, entities = %s, intent_confidence = %s, entity_confidences = %s
-                        WHERE id = %s
-                    """, (ann['intent'], entities_json, intent_confidence, entity_confidences_json, existing[0]))
-                    updated_count += 1
-                else:
-                    # Insert new annotation with confidence scores
-                    cursor.execute("""
-                        INSERT INTO annotations (project_id, text, intent, entities, intent_confidence, entity_confidences, workspace)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """, (project_id, ann['text'], ann['intent'], entities_json, intent_confidence, entity_confidences_json, workspace))
-                    saved_count += 1
+        rows = [
+            (ann['text'], ann['intent'], json.dumps(ann.get('entities', [])),
+             ann.get('intent_confidence', 0.5), json.dumps(ann.get('entity_confidences', [])))
+            for ann in annotations_list
+            if ann.get('text') and ann.get('intent')
+        ]
+        saved_count, updated_count = upsert_annotations(db, project_id, workspace, rows)
         
         return {
             "success": True,
@@ -4120,13 +6995,23 @@ async def save_bulk_annotations(
     except Exception as e:
         return {"success": False, "error": str(e)}
     finally:
-        cursor.close()
         db.close()
 # Get all annotations for a project
 # Enhanced Get all annotations for a project with confidence scores
 @app.get("/projects/{project_id}/all-annotations")
-async def get_all_annotations(project_id: int, token: str, workspace: str = "workspace1"):
-    """Get all annotations for a project with confidence scores"""
+def get_all_annotations(
+    project_id: int,
+    token: str,
+    workspace: str = "workspace1",
+    limit: int = Query(100),
+    page_cursor: Optional[str] = Query(None, alias="cursor"),
+    intent: Optional[str] = Query(None),
+    min_confidence: Optional[float] = Query(None),
+    max_confidence: Optional[float] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None)
+):
+    """Get a project's annotations with confidence scores, one keyset page at a time"""
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -4147,16 +7032,29 @@ async def get_all_annotations(project_id: int, token: str, workspace: str = "wor
         if not project:
             return {"success": False, "error": "Project not found or unauthorized"}
         
-        # Get all annotations for this project with confidence scores
-        cursor.execute("""
-            SELECT id, text, intent, entities, intent_confidence, entity_confidences, created_at 
-            FROM annotations 
-            WHERE project_id = %s AND workspace = %s
-            ORDER BY created_at DESC
-        """, (project_id, workspace))
-        annotations = cursor.fetchall()
-        
-        print(f"DEBUG: Found {len(annotations)} annotations for project {project_id} in workspace {workspace}")
+        # Get this page of annotations with confidence scores
+        conditions = ["project_id = %s", "workspace = %s"]
+        params = [project_id, workspace]
+        add_listing_filters(conditions, params, "created_at", date_from, date_to,
+                            intent_column="intent", intent=intent,
+                            confidence_column="intent_confidence",
+                            min_confidence=min_confidence, max_confidence=max_confidence)
+        filtered = len(conditions) > 2
+        
+        annotations, next_cursor = fetch_keyset_page(cursor, ANNOTATION_LISTING_SQL, conditions, params, page_cursor, limit)
+        
+        # Unfiltered totals are exact from the rollup; filtered ones are the optimizer's estimate
+        total_count = None
+        total_count_estimated = False
+        if not filtered and annotation_stats_ready:
+            cursor.execute("""
+                SELECT COALESCE(SUM(annotation_count), 0) as total_count FROM annotation_stats 
+                WHERE project_id = %s AND workspace = %s
+            """, (project_id, workspace))
+            total_count = int(cursor.fetchone()['total_count'])
+        elif not page_cursor:
+            total_count = estimate_row_count(cursor, "annotations", conditions, params)
+            total_count_estimated = True
         
         # Parse JSON fields for each annotation
         for ann in annotations:
@@ -4189,7 +7087,11 @@ async def get_all_annotations(project_id: int, token: str, workspace: str = "wor
         return {
             "success": True,
             "annotations": annotations,
-            "total_count": len(annotations)
+            "count": len(annotations),
+            "total_count": total_count,
+            "total_count_estimated": total_count_estimated,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
         
     except Exception as e:
@@ -4201,7 +7103,7 @@ async def get_all_annotations(project_id: int, token: str, workspace: str = "wor
         
 # Export annotations with multiple formats
 @app.get("/projects/{project_id}/export")
-async def export_annotations_direct(project_id: int, token: str, workspace: str = "workspace1", format: str = "json"):
+def export_annotations_direct(project_id: int, token: str, workspace: str = "workspace1", format: str = "json"):
     """Direct export endpoint - simple and reliable"""
     username = verify_token(token)
     if not username:
@@ -4293,7 +7195,7 @@ async def export_annotations_direct(project_id: int, token: str, workspace: str
 
 # Delete annotation
 @app.delete("/annotations/{annotation_id}")
-async def delete_annotation(annotation_id: int, token: str = Form(...)):
+def delete_annotation(annotation_id: int, token: str = Form(...)):
     """Delete a specific annotation"""
     username = verify_token(token)
     if not username:
@@ -4330,7 +7232,7 @@ async def delete_annotation(annotation_id: int, token: str = Form(...)):
         db.close()
 
 @app.get("/projects/{project_id}/annotation-count")
-async def get_annotation_count(project_id: int, token: str, workspace: str = "workspace1"):
+def get_annotation_count(project_id: int, token: str, workspace: str = "workspace1"):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -4361,7 +7263,7 @@ async def get_annotation_count(project_id: int, token: str, workspace: str = "wo
 
 # Updated compare-models endpoint with better debugging
 @app.post("/projects/{project_id}/compare-models")
-async def compare_models(project_id: int, workspace: str = Form("workspace1"), token: str = Form(...)):
+def compare_models(project_id: int, workspace: str = Form("workspace1"), token: str = Form(...)):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -4402,9 +7304,9 @@ async def compare_models(project_id: int, workspace: str = Form("workspace1"), t
         bert_model.training_data = [{'text': ann['text'], 'intent': ann['intent']} for ann in train_data]
         
         # Get predictions
-        spacy_preds = [simple_model.predict_intent(text) for text in test_texts]
-        rasa_preds = [rasa_model.predict_intent(text) for text in test_texts]
-        bert_preds = [bert_model.predict_intent(text) for text in test_texts]
+        spacy_preds = inference_executor.run(simple_model.predict_batch, test_texts)
+        rasa_preds = inference_executor.run(rasa_model.predict_batch, test_texts)
+        bert_preds = inference_executor.run(bert_model.predict_batch, test_texts)
         
         # Extract just the intent strings for metrics calculation
         spacy_intents = [pred["intent"] for pred in spacy_preds]
@@ -4492,16 +7394,16 @@ async def compare_models(project_id: int, workspace: str = Form("workspace1"), t
         
         # Generate plots
         try:
-            spacy_cm_plot = plot_confusion_matrix(spacy_cm, all_intents, 'spaCy')
-            rasa_cm_plot = plot_confusion_matrix(rasa_cm, all_intents, 'RASA')
-            bert_cm_plot = plot_confusion_matrix(bert_cm, all_intents, 'BERT')
+            spacy_cm_plot = plot_executor.run(plot_confusion_matrix, spacy_cm, all_intents, 'spaCy')
+            rasa_cm_plot = plot_executor.run(plot_confusion_matrix, rasa_cm, all_intents, 'RASA')
+            bert_cm_plot = plot_executor.run(plot_confusion_matrix, bert_cm, all_intents, 'BERT')
             
             metrics_dict = {
                 'spaCy': spacy_metrics,
                 'RASA': rasa_metrics,
                 'BERT': bert_metrics
             }
-            comparison_plot = plot_metrics_comparison(metrics_dict)
+            comparison_plot = plot_executor.run(plot_metrics_comparison, metrics_dict)
             
         except Exception as plot_error:
             print(f"Plot generation error: {plot_error}")
@@ -4543,7 +7445,7 @@ async def compare_models(project_id: int, workspace: str = Form("workspace1"), t
         db.close()
 
 @app.post("/projects/{project_id}/simple-compare")
-async def simple_compare_models(project_id: int, workspace: str = Form("workspace1"), token: str = Form(...)):
+def simple_compare_models(project_id: int, workspace: str = Form("workspace1"), token: str = Form(...)):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -4576,9 +7478,9 @@ async def simple_compare_models(project_id: int, workspace: str = Form("workspac
         bert_model.training_data = [{'text': ann['text'], 'intent': ann['intent']} for ann in train_data]
         
         # Get predictions with confidence
-        spacy_preds = [simple_model.predict_intent(text) for text in test_texts]
-        rasa_preds = [rasa_model.predict_intent(text) for text in test_texts]
-        bert_preds = [bert_model.predict_intent(text) for text in test_texts]
+        spacy_preds = inference_executor.run(simple_model.predict_batch, test_texts)
+        rasa_preds = inference_executor.run(rasa_model.predict_batch, test_texts)
+        bert_preds = inference_executor.run(bert_model.predict_batch, test_texts)
         
         # Extract just the intent strings for accuracy calculation
         spacy_intents = [pred["intent"] for pred in spacy_preds]
@@ -4628,7 +7530,7 @@ async def simple_compare_models(project_id: int, workspace: str = Form("workspac
         db.close()
         
 @app.get("/projects/{project_id}/intents")
-async def get_intents(project_id: int, token: str, workspace: str = "workspace1"):
+def get_intents(project_id: int, token: str, workspace: str = "workspace1"):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -4639,7 +7541,7 @@ async def get_intents(project_id: int, token: str, workspace: str = "workspace1"
     
     cursor = db.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT DISTINCT intent FROM annotations WHERE project_id = %s AND workspace = %s", (project_id, workspace))
+        cursor.execute(PROJECT_INTENTS_SQL, (project_id, workspace))
         intents = [row['intent'] for row in cursor.fetchall()]
         return {"success": True, "intents": intents}
     except Exception as e:
@@ -4650,20 +7552,15 @@ async def get_intents(project_id: int, token: str, workspace: str = "workspace1"
 
 # Tokenization endpoint
 @app.post("/tokenize")
-async def tokenize_text(text: str = Form(...)):
-    if not SPACY_AVAILABLE:
-        tokens = text.split()
-        return {"success": True, "tokens": tokens}
-    
+def tokenize_text(text: str = Form(...)):
     try:
-        doc = nlp(text)
-        tokens = [token.text for token in doc]
+        tokens = inference_executor.run(tokenize, text)
         return {"success": True, "tokens": tokens}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 @app.get("/projects/{project_id}/models")
-async def get_models(project_id: int, token: str, workspace: str = "workspace1"):
+def get_models(project_id: int, token: str, workspace: str = "workspace1"):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
@@ -4674,12 +7571,7 @@ async def get_models(project_id: int, token: str, workspace: str = "workspace1")
     
     cursor = db.cursor(dictionary=True)
     try:
-        cursor.execute("""
-            SELECT id, model_name, model_type, training_data_count, metrics, created_at 
-            FROM trained_models
-            WHERE project_id = %s AND workspace = %s
-            ORDER BY created_at DESC
-        """, (project_id, workspace))
+        cursor.execute(PROJECT_MODELS_SQL, (project_id, workspace))
         models = cursor.fetchall()
         
         # Parse metrics JSON
@@ -4699,48 +7591,19 @@ async def get_models(project_id: int, token: str, workspace: str = "workspace1")
 
 # Enhanced Predict endpoint with confidence
 @app.post("/predict")
-async def predict_intent(project_id: int = Form(...), text: str = Form(...), model_type: str = Form("spacy"), workspace: str = Form("workspace1"), token: str = Form(...)):
+def predict_intent(project_id: int = Form(...), text: str = Form(...), model_type: str = Form("spacy"), workspace: str = Form("workspace1"), token: str = Form(...)):
     username = verify_token(token)
     if not username:
         return {"success": False, "error": "Invalid token"}
     
-    db = get_db()
-    if not db:
-        return {"success": False, "error": "Database connection failed"}
-    
-    cursor = db.cursor(dictionary=True)
     try:
         # Get the latest model of the specified type
-        cursor.execute("""
-            SELECT model_data FROM trained_models 
-            WHERE project_id = %s AND model_type = %s AND workspace = %s
-            ORDER BY created_at DESC LIMIT 1
-        """, (project_id, model_type, workspace))
-        model_record = cursor.fetchone()
-        
-        if not model_record:
-            return {"success": False, "error": f"No trained {model_type} model found in {workspace}"}
-        
-        model_data = pickle.loads(model_record['model_data'])
+        model, model_data, error = model_registry.get(project_id, model_type, workspace)
+        if error:
+            return {"success": False, "error": error}
         
-        # Get the model instance
-        training_data = model_data.get('training_data', [])
-        model = model_manager.get_model(model_type, training_data)
-        
-        if not model:
-            return {"success": False, "error": f"Invalid model type: {model_type}"}
-        
-        # Get prediction with confidence
-        intent_result = model.predict_intent(text)
-        entities = model.extract_entities(text)
-        
-        # Tokenize text
-        tokens = []
-        if SPACY_AVAILABLE:
-            doc = nlp(text)
-            tokens = [token.text for token in doc]
-        else:
-            tokens = text.split()
+        # Get prediction with confidence and tokens
+        intent_result, entities, tokens = inference_executor.run(analyze_text, model, text)
         
         return {
             "success": True,
@@ -4757,9 +7620,105 @@ async def predict_intent(project_id: int = Form(...), text: str = Form(...), mod
     except Exception as e:
         print(f"Prediction error: {str(e)}")
         return {"success": False, "error": str(e)}
-    finally:
-        cursor.close()
-        db.close()
+
+# Batch prediction - many texts, one token check and one model lookup
+PREDICT_BATCH_LIMIT = int(os.environ.get("PREDICT_BATCH_LIMIT", "10000"))
+
+def parse_batch_texts(body: bytes) -> List[str]:
+    """Read texts from a JSON list (or {"texts": [...]}) or from NDJSON, one string or {"text": ...} per line"""
+    def as_text(item):
+        if isinstance(item, dict):
+            item = item.get('text')
+        if not isinstance(item, str):
+            raise ValueError("Each item must be a string or an object with a 'text' string")
+        return item
+
+    content = body.decode('utf-8-sig')
+    try:
+        payload = json.loads(content)
+    except json.JSONDecodeError:
+        payload = None
+    else:
+        if isinstance(payload, dict) and 'texts' in payload:
+            payload = payload['texts']
+        if isinstance(payload, list):
+            return [as_text(item) for item in payload]
+        if not isinstance(payload, (str, dict)):
+            raise ValueError("Expected a JSON list of texts")
+    # NDJSON: one JSON value per line (a single-line body is just one text)
+    return [as_text(json.loads(line)) for line in content.splitlines() if line.strip()]
+
+def score_batch(texts, project_id, model_type, workspace, include_entities, include_tokens):
+    """Run batch scoring on a worker thread so model lookup and inference stay off the event loop"""
+    try:
+        model, model_data, error = model_registry.get(project_id, model_type, workspace)
+        if error:
+            return {"success": False, "error": error}
+        
+        intent_results = model.predict_batch(texts)
+        entity_results = model.extract_entities_batch(texts) if include_entities else None
+        token_results = None
+        if include_tokens:
+            if SPACY_AVAILABLE:
+                token_results = [[token.text for token in doc] for doc in nlp.pipe(texts)]
+            else:
+                token_results = [text.split() for text in texts]
+        
+        results = []
+        for i, text in enumerate(texts):
+            result = {
+                "text": text,
+                "predicted_intent": intent_results[i]["intent"],
+                "intent_confidence": round(intent_results[i]["confidence"], 3)
+            }
+            if entity_results is not None:
+                result["entities"] = entity_results[i]
+            if token_results is not None:
+                result["tokens"] = token_results[i]
+            results.append(result)
+        
+        return {
+            "success": True,
+            "count": len(results),
+            "results": results,
+            "model_type": model_type,
+            "workspace": workspace,
+            "available_intents": model_data.get('intents', [])
+        }
+    except Exception as e:
+        print(f"Batch prediction error: {str(e)}")
+        return {"success": False, "error": str(e)}
+
+@app.post("/predict/batch")
+async def predict_batch(
+    request: Request,
+    project_id: int,
+    token: str,
+    model_type: str = "spacy",
+    workspace: str = "workspace1",
+    include_entities: bool = True,
+    include_tokens: bool = False
+):
+    """Score a JSON list or NDJSON body of texts; results come back in input order"""
+    username = verify_token(token)
+    if not username:
+        return {"success": False, "error": "Invalid token"}
+    
+    try:
+        texts = parse_batch_texts(await request.body())
+    except (ValueError, UnicodeDecodeError) as e:
+        return {"success": False, "error": f"Invalid batch body: {str(e)}"}
+    if not texts:
+        return {"success": False, "error": "No texts provided"}
+    if len(texts) > PREDICT_BATCH_LIMIT:
+        return {"success": False, "error": f"Batch too large: {len(texts)} texts (limit {PREDICT_BATCH_LIMIT})"}
+    
+    try:
+        return await run_in_threadpool(
+            inference_executor.run, score_batch, texts, project_id, model_type, workspace, include_entities, include_tokens
+        )
+    except (InferenceBusy, InferenceTimeout) as e:
+        return {"success": False, "error": str(e)}
 
 # Training endpoint - PROPER SPACY IMPLEMENTATION
 # @app.post("/projects/{project_id}/train")
@@ -4834,12 +7793,72 @@ async def predict_intent(project_id: int = Form(...), text: str = Form(...), mod
 #     finally:
 #         cursor.close()
 #         db.close()        
-@app.post("/projects/{project_id}/train")
-async def train_model(project_id: int, model_type: str = Form("spacy"), workspace: str = Form("workspace1"), token: str = Form(...)):
-    username = verify_token(token)
-    if not username:
-        return {"success": False, "error": "Invalid token"}
+def simulated_training_metrics(model_type: str, annotation_count: int) -> Dict[str, Any]:
+    """Metrics for the rule-based model types, scaled by annotation count"""
+    # DIFFERENTIATE METRICS BASED ON MODEL TYPE - FIXED VERSION
+    base_performance = {
+        "spacy": {
+            "base_accuracy": min(0.75 + (annotation_count * 0.008), 0.92),
+            "precision_factor": 0.92,
+            "recall_factor": 0.90,
+            "f1_factor": 0.91
+        },
+        "rasa": {
+            "base_accuracy": min(0.78 + (annotation_count * 0.009), 0.94),
+            "precision_factor": 0.94,
+            "recall_factor": 0.92,
+            "f1_factor": 0.93
+        },
+        "bert": {
+            "base_accuracy": min(0.82 + (annotation_count * 0.010), 0.96),
+            "precision_factor": 0.96,
+            "recall_factor": 0.94,
+            "f1_factor": 0.95
+        }
+    }
+    
+    # Get the performance factors for this model type
+    model_perf = base_performance.get(model_type, base_performance["spacy"])
+    
+    # Calculate realistic metrics for each model type
+    base_accuracy = model_perf["base_accuracy"]
+    precision = base_accuracy * model_perf["precision_factor"]
+    recall = base_accuracy * model_perf["recall_factor"]
+    f1_score = base_accuracy * model_perf["f1_factor"]
+    
+    # Ensure BERT has highest values, then RASA, then spaCy
+    if model_type == "bert":
+        base_accuracy = min(base_accuracy + 0.02, 0.98)
+        precision = min(precision + 0.02, 0.96)
+        recall = min(recall + 0.02, 0.95)
+        f1_score = min(f1_score + 0.02, 0.955)
+    elif model_type == "rasa":
+        base_accuracy = min(base_accuracy + 0.01, 0.95)
+        precision = min(precision + 0.01, 0.93)
+        recall = min(recall + 0.01, 0.92)
+        f1_score = min(f1_score + 0.01, 0.925)
+    # spaCy stays at base values
     
+    return {
+        'accuracy': round(base_accuracy, 3),
+        'precision': round(precision, 3),
+        'recall': round(recall, 3),
+        'f1_score': round(f1_score, 3),
+        'training_samples': annotation_count
+    }
+
+class TrainingCancelled(Exception):
+    """Raised from a training progress callback when the job was cancelled"""
+
+def run_training(project_id: int, model_type: str, workspace: str, classifier: str = "logreg", progress=None) -> Dict[str, Any]:
+    """Train a model on the project's annotations and save it to trained_models.
+
+    progress(stage, fraction) is called between stages and may raise TrainingCancelled.
+    """
+    def report(stage, fraction):
+        if progress:
+            progress(stage, fraction)
+
     db = get_db()
     if not db:
         return {"success": False, "error": "Database connection failed"}
@@ -4847,7 +7866,8 @@ async def train_model(project_id: int, model_type: str = Form("spacy"), workspac
     cursor = db.cursor(dictionary=True)
     try:
         # Get annotations for this project and workspace
-        cursor.execute("SELECT text, intent, entities FROM annotations WHERE project_id = %s AND workspace = %s", (project_id, workspace))
+        report("loading_annotations", 0.1)
+        cursor.execute(TRAINING_ANNOTATIONS_SQL, (project_id, workspace))
         annotations = cursor.fetchall()
         
         print(f"DEBUG: Found {len(annotations)} annotations for training")
@@ -4858,57 +7878,20 @@ async def train_model(project_id: int, model_type: str = Form("spacy"), workspac
         # Create model name FIRST
         model_name = f"{model_type}_model_{workspace}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
-        # DIFFERENTIATE METRICS BASED ON MODEL TYPE - FIXED VERSION
-        base_performance = {
-            "spacy": {
-                "base_accuracy": min(0.75 + (len(annotations) * 0.008), 0.92),
-                "precision_factor": 0.92,
-                "recall_factor": 0.90,
-                "f1_factor": 0.91
-            },
-            "rasa": {
-                "base_accuracy": min(0.78 + (len(annotations) * 0.009), 0.94),
-                "precision_factor": 0.94,
-                "recall_factor": 0.92,
-                "f1_factor": 0.93
-            },
-            "bert": {
-                "base_accuracy": min(0.82 + (len(annotations) * 0.010), 0.96),
-                "precision_factor": 0.96,
-                "recall_factor": 0.94,
-                "f1_factor": 0.95
-            }
-        }
-        
-        # Get the performance factors for this model type
-        model_perf = base_performance.get(model_type, base_performance["spacy"])
-        
-        # Calculate realistic metrics for each model type
-        base_accuracy = model_perf["base_accuracy"]
-        precision = base_accuracy * model_perf["precision_factor"]
-        recall = base_accuracy * model_perf["recall_factor"]
-        f1_score = base_accuracy * model_perf["f1_factor"]
-        
-        # Ensure BERT has highest values, then RASA, then spaCy
-        if model_type == "bert":
-            base_accuracy = min(base_accuracy + 0.02, 0.98)
-            precision = min(precision + 0.02, 0.96)
-            recall = min(recall + 0.02, 0.95)
-            f1_score = min(f1_score + 0.02, 0.955)
-        elif model_type == "rasa":
-            base_accuracy = min(base_accuracy + 0.01, 0.95)
-            precision = min(precision + 0.01, 0.93)
-            recall = min(recall + 0.01, 0.92)
-            f1_score = min(f1_score + 0.01, 0.925)
-        # spaCy stays at base values
-        
-        metrics = {
-            'accuracy': round(base_accuracy, 3),
-            'precision': round(precision, 3),
-            'recall': round(recall, 3),
-            'f1_score': round(f1_score, 3),
-            'training_samples': len(annotations)
-        }
+        artifact = None
+        if model_type == "tfidf":
+            # Real training: TF-IDF features + linear classifier, scored on a held-out split
+            labelled = [ann for ann in annotations if ann['text'] and ann['intent']]
+            try:
+                tfidf_model, metrics = TfidfLinearModel.train_and_evaluate(
+                    [ann['text'] for ann in labelled], [ann['intent'] for ann in labelled], classifier, report
+                )
+            except ValueError as e:
+                return {"success": False, "error": str(e)}
+            artifact = tfidf_model.to_bytes()
+        else:
+            report("computing_metrics", 0.5)
+            metrics = simulated_training_metrics(model_type, len(annotations))
         
         # Prepare model data
         model_data = {
@@ -4917,21 +7900,29 @@ async def train_model(project_id: int, model_type: str = Form("spacy"), workspac
             'training_samples': len(annotations),
             'model_type': model_type,
             'workspace': workspace,
-            'metrics': metrics
+            'metrics': metrics,
+            'fingerprint': training_fingerprint([{'text': ann['text'], 'intent': ann['intent']} for ann in annotations])
         }
+        if artifact is not None:
+            model_data['artifact'] = artifact
+            model_data['classifier'] = classifier
         
         # Serialize model data
         model_bytes = pickle.dumps(model_data)
         
         # Save to database
+        report("saving", 0.9)
         cursor.execute("""
             INSERT INTO trained_models (project_id, model_name, model_type, model_data, training_data_count, metrics, workspace)
             VALUES (%s, %s, %s, %s, %s, %s, %s)
         """, (project_id, model_name, model_type, model_bytes, len(annotations), json.dumps(metrics), workspace))
+        model_id = cursor.lastrowid
+        model_registry.invalidate(project_id, workspace, model_type)
         
         return {
             "success": True, 
             "message": f"{model_type.upper()} model trained successfully in {workspace}!",
+            "model_id": model_id,
             "model_name": model_name,
             "model_type": model_type,
             "workspace": workspace,
@@ -4939,6 +7930,8 @@ async def train_model(project_id: int, model_type: str = Form("spacy"), workspac
             "metrics": metrics
         }
         
+    except TrainingCancelled:
+        raise
     except Exception as e:
         print(f"Training error: {str(e)}")
         import traceback
@@ -4947,17 +7940,267 @@ async def train_model(project_id: int, model_type: str = Form("spacy"), workspac
     finally:
         cursor.close()
         db.close()
+
+@app.post("/projects/{project_id}/train")
+def train_model(project_id: int, model_type: str = Form("spacy"), workspace: str = Form("workspace1"), token: str = Form(...), classifier: str = Form("logreg")):
+    username = verify_token(token)
+    if not username:
+        return {"success": False, "error": "Invalid token"}
+    
+    return run_training(project_id, model_type, workspace, classifier)
+
+# Background training jobs - run_training in a process pool, progress kept in training_jobs
+TRAINING_WORKERS = int(os.environ.get("TRAINING_WORKERS", "2"))
+_training_executor = None
+_training_futures = {}
+
+def get_training_executor() -> ProcessPoolExecutor:
+    global _training_executor
+    if _training_executor is None:
+        _training_executor = ProcessPoolExecutor(max_workers=TRAINING_WORKERS)
+    return _training_executor
+
+def finish_training_job(job_id: int, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> Optional[bool]:
+    """Record the outcome of a job unless it already reached a final state.
+    Returns False if it had (e.g. it was cancelled), None when the database is unreachable"""
+    db = get_db()
+    if not db:
+        return None
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            UPDATE training_jobs 
+            SET status = %s, stage = %s, progress = IF(%s = 'completed', 1.0, progress),
+                trained_model_id = %s, result = %s, error = %s, finished_at = NOW(), updated_at = NOW()
+            WHERE id = %s AND status NOT IN ('completed', 'failed', 'cancelled')
+        """, (status, status, status, (result or {}).get('model_id'),
+              json.dumps(result) if result is not None else None, error, job_id))
+        return cursor.rowcount > 0
+    finally:
+        cursor.close()
+        db.close()
+
+def run_training_job(job_id: int) -> Dict[str, Any]:
+    """Worker-process entry point: run one queued job, recording stage and progress as it goes"""
+    db = get_db()
+    if not db:
+        return {"success": False, "error": "Database connection failed"}
+    
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            UPDATE training_jobs SET status = 'running', stage = 'starting', started_at = NOW(), updated_at = NOW()
+            WHERE id = %s AND status = 'queued'
+        """, (job_id,))
+        if cursor.rowcount == 0:
+            return {"success": False, "error": "Training job is no longer queued"}
+        cursor.execute("SELECT project_id, model_type, classifier, workspace FROM training_jobs WHERE id = %s", (job_id,))
+        job = cursor.fetchone()
+        
+        def progress(stage, fraction):
+            # A cancel request flips the status; stop at the next stage boundary
+            cursor.execute("SELECT status FROM training_jobs WHERE id = %s", (job_id,))
+            row = cursor.fetchone()
+            if not row or row['status'] != 'running':
+                raise TrainingCancelled()
+            cursor.execute("UPDATE training_jobs SET stage = %s, progress = %s, updated_at = NOW() WHERE id = %s",
+                           (stage, fraction, job_id))
+        
+        try:
+            result = run_training(job['project_id'], job['model_type'], job['workspace'], job['classifier'], progress)
+        except TrainingCancelled:
+            return {"success": False, "error": "Training job cancelled"}
+        
+        if result.get('success'):
+            if finish_training_job(job_id, 'completed', result=result) is False:
+                # Cancelled after the last stage check - the model was saved anyway, so take it back out
+                cursor.execute("DELETE FROM trained_models WHERE id = %s", (result['model_id'],))
+                return {"success": False, "error": "Training job cancelled"}
+        else:
+            finish_training_job(job_id, 'failed', result=result, error=result.get('error'))
+        return result
+    except Exception as e:
+        print(f"Training job error: {str(e)}")
+        finish_training_job(job_id, 'failed', error=str(e))
+        return {"success": False, "error": str(e)}
+    finally:
+        cursor.close()
+        db.close()
+
+def submit_training_job(job_id: int, project_id: int, workspace: str, model_type: str):
+    """Queue a job on the worker pool"""
+    future = get_training_executor().submit(run_training_job, job_id)
+    _training_futures[job_id] = future
+
+    def on_done(done_future):
+        global _training_executor
+        _training_futures.pop(job_id, None)
+        if done_future.cancelled():
+            return
+        error = done_future.exception()
+        if error is not None:
+            # A crashed worker leaves the pool unusable; the next submit starts a fresh one
+            if isinstance(error, BrokenProcessPool):
+                _training_executor = None
+            finish_training_job(job_id, 'failed', error=f"Training worker crashed: {error}")
+        # The model was saved by another process, so drop this process's cached copy
+        model_registry.invalidate(project_id, workspace, model_type)
+
+    future.add_done_callback(on_done)
+
+def serialize_training_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-ready job row with an ETA extrapolated from progress so far"""
+    eta_seconds = None
+    progress = job.get('progress') or 0.0
+    if job['status'] == 'running' and job.get('started_at') and progress > 0:
+        elapsed = (datetime.now() - job['started_at']).total_seconds()
+        eta_seconds = round(max(elapsed * (1 - progress) / progress, 0.0), 1)
+    result = job.get('result')
+    if isinstance(result, (str, bytes)):
+        result = json.loads(result)
+    return {
+        "id": job['id'],
+        "project_id": job['project_id'],
+        "model_type": job['model_type'],
+        "classifier": job['classifier'],
+        "workspace": job['workspace'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "progress": round(progress, 3),
+        "eta_seconds": eta_seconds,
+        "trained_model_id": job.get('trained_model_id'),
+        "result": result,
+        "error": job.get('error'),
+        "created_at": job['created_at'].isoformat() if job.get('created_at') else None,
+        "started_at": job['started_at'].isoformat() if job.get('started_at') else None,
+        "finished_at": job['finished_at'].isoformat() if job.get('finished_at') else None
+    }
+
+@app.post("/projects/{project_id}/train-jobs")
+def submit_train_job(project_id: int, model_type: str = Form("spacy"), workspace: str = Form("workspace1"), token: str = Form(...), classifier: str = Form("logreg"), db = Depends(db_dependency)):
+    """Queue a background training job"""
+    username = verify_token(token)
+    if not username:
+        return {"success": False, "error": "Invalid token"}
+    
+    if not db:
+        return {"success": False, "error": "Database connection failed"}
+    
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            INSERT INTO training_jobs (project_id, username, model_type, classifier, workspace)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (project_id, username, model_type, classifier, workspace))
+        job_id = cursor.lastrowid
+        submit_training_job(job_id, project_id, workspace, model_type)
+        
+        cursor.execute("SELECT * FROM training_jobs WHERE id = %s", (job_id,))
+        return {"success": True, "job": serialize_training_job(cursor.fetchone())}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        cursor.close()
+
+@app.get("/projects/{project_id}/train-jobs")
+def list_train_jobs(project_id: int, token: str, workspace: str = "workspace1", limit: int = 20, db = Depends(db_dependency)):
+    """Most recent training jobs the user started for a project"""
+    username = verify_token(token)
+    if not username:
+        return {"success": False, "error": "Invalid token"}
+    
+    if not db:
+        return {"success": False, "error": "Database connection failed"}
+    
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT * FROM training_jobs 
+            WHERE project_id = %s AND workspace = %s AND username = %s
+            ORDER BY created_at DESC, id DESC LIMIT %s
+        """, (project_id, workspace, username, max(1, min(limit, 100))))
+        return {"success": True, "jobs": [serialize_training_job(job) for job in cursor.fetchall()]}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        cursor.close()
+
+@app.get("/train-jobs/{job_id}")
+def get_train_job(job_id: int, token: str, db = Depends(db_dependency)):
+    """Poll one training job"""
+    username = verify_token(token)
+    if not username:
+        return {"success": False, "error": "Invalid token"}
+    
+    if not db:
+        return {"success": False, "error": "Database connection failed"}
+    
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM training_jobs WHERE id = %s AND username = %s", (job_id, username))
+        job = cursor.fetchone()
+        if not job:
+            return {"success": False, "error": "Training job not found"}
+        return {"success": True, "job": serialize_training_job(job)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        cursor.close()
+
+@app.post("/train-jobs/{job_id}/cancel")
+def cancel_train_job(job_id: int, token: str = Form(...), db = Depends(db_dependency)):
+    """Cancel a queued or running training job"""
+    username = verify_token(token)
+    if not username:
+        return {"success": False, "error": "Invalid token"}
+    
+    if not db:
+        return {"success": False, "error": "Database connection failed"}
+    
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            UPDATE training_jobs SET status = 'cancelled', stage = 'cancelled', finished_at = NOW(), updated_at = NOW()
+            WHERE id = %s AND username = %s AND status IN ('queued', 'running')
+        """, (job_id, username))
+        if cursor.rowcount == 0:
+            return {"success": False, "error": "Training job not found or already finished"}
+        
+        # Queued jobs never start; running ones stop at their next stage
+        future = _training_futures.get(job_id)
+        if future:
+            future.cancel()
+        return {"success": True, "message": "Training job cancelled"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        cursor.close()
+
+@app.on_event("shutdown")
+def shutdown_training_executor():
+    """Let running jobs finish and fail the ones that never started"""
+    if _training_executor is None:
+        return
+    for job_id, future in list(_training_futures.items()):
+        if not future.running():
+            finish_training_job(job_id, 'failed', error="Server shut down before the job started")
+    _training_executor.shutdown(wait=False, cancel_futures=True)
+
+@app.on_event("shutdown")
+def shutdown_inference_executors():
+    inference_executor.shutdown()
+    plot_executor.shutdown()
+
 # Debug endpoint to test models
 @app.post("/test-model")
-async def test_model(model_type: str = Form(...), text: str = Form(...)):
+def test_model(model_type: str = Form(...), text: str = Form(...)):
     """Test if a model can make predictions with confidence"""
     try:
         model = model_manager.get_model(model_type)
         if not model:
             return {"success": False, "error": f"Model type {model_type} not found"}
         
-        intent_result = model.predict_intent(text)
-        entities = model.extract_entities(text)
+        intent_result, entities, _ = inference_executor.run(analyze_text, model, text, False)
         
         return {
             "success": True,
@@ -4974,7 +8217,7 @@ async def test_model(model_type: str = Form(...), text: str = Form(...)):
 
 # Get low confidence annotations
 @app.get("/projects/{project_id}/low-confidence-annotations")
-async def get_low_confidence_annotations(
+def get_low_confidence_annotations(
     project_id: int, 
     token: str, 
     workspace: str = "workspace1"
@@ -4998,15 +8241,7 @@ async def get_low_confidence_annotations(
             return {"success": False, "error": "Project not found or unauthorized"}
         
         # FIXED: Changed from 50.0 to 0.5 since confidence is stored as decimal (0-1)
-        cursor.execute("""
-            SELECT id, text, intent, entities, intent_confidence, entity_confidences, created_at 
-            FROM annotations 
-            WHERE project_id = %s 
-            AND intent_confidence < 0.5
-            AND intent IS NOT NULL
-            AND intent != ''
-            ORDER BY intent_confidence ASC
-        """, (project_id,))
+        cursor.execute(LOW_CONFIDENCE_ANNOTATIONS_SQL, (project_id,))
         annotations = cursor.fetchall()
         
         # Parse JSON fields
@@ -5047,7 +8282,7 @@ import json  # Make sure this is at the top of your FastAPI file
 import random  # Make sure this import is at the top
 
 @app.post("/projects/{project_id}/correct-annotation")
-async def correct_annotation(
+def correct_annotation(
     project_id: int,
     annotation_id: int = Form(...),
     corrected_intent: str = Form(...),
@@ -5151,8 +8386,38 @@ async def correct_annotation(
     finally:
         cursor.close()
         db.close()
+def summarize_annotation_stats(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals, confidence bands and intent distribution from per-intent aggregate rows"""
+    total_count = sum(int(row['annotation_count']) for row in rows)
+    confidence_count = sum(int(row['confidence_count']) for row in rows)
+    confidence_sum = sum(float(row['confidence_sum']) for row in rows)
+    low_confidence_count = sum(int(row['low_count']) for row in rows)
+    medium_confidence_count = sum(int(row['medium_count']) for row in rows)
+    high_confidence_count = sum(int(row['high_count']) for row in rows)
+    avg_confidence = confidence_sum / confidence_count if confidence_count else 0.0
+    
+    intent_distribution = [
+        {
+            "intent": row['intent'],
+            "count": int(row['annotation_count']),
+            "avg_confidence": float(row['confidence_sum']) / int(row['confidence_count']) if row['confidence_count'] else None
+        }
+        for row in rows
+    ]
+    intent_distribution.sort(key=lambda item: item['count'], reverse=True)
+    
+    return {
+        "total_count": total_count,
+        "low_confidence_count": low_confidence_count,
+        "medium_confidence_count": medium_confidence_count,
+        "high_confidence_count": high_confidence_count,
+        "avg_confidence": round(avg_confidence, 3),
+        "low_confidence_percentage": round((low_confidence_count / total_count * 100) if total_count > 0 else 0, 1),
+        "intent_distribution": intent_distribution
+    }
+
 @app.get("/projects/{project_id}/annotation-statistics")
-async def get_annotation_statistics(project_id: int, token: str, workspace: str = "workspace1"):
+def get_annotation_statistics(project_id: int, token: str, workspace: str = "workspace1"):
     """Get statistics about annotations including confidence distribution"""
     username = verify_token(token)
     if not username:
@@ -5174,67 +8439,16 @@ async def get_annotation_statistics(project_id: int, token: str, workspace: str
         if not project:
             return {"success": False, "error": "Project not found or unauthorized"}
         
-        # Get total count
-        cursor.execute("""
-            SELECT COUNT(*) as total_count FROM annotations 
-            WHERE project_id = %s AND workspace = %s
-        """, (project_id, workspace))
-        total_result = cursor.fetchone()
-        total_count = total_result['total_count'] if total_result else 0
-        
-        # Get low confidence count (<50%)
-        cursor.execute("""
-            SELECT COUNT(*) as low_confidence_count FROM annotations 
-            WHERE project_id = %s AND workspace = %s AND intent_confidence < 0.5
-        """, (project_id, workspace))
-        low_conf_result = cursor.fetchone()
-        low_confidence_count = low_conf_result['low_confidence_count'] if low_conf_result else 0
-        
-        # Get medium confidence count (50-80%)
-        cursor.execute("""
-            SELECT COUNT(*) as medium_confidence_count FROM annotations 
-            WHERE project_id = %s AND workspace = %s AND intent_confidence >= 0.5 AND intent_confidence < 0.8
-        """, (project_id, workspace))
-        medium_conf_result = cursor.fetchone()
-        medium_confidence_count = medium_conf_result['medium_confidence_count'] if medium_conf_result else 0
-        
-        # Get high confidence count (>=80%)
-        cursor.execute("""
-            SELECT COUNT(*) as high_confidence_count FROM annotations 
-            WHERE project_id = %s AND workspace = %s AND intent_confidence >= 0.8
-        """, (project_id, workspace))
-        high_conf_result = cursor.fetchone()
-        high_confidence_count = high_conf_result['high_confidence_count'] if high_conf_result else 0
-        
-        # Get average confidence
-        cursor.execute("""
-            SELECT AVG(intent_confidence) as avg_confidence FROM annotations 
-            WHERE project_id = %s AND workspace = %s
-        """, (project_id, workspace))
-        avg_conf_result = cursor.fetchone()
-        avg_confidence = float(avg_conf_result['avg_confidence']) if avg_conf_result and avg_conf_result['avg_confidence'] else 0.0
-        
-        # Get intent distribution
-        cursor.execute("""
-            SELECT intent, COUNT(*) as count, AVG(intent_confidence) as avg_confidence
-            FROM annotations 
-            WHERE project_id = %s AND workspace = %s
-            GROUP BY intent
-            ORDER BY count DESC
-        """, (project_id, workspace))
-        intent_distribution = cursor.fetchall()
+        if annotation_stats_ready:
+            # Rollup rows are maintained by triggers, so this reads one row per intent
+            cursor.execute(ANNOTATION_STATS_ROLLUP_SQL, (project_id, workspace))
+        else:
+            # Single pass over the project's annotations
+            cursor.execute(ANNOTATION_STATS_SQL, (project_id, workspace))
         
         return {
             "success": True,
-            "statistics": {
-                "total_count": total_count,
-                "low_confidence_count": low_confidence_count,
-                "medium_confidence_count": medium_confidence_count,
-                "high_confidence_count": high_confidence_count,
-                "avg_confidence": round(avg_confidence, 3),
-                "low_confidence_percentage": round((low_confidence_count / total_count * 100) if total_count > 0 else 0, 1),
-                "intent_distribution": intent_distribution
-            }
+            "statistics": summarize_annotation_stats(cursor.fetchall())
         }
         
     except Exception as e:
@@ -5244,9 +8458,13 @@ async def get_annotation_statistics(project_id: int, token: str, workspace: str
         db.close()
             
 @app.get("/")
-async def health():
+def health():
     return {"status": "ok", "message": "API is running", "spacy_available": SPACY_AVAILABLE}
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["explain-check"]:
+        sys.exit(run_explain_check())
+    if sys.argv[1:2] == ["dedupe-annotations"]:
+        sys.exit(run_dedupe_annotations())
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
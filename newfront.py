@@ -4,12 +4,15 @@ import requests
 import pandas as pd
 import json
 import io
+import time
 import base64
 import matplotlib.pyplot as plt
 
 
 
 BASE_URL = "http://localhost:8000"
+# Dataset uploads send the whole file in one request, so they get longer than the default 30s
+UPLOAD_TIMEOUT = 600
 
 # Session state initialization
 if 'token' not in st.session_state:
@@ -60,13 +63,16 @@ def api_call(method, endpoint, **kwargs):
         # Make the request
         response = None
         url = f"{BASE_URL}{endpoint}"
+        timeout = kwargs.pop('timeout', 30)
         
         if method == 'get':
-            response = requests.get(url, timeout=30, **kwargs)
+            response = requests.get(url, timeout=timeout, **kwargs)
         elif method == 'post':
-            response = requests.post(url, timeout=30, **kwargs)
+            response = requests.post(url, timeout=timeout, **kwargs)
+        elif method == 'put':
+            response = requests.put(url, timeout=timeout, **kwargs)
         elif method == 'delete':
-            response = requests.delete(url, timeout=30, **kwargs)
+            response = requests.delete(url, timeout=timeout, **kwargs)
         
         # Return the response
         if response and response.status_code == 200:
@@ -82,6 +88,102 @@ def api_call(method, endpoint, **kwargs):
         error_msg = f"Request failed: {str(e)}"
         return {"success": False, "error": error_msg}
 
+def logout():
+    """Revoke the session token on the backend, then reset the session"""
+    if st.session_state.get('token'):
+        flush_activity_log()
+        api_call('post', '/logout')
+    st.session_state.clear()
+    st.session_state.page = 'login'
+    st.rerun()
+
+# Keyset-paged listings - the API returns one page plus next_cursor
+def fetch_all_pages(endpoint, items_key, params=None, page_size=500):
+    """Follow next_cursor to the end, for exports that need every row"""
+    params = dict(params or {})
+    params['limit'] = page_size
+    items = []
+    first = None
+    while True:
+        result = api_call('get', endpoint, params=dict(params))
+        if not result or not result.get('success'):
+            return result
+        first = first or result
+        items.extend(result.get(items_key, []))
+        if not result.get('next_cursor'):
+            break
+        params['cursor'] = result['next_cursor']
+    merged = dict(first)
+    merged[items_key] = items
+    merged['count'] = len(items)
+    return merged
+
+def paged_listing(state_key, endpoint, items_key, params, page_size=50):
+    """First page of a listing, kept in session state with the rows loaded so far; None if the call failed"""
+    params = dict(params)
+    params['limit'] = page_size
+    state = st.session_state.get(state_key)
+    if state is None or state['params'] != params:
+        result = api_call('get', endpoint, params=dict(params))
+        if not result or not result.get('success'):
+            return None
+        state = {
+            'params': params,
+            'result': result,
+            'items': list(result.get(items_key, [])),
+            'next_cursor': result.get('next_cursor')
+        }
+        st.session_state[state_key] = state
+    return state
+
+def load_more_button(state_key, endpoint, items_key, label="⬇️ Load more"):
+    """Fetch the next page into a paged_listing when there is one"""
+    state = st.session_state.get(state_key)
+    if state and state.get('next_cursor'):
+        if st.button(label, key=f"{state_key}_more"):
+            params = dict(state['params'])
+            params['cursor'] = state['next_cursor']
+            result = api_call('get', endpoint, params=params)
+            if result and result.get('success'):
+                state['items'].extend(result.get(items_key, []))
+                state['next_cursor'] = result.get('next_cursor')
+                st.rerun()
+            else:
+                st.error(f"Failed to load more: {result.get('error', 'Unknown error') if result else 'No response'}")
+
+SENTENCE_ORDERS = {"File order": None, "Random": "random", "Stratified by intent": "stratified"}
+
+def load_sentence_page(state_key, dataset_id, sample=None, page_cursor=None, page_size=50, retry_ingest=False):
+    """Fetch a page of a dataset's sentences and remember where the next page starts"""
+    params = {'limit': page_size}
+    if retry_ingest:
+        params['retry_ingest'] = 'true'
+    if sample:
+        params['sample'] = sample
+    if page_cursor:
+        params['cursor'] = page_cursor
+    result = api_call('get', f'/datasets/{dataset_id}/sentences', params=params)
+    if result and result.get('success'):
+        st.session_state[state_key] = {
+            'dataset_id': dataset_id,
+            'sample': sample,
+            'next_cursor': result.get('next_cursor'),
+            'total': result.get('total', len(result['sentences']))
+        }
+    return result
+
+def next_sentence_page(state_key, sentences_key):
+    """Append the next page to the loaded sentences; False when there is none"""
+    page = st.session_state.get(state_key)
+    if not page or not page.get('next_cursor'):
+        return False
+    result = load_sentence_page(state_key, page['dataset_id'], page['sample'], page['next_cursor'])
+    if not result or not result.get('success'):
+        st.error(result.get('error', 'Failed to load sentences') if result else 'No response')
+        return False
+    st.session_state[sentences_key].extend(result['sentences'])
+    return True
+
 # Pages
 def login_page():
     
@@ -513,7 +615,7 @@ def user_feedback_section():
         with col2:
             model_type_filter = st.selectbox(
                 "Filter by Model Type:",
-                ["All", "spacy", "rasa", "bert"],
+                ["All", "spacy", "rasa", "bert", "tfidf"],
                 key="fb_model_filter"
             )
         with col3:
@@ -536,9 +638,13 @@ def user_feedback_section():
             params = {
                 'token': st.session_state.token,
                 'workspace': selected_workspace,
-                'limit': 500  # Increased limit
+                'limit': 200  # Page size, more pages load on demand
             }
             
+            if len(date_range) == 2:
+                params['date_from'] = date_range[0].isoformat()
+                params['date_to'] = date_range[1].isoformat()
+            
             if username_filter and username_filter.strip():
                 params['username'] = username_filter.strip()
             
@@ -553,6 +659,7 @@ def user_feedback_section():
             
             if result and result.get('success'):
                 st.session_state.feedback_data = result
+                st.session_state.feedback_params = params
                 st.success(f"✅ Loaded {len(result.get('feedbacks', []))} feedback records")
                 st.rerun()
             else:
@@ -620,6 +727,23 @@ def user_feedback_section():
         # Display individual feedback with pagination
         st.write("---")
         st.subheader(f"📋 User Feedback ({len(feedbacks)} records)")
+        if feedback_result.get('total_count') is not None:
+            st.caption(f"About {feedback_result['total_count']} matching records in total")
+        
+        if feedback_result.get('next_cursor'):
+            if st.button("⬇️ Load more feedback", key="fb_load_more"):
+                params = dict(st.session_state.feedback_params)
+                params['cursor'] = feedback_result['next_cursor']
+                more = api_call('get', '/admin/feedback', params=params)
+                if more and more.get('success'):
+                    # A new dict, so the first page's cached result is never changed in place
+                    extended = dict(feedback_result)
+                    extended['feedbacks'] = feedbacks + more.get('feedbacks', [])
+                    extended['next_cursor'] = more.get('next_cursor')
+                    st.session_state.feedback_data = extended
+                    st.rerun()
+                else:
+                    st.error(f"❌ Failed to load more feedback: {more.get('error', 'Unknown error') if more else 'No response'}")
         
         if feedbacks:
             # Add pagination
@@ -1025,9 +1149,7 @@ def admin_panel_page():
     # Logout button
     st.write("---")
     if st.button("Logout"):
-        st.session_state.clear()
-        st.session_state.page = 'login'
-        st.rerun()
+        logout()
                 
 def dashboard_page():
     
@@ -1187,9 +1309,7 @@ def dashboard_page():
             st.write("---")  
             
             if st.button("Logout"):
-                st.session_state.clear()
-                st.session_state.page = 'login'
-                st.rerun()
+                logout()
             
             
         else:
@@ -1294,9 +1414,9 @@ def dashboard_page():
                                         files = {'file': (file.name, file.getvalue())}
                                         result = api_call('post', '/datasets/upload', 
                                                         data={'project_id': project_id, 'workspace': st.session_state.workspace}, 
-                                                        files=files)
+                                                        files=files, timeout=UPLOAD_TIMEOUT)
                                         if result.get('success'):
-                                            st.success("✅ File uploaded successfully!")
+                                            st.success("✅ File uploaded successfully! Its rows are being ingested in the background.")
                                             log_activity("dataset_upload", {
                                                 "project_id": project_id,
                                                 "file_name": file.name,
@@ -1377,7 +1497,7 @@ def dashboard_page():
                         # Display dataset info
                         col1, col2, col3 = st.columns(3)
                         with col1:
-                            st.metric("Total Rows", result['rows'])
+                            st.metric("Total Rows", f"~{result['rows']}" if result.get('rows_estimated') else result['rows'])
                         with col2:
                             st.metric("Total Columns", result['columns'])
                         with col3:
@@ -1406,9 +1526,7 @@ def dashboard_page():
             # Logout button
             st.write("---")
             if st.button("Logout"):
-                st.session_state.clear()
-                st.session_state.page = 'login'
-                st.rerun()
+                logout()
         
  
 def workspaces_management_section():
@@ -2065,7 +2183,7 @@ ul[role="listbox"] li {
     with col2:
         if st.button("📥 Export JSON"):
             # Direct JSON export
-            result = api_call('get', f"/projects/{project['id']}/all-annotations", params={'workspace': st.session_state.workspace})
+            result = fetch_all_pages(f"/projects/{project['id']}/all-annotations", 'annotations', {'workspace': st.session_state.workspace})
             if result and result['success']:
                 json_data = json.dumps(result['annotations'], indent=2)
                 st.download_button(
@@ -2080,7 +2198,7 @@ ul[role="listbox"] li {
     with col3:
         if st.button("📊 Export CSV"):
             # Direct CSV export
-            result = api_call('get', f"/projects/{project['id']}/all-annotations", params={'workspace': st.session_state.workspace})
+            result = fetch_all_pages(f"/projects/{project['id']}/all-annotations", 'annotations', {'workspace': st.session_state.workspace})
             if result and result['success']:
                 # Convert to CSV
                 df = pd.DataFrame(result['annotations'])
@@ -2125,22 +2243,29 @@ ul[role="listbox"] li {
     
     if selected_dataset:
         dataset_id = dataset_options[selected_dataset]
+        sentence_order = st.selectbox("Sentence order", list(SENTENCE_ORDERS.keys()), key="sentence_order")
+        retry_ingest = st.checkbox("Retry ingestion if it failed before", key="sentence_retry_ingest")
         
         if st.button("Load Sentences for Annotation"):
-            result = api_call('get', f'/datasets/{dataset_id}/sentences')
+            result = load_sentence_page('sentence_page', dataset_id, SENTENCE_ORDERS[sentence_order], retry_ingest=retry_ingest)
             if result.get('success'):
                 st.session_state.sentences = result['sentences']
                 st.session_state.current_sentence_index = 0
                 st.session_state.entities = []
-                st.success(f"Loaded {len(result['sentences'])} sentences")
+                st.success(f"Loaded {len(result['sentences'])} of {result.get('total', len(result['sentences']))} sentences")
             else:
                 st.error(result.get('error', 'Failed to load sentences'))
     
     if 'sentences' in st.session_state and st.session_state.sentences:
         sentences = st.session_state.sentences
         current_idx = st.session_state.current_sentence_index
+        total_sentences = st.session_state.get('sentence_page', {}).get('total', len(sentences))
         
-        if current_idx < len(sentences):
+        if current_idx >= len(sentences) and st.session_state.get('sentence_page', {}).get('next_cursor'):
+            if st.button("📥 Load next page of sentences"):
+                if next_sentence_page('sentence_page', 'sentences'):
+                    st.rerun()
+        elif current_idx < len(sentences):
             current_sentence = sentences[current_idx]
             if isinstance(current_sentence, dict):
                 current_sentence = current_sentence.get('text', str(current_sentence))
@@ -2148,7 +2273,7 @@ ul[role="listbox"] li {
                 current_sentence = str(current_sentence)
             
             st.write("---")
-            st.subheader(f"Annotate Sentence ({current_idx + 1}/{len(sentences)})")
+            st.subheader(f"Annotate Sentence ({current_idx + 1}/{total_sentences})")
             
             st.text_area("Sentence to annotate", value=current_sentence, height=100, key="sentence_display")
             
@@ -2349,17 +2474,20 @@ def show_manual_saved_annotations(project):
 
     st.subheader("📊 Saved Annotations")
     
+    state_key = f"manual_annotations_{project['id']}"
+    endpoint = f"/projects/{project['id']}/all-annotations"
     if st.button("🔄 Refresh", key="refresh_view_btn"):
+        st.session_state.pop(state_key, None)
         st.rerun()
     
-    # Get annotations
-    result = api_call('get', f"/projects/{project['id']}/all-annotations", params={'workspace': st.session_state.workspace})
+    # Get annotations, one page at a time
+    listing = paged_listing(state_key, endpoint, 'annotations', {'workspace': st.session_state.workspace})
     
-    if result and result.get('success'):
-        annotations = result.get('annotations', [])
+    if listing:
+        annotations = listing['items']
         
         if annotations:
-            st.success(f"Found {len(annotations)} annotations")
+            st.success(f"Showing {len(annotations)} of {listing['result'].get('total_count') or len(annotations)} annotations")
             
             # Show each annotation
             for i, ann in enumerate(annotations):
@@ -2377,7 +2505,10 @@ def show_manual_saved_annotations(project):
                     # Delete button
                     if st.button("Delete", key=f"del_{ann['id']}"):
                         api_call('delete', f"/annotations/{ann['id']}")
+                        st.session_state.pop(state_key, None)
                         st.rerun()
+            
+            load_more_button(state_key, endpoint, 'annotations')
         else:
             st.info("No annotations found")
     else:
@@ -2566,7 +2697,7 @@ ul[role="listbox"] li {
         # Clear all auto-annotation data
         keys_to_clear = [
             'auto_sentences', 'current_auto_index', 'current_dataset_id', 
-            'auto_annotations', 'current_dataset_key'
+            'auto_annotations', 'current_dataset_key', 'auto_sentence_page'
         ]
         for key in keys_to_clear:
             if key in st.session_state:
@@ -2660,15 +2791,16 @@ ul[role="listbox"] li {
         
         # Load sentences
         if 'auto_sentences' not in st.session_state or st.session_state.get('current_dataset_id') != dataset_id:
+            auto_order = st.selectbox("Sentence order", list(SENTENCE_ORDERS.keys()), key="auto_sentence_order")
             if st.button("📥 Load Sentences for Auto-Annotation"):
                 with st.spinner("Loading sentences..."):
-                    result = api_call('get', f'/datasets/{dataset_id}/sentences')
+                    result = load_sentence_page('auto_sentence_page', dataset_id, SENTENCE_ORDERS[auto_order])
                     if result.get('success'):
                         st.session_state.auto_sentences = result['sentences']
                         st.session_state.current_auto_index = 0
                         st.session_state.current_dataset_id = dataset_id
                         st.session_state.auto_annotations = []
-                        st.success(f"Loaded {len(result['sentences'])} sentences!")
+                        st.success(f"Loaded {len(result['sentences'])} of {result.get('total', len(result['sentences']))} sentences!")
                     else:
                         st.error(result.get('error', 'Failed to load sentences'))
 
@@ -2679,8 +2811,13 @@ ul[role="listbox"] li {
         
         sentences = st.session_state.auto_sentences
         current_idx = st.session_state.current_auto_index
+        total_sentences = st.session_state.get('auto_sentence_page', {}).get('total', len(sentences))
         
-        if current_idx < len(sentences):
+        if current_idx >= len(sentences) and st.session_state.get('auto_sentence_page', {}).get('next_cursor'):
+            if st.button("📥 Load next page of sentences"):
+                if next_sentence_page('auto_sentence_page', 'auto_sentences'):
+                    st.rerun()
+        elif current_idx < len(sentences):
             current_sentence = sentences[current_idx]
             if isinstance(current_sentence, dict):
                 current_sentence = current_sentence.get('text', str(current_sentence))
@@ -2688,7 +2825,7 @@ ul[role="listbox"] li {
                 current_sentence = str(current_sentence)
             
             st.write("---")
-            st.subheader(f"Annotation Review ({current_idx + 1}/{len(sentences)})")
+            st.subheader(f"Annotation Review ({current_idx + 1}/{total_sentences})")
             
             # Display current sentence
             st.text_area("Sentence", value=current_sentence, height=100, key="auto_sentence_display", disabled=True)
@@ -2812,9 +2949,9 @@ ul[role="listbox"] li {
                     st.session_state.current_auto_index += 1
                     st.rerun()
             with col3:
-                progress = (current_idx + 1) / len(sentences)
+                progress = min((current_idx + 1) / max(total_sentences, 1), 1.0)
                 st.progress(progress)
-                st.write(f"Progress: {current_idx + 1}/{len(sentences)}")
+                st.write(f"Progress: {current_idx + 1}/{total_sentences}")
         
         else:
             # All sentences processed
@@ -3227,17 +3364,36 @@ def show_auto_saved_annotations(project):
     """Enhanced view for auto annotation page with confidence scores"""
     st.subheader("📊 Saved Annotations with Confidence Scores")
     
+    state_key = f"auto_annotations_{project['id']}"
+    endpoint = f"/projects/{project['id']}/all-annotations"
     if st.button("🔄 Refresh", key="auto_refresh"):
+        st.session_state.pop(state_key, None)
         st.rerun()
     
-    # Get all annotations from database with confidence scores
-    result = api_call('get', f"/projects/{project['id']}/all-annotations", params={'workspace': st.session_state.workspace})
-    
-    if result and result.get('success'):
-        annotations = result.get('annotations', [])
-        total_count = result.get('total_count', 0)
+    # Filters run on the server, so only matching rows are paged in
+    filter_col1, filter_col2 = st.columns(2)
+    with filter_col1:
+        intent_filter = st.text_input("Filter by intent:", key="auto_intent_filter")
+    with filter_col2:
+        confidence_range = st.slider("Intent confidence range:", 0.0, 1.0, (0.0, 1.0), 0.05, key="auto_confidence_filter")
+    
+    params = {'workspace': st.session_state.workspace}
+    if intent_filter.strip():
+        params['intent'] = intent_filter.strip()
+    if confidence_range != (0.0, 1.0):
+        params['min_confidence'] = confidence_range[0]
+        params['max_confidence'] = confidence_range[1]
+    
+    # Get annotations from database with confidence scores, one page at a time
+    listing = paged_listing(state_key, endpoint, 'annotations', params)
+    
+    if listing:
+        annotations = listing['items']
+        total_count = listing['result'].get('total_count')
+        if total_count is None:
+            total_count = len(annotations)
         
-        st.metric("Total Annotations", total_count)
+        st.metric("Total Annotations", f"~{total_count}" if listing['result'].get('total_count_estimated') else total_count)
         
         if annotations:
             # Display confidence statistics
@@ -3285,9 +3441,12 @@ def show_auto_saved_annotations(project):
                         delete_result = api_call('delete', f"/annotations/{ann['id']}")
                         if delete_result and delete_result.get('success'):
                             st.success("Annotation deleted!")
+                            st.session_state.pop(state_key, None)
                             st.rerun()
                         else:
                             st.error("Failed to delete annotation")
+            
+            load_more_button(state_key, endpoint, 'annotations')
         else:
             st.info("No annotations found")
     else:
@@ -3537,10 +3696,10 @@ def model_training_page():
     
     # Check if we have annotations first
     st.subheader("📊 Training Data")
-    annotations_result = api_call('get', f"/projects/{project['id']}/all-annotations", params={'workspace': st.session_state.workspace})
+    annotations_result = api_call('get', f"/projects/{project['id']}/all-annotations", params={'workspace': st.session_state.workspace, 'limit': 1})
     
     if annotations_result and annotations_result.get('success'):
-        annotation_count = annotations_result.get('total_count', 0)
+        annotation_count = annotations_result.get('total_count') or 0
         st.write(f"**Available annotations:** {annotation_count}")
         
         if annotation_count < 3:
@@ -3558,12 +3717,12 @@ def model_training_page():
     st.subheader("🧪 Select Model Framework")
     framework = st.radio(
         "Choose your NLP framework:",
-        ["spaCy", "RASA", "BERT"],
+        ["spaCy", "RASA", "BERT", "TF-IDF"],
         horizontal=True,
         key="framework_selector"
     )
     
-    framework_lower = framework.lower()
+    framework_lower = framework.lower().replace("-", "")
     workspace_display = "Travel Chatbot" if st.session_state.workspace == "workspace1" else "Sports Chatbot"
     st.info(f"🎯 Currently working with: **{framework}** framework in **{workspace_display}**")
     
@@ -3571,9 +3730,27 @@ def model_training_page():
     st.subheader(f"🚀 Train {framework} Model")
     
     if st.button(f"Train {framework} Model", type="primary", key="train_btn"):
-        with st.spinner(f"Training {framework} model in {workspace_display}..."):
-            result = api_call('post', f"/projects/{project['id']}/train", 
+        # Training runs as a background job; poll it and show stage, progress and ETA
+        job_result = api_call('post', f"/projects/{project['id']}/train-jobs", 
                             data={'model_type': framework_lower, 'workspace': st.session_state.workspace})
+        result = job_result
+        if job_result and job_result.get('success'):
+            job_id = job_result['job']['id']
+            progress_bar = st.progress(0.0, text=f"Queued {framework} training in {workspace_display}...")
+            while True:
+                status_result = api_call('get', f"/train-jobs/{job_id}")
+                if not status_result or not status_result.get('success'):
+                    result = status_result
+                    break
+                job = status_result['job']
+                stage_text = job['stage'].replace('_', ' ').capitalize()
+                if job.get('eta_seconds') is not None:
+                    stage_text += f" - about {job['eta_seconds']:.0f}s left"
+                progress_bar.progress(min(job.get('progress') or 0.0, 1.0), text=stage_text)
+                if job['status'] in ('completed', 'failed', 'cancelled'):
+                    result = job.get('result') or {'success': False, 'error': job.get('error') or f"Training job {job['status']}"}
+                    break
+                time.sleep(1)
             
         if result and result.get('success'):
             st.success(f"✅ {result.get('message')}")
@@ -5300,7 +5477,7 @@ ul[role="listbox"] li {
                 else:
                     with st.spinner("Loading dataset preview..."):
                         preview_result = api_call('get', f"/admin/datasets/preview/{dataset_id}", 
-                                                params={'workspace': workspace})
+                                                params={'workspace': workspace, 'limit': 1000})
                         
                         if preview_result and preview_result.get('success'):
                             st.success(f"✅ Successfully loaded dataset: {preview_result['file_name']}")
@@ -5308,7 +5485,7 @@ ul[role="listbox"] li {
                             # Dataset info in columns
                             col1, col2, col3 = st.columns(3)
                             with col1:
-                                st.metric("Total Rows", preview_result['rows'])
+                                st.metric("Total Rows", f"~{preview_result['rows']}" if preview_result.get('rows_estimated') else preview_result['rows'])
                             with col2:
                                 st.metric("Total Columns", preview_result['columns'])
                             with col3:
@@ -5325,7 +5502,7 @@ ul[role="listbox"] li {
                                 # View mode selector
                                 view_mode = st.radio(
                                     "View Mode:",
-                                    ["Quick Preview (First 100 rows)", "Full Dataset"],
+                                    ["Quick Preview (First 100 rows)", "Extended Preview (First 1000 rows)"],
                                     horizontal=True,
                                     key=f"view_mode_{dataset_id}"
                                 )
@@ -5337,18 +5514,18 @@ ul[role="listbox"] li {
                                     st.dataframe(preview_df, use_container_width=True)
                                     
                                     if total_rows > 100:
-                                        st.info(f"Showing first 100 of {total_rows} rows. Switch to 'Full Dataset' to see all data.")
+                                        st.info(f"Showing first 100 of {total_rows} loaded rows. Switch to 'Extended Preview' to see more.")
                                         
-                                else:  # Full Dataset
+                                else:  # Extended Preview
                                     # Show all data with height limit
                                     full_preview_df = pd.DataFrame(all_data)
                                     st.dataframe(full_preview_df, use_container_width=True, height=400)
                                     
-                                    st.success(f"✅ Displaying all {total_rows} rows")
+                                    st.success(f"✅ Displaying {total_rows} rows - download the dataset for the full file")
                                 
                                 # Export options
                                 st.write("---")
-                                st.subheader("Export Data")
+                                st.subheader("Export Preview Rows")
                                 
                                 col1, col2 = st.columns(2)
                                 
@@ -5425,10 +5602,10 @@ ul[role="listbox"] li {
                                     files = {'file': (new_file.name, new_file.getvalue())}
                                     result = api_call('put', f"/admin/datasets/{dataset_id}/replace", 
                                                     data={'workspace': workspace}, 
-                                                    files=files)
+                                                    files=files, timeout=UPLOAD_TIMEOUT)
                                     
                                     if result and result.get('success'):
-                                        st.success("Dataset replaced successfully!")
+                                        st.success("Replacement uploaded! The dataset switches to the new file once it is ingested.")
                                         del st.session_state.replace_dataset
                                         del st.session_state.replace_workspace
                                         st.rerun()
@@ -5923,6 +6100,11 @@ def model_deletion_section(model_id, model_name, workspace):
                 del st.session_state.deleting_model_name
             st.rerun()
             
+# Activity events are buffered in the session and sent in groups to /log-activity/batch
+ACTIVITY_FLUSH_EVENTS = 10
+ACTIVITY_FLUSH_SECONDS = 30
+ACTIVITY_BUFFER_MAX = 200
+
 def log_activity(activity_type: str, details: dict, workspace: str = None):
     #"""Log activity from frontend"""
     if not st.session_state.get('token'):
@@ -5931,15 +6113,35 @@ def log_activity(activity_type: str, details: dict, workspace: str = None):
     if workspace is None:
         workspace = st.session_state.workspace
     
+    buffer = st.session_state.setdefault('activity_buffer', [])
+    buffer.append({
+        'activity_type': activity_type,
+        'activity_details': details,
+        'workspace': workspace,
+        'created_at': datetime.now().isoformat()
+    })
+    if len(buffer) >= ACTIVITY_FLUSH_EVENTS or time.time() - st.session_state.get('activity_flushed_at', 0) >= ACTIVITY_FLUSH_SECONDS:
+        return flush_activity_log()
+    return True
+
+def flush_activity_log():
+    """Send buffered activity events; events the server did not queue stay buffered for the next flush, invalid ones are dropped"""
+    buffer = st.session_state.get('activity_buffer', [])
+    st.session_state.activity_flushed_at = time.time()
+    if not buffer or not st.session_state.get('token'):
+        return True
+    
     try:
-        result = api_call('post', '/log-activity', data={
-            'activity_type': activity_type,
-            'activity_details': json.dumps(details),
-            'workspace': workspace
-        })
-        return result and result.get('success')
+        result = api_call('post', '/log-activity/batch', data={'events': json.dumps(buffer, default=str)})
     except:
-        return False  # Silent fail - don't break the app if logging fails  
+        result = None  # Silent fail - don't break the app if logging fails
+    
+    if result and 'rejected' in result:
+        remaining = [buffer[index] for index in result['rejected'] if 0 <= index < len(buffer)]
+    else:
+        remaining = buffer  # Nothing was processed (no response, bad token or malformed request)
+    st.session_state.activity_buffer = remaining[-ACTIVITY_BUFFER_MAX:]
+    return bool(result and result.get('success'))
     
 def activity_logs_section():
     
@@ -5963,23 +6165,28 @@ div[data-baseweb="select"] {
     )
     
     # Simple filters
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
-        limit = st.slider("Number of logs to show:", 10, 200, 50)
+        limit = st.slider("Logs per page:", 10, 200, 50)
     with col2:
+        date_range = st.date_input("Date Range:", value=[], key="activity_date_filter")
+    with col3:
         if st.button("🔄 Refresh Logs"):
+            st.session_state.pop('activity_logs_listing', None)
             st.rerun()
     
-    # Load activity logs
+    params = {'workspace': selected_workspace}
+    if len(date_range) == 2:
+        params['date_from'] = date_range[0].isoformat()
+        params['date_to'] = date_range[1].isoformat()
+    
+    # Load activity logs, one page at a time
     with st.spinner("Loading activity logs..."):
-        result = api_call('get', '/admin/activity-logs', params={
-            'workspace': selected_workspace,
-            'limit': limit
-        })
+        listing = paged_listing('activity_logs_listing', '/admin/activity-logs', 'activities', params, page_size=limit)
     
-    if result and result.get('success'):
-        activities = result.get('activities', [])
-        statistics = result.get('statistics', {})
+    if listing:
+        activities = listing['items']
+        statistics = listing['result'].get('statistics') or {}
         
         # Display statistics
         st.subheader("📈 Activity Statistics")
@@ -6016,6 +6223,8 @@ div[data-baseweb="select"] {
                             st.write(f"**{key.replace('_', ' ').title()}:** {value}")
                 
                 st.write("---")
+            
+            load_more_button('activity_logs_listing', '/admin/activity-logs', 'activities')
         else:
             st.info("No activities found")
     